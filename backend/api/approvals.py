@@ -0,0 +1,230 @@
+"""
+Multi-level approval of budget requests.
+
+approval_stage configures the levels (say a city review by any admin, then
+national finance above $1,000); approval_queue holds every PENDING request
+at the stage it waits for. Triggers put a request on the queue at the first
+stage when it becomes PENDING and take it off when it stops being PENDING;
+this module moves it along:
+
+  - claim_next() hands an admin the oldest request at a stage they work,
+    with FOR UPDATE SKIP LOCKED so admins working the queue in parallel
+    never get the same request. A claim is a lease: it lapses after
+    APPROVAL_CLAIM_MINUTES, or when the admin releases it.
+  - decide() records an approval or rejection for the current stage.
+    Approving moves the request to the next stage whose min_amount its
+    total reaches (the request stays PENDING), or approves it when no
+    stage is left. Rejecting rejects it whatever the stage. The status
+    change goes through states.transition, so versions are checked as
+    before.
+  - restart() puts an edited request back at the first stage.
+  - queue_depth() reports, per stage, how much is waiting and for how long.
+
+A PENDING request missing from the queue (e.g. loaded before stages
+existed) is decided in one step, as before.
+"""
+from django.conf import settings
+
+from . import notifications, states
+from .responses import fetch_dict, fetch_dicts
+
+# The approver_role of stages every admin may work
+ANY_ADMIN = 'ADMIN'
+
+
+class StageError(states.TransitionError):
+    """The admin can't decide the request at its current stage"""
+
+
+class WrongStage(StageError):
+    def __init__(self, request_id, stage_name):
+        super().__init__(f'Request {request_id} is waiting for {stage_name}, which you do not approve')
+        self.stage_name = stage_name
+
+
+class ClaimedByOther(StageError):
+    def __init__(self, request_id, claimed_by):
+        super().__init__(f'Request {request_id} is being reviewed by someone else')
+        self.claimed_by = claimed_by
+
+
+def approver_roles(cur, user_id):
+    """Stage roles an admin works: every ADMIN stage, plus their users.approver_role"""
+    cur.execute("SELECT approver_role FROM users WHERE user_id = %s", [user_id])
+    row = cur.fetchone()
+    roles = [ANY_ADMIN]
+    if row and row[0] and row[0] != ANY_ADMIN:
+        roles.append(row[0])
+    return roles
+
+
+def claim_next(cur, user_id):
+    """
+    Claim the oldest unclaimed (or lapsed) request at a stage the admin
+    works; a request they already hold comes first. Returns a dict with
+    request_id, request_month, stage_no and stage_name, or None when
+    nothing is waiting.
+    """
+    cur.execute("""
+        WITH next AS (
+            SELECT q.request_id, q.request_month
+            FROM approval_queue q
+            WHERE q.approver_role = ANY(%(roles)s)
+              AND (q.claimed_by IS NULL
+                   OR q.claimed_by = %(user_id)s
+                   OR q.claimed_at < now() - make_interval(mins => %(lease)s))
+            ORDER BY q.claimed_by IS NOT DISTINCT FROM %(user_id)s DESC, q.enqueued_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE approval_queue q
+        SET claimed_by = %(user_id)s, claimed_at = now()
+        FROM next, approval_stage s
+        WHERE q.request_id = next.request_id
+          AND q.request_month = next.request_month
+          AND s.stage_no = q.stage_no
+        RETURNING q.request_id, q.request_month, q.stage_no, s.name
+    """, {
+        'roles': approver_roles(cur, user_id),
+        'user_id': user_id,
+        'lease': settings.APPROVAL_CLAIM_MINUTES,
+    })
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip(('request_id', 'request_month', 'stage_no', 'stage_name'), row))
+
+
+def release(cur, request_id, user_id):
+    """Give up the admin's claim on a request. Returns whether they held one."""
+    cur.execute("""
+        UPDATE approval_queue
+        SET claimed_by = NULL, claimed_at = NULL
+        WHERE request_id = %s AND claimed_by = %s
+    """, [request_id, user_id])
+    return cur.rowcount > 0
+
+
+def _current_stage(cur, request_id):
+    """Lock the request's queue row; (stage_no, stage name, approver_role, live claimant) or None"""
+    cur.execute("""
+        SELECT q.stage_no, s.name, q.approver_role,
+               CASE WHEN q.claimed_at >= now() - make_interval(mins => %s) THEN q.claimed_by END
+        FROM approval_queue q
+        JOIN approval_stage s ON s.stage_no = q.stage_no
+        WHERE q.request_id = %s
+        FOR UPDATE OF q
+    """, [settings.APPROVAL_CLAIM_MINUTES, request_id])
+    return cur.fetchone()
+
+
+def _next_stage(cur, request_id, stage_no):
+    """The first later stage whose min_amount the request's total reaches, or None"""
+    cur.execute("""
+        SELECT s.stage_no, s.approver_role
+        FROM approval_stage s, budget_request br
+        WHERE br.request_id = %s
+          AND s.stage_no > %s
+          AND s.min_amount <= br.total_amount
+        ORDER BY s.stage_no
+        LIMIT 1
+    """, [request_id, stage_no])
+    return cur.fetchone()
+
+
+def _record(cur, request_id, request_month, approver_id, action, note, stage_no):
+    cur.execute("""
+        INSERT INTO approval (request_id, request_month, approver_id, decision, note, decided_at, stage_no)
+        VALUES (%s, %s, %s, %s, %s, NOW(), %s)
+    """, [request_id, request_month, approver_id, states.DECISIONS[action], note, stage_no])
+
+
+def decide(cur, request_id, action, approver_id, note=None, version=None):
+    """
+    Approve or reject (action 'approve'/'reject') a PENDING request at its
+    current stage, record the decision and, once it is final, queue the
+    requester's notification. Returns (city_id, status), where
+    status stays PENDING when the request moved on to another stage. Raises
+    StageError or TransitionError. Run it inside transaction.atomic().
+    """
+    current = _current_stage(cur, request_id)
+    if current is None:
+        # Not queued: decide in one step (raises if it isn't PENDING)
+        city_id, request_month = states.transition(cur, request_id, action, version)
+        _record(cur, request_id, request_month, approver_id, action, note, None)
+        notifications.queue_decision(cur, request_id, states.TRANSITIONS[action][1], note)
+        return city_id, states.TRANSITIONS[action][1]
+
+    stage_no, stage_name, approver_role, claimed_by = current
+    if approver_role not in approver_roles(cur, approver_id):
+        raise WrongStage(request_id, stage_name)
+    if claimed_by is not None and claimed_by != approver_id:
+        raise ClaimedByOther(request_id, claimed_by)
+
+    following = _next_stage(cur, request_id, stage_no) if action == 'approve' else None
+    if following is None:
+        # Rejected, or approved at the last stage; the trigger dequeues it
+        city_id, request_month = states.transition(cur, request_id, action, version)
+        _record(cur, request_id, request_month, approver_id, action, note, stage_no)
+        notifications.queue_decision(cur, request_id, states.TRANSITIONS[action][1], note)
+        return city_id, states.TRANSITIONS[action][1]
+
+    city_id, request_month = states.transition(cur, request_id, 'advance', version)
+    _record(cur, request_id, request_month, approver_id, action, note, stage_no)
+    cur.execute("""
+        UPDATE approval_queue
+        SET stage_no = %s, approver_role = %s, enqueued_at = now(),
+            claimed_by = NULL, claimed_at = NULL
+        WHERE request_id = %s AND request_month = %s
+    """, [*following, request_id, request_month])
+    return city_id, states.PENDING
+
+
+def restart(cur, request_id, request_month):
+    """Put an edited PENDING request back at the first stage, unclaimed"""
+    cur.execute("""
+        INSERT INTO approval_queue (request_id, request_month, stage_no, approver_role)
+        SELECT %s, %s, s.stage_no, s.approver_role
+        FROM approval_stage s
+        ORDER BY s.stage_no
+        LIMIT 1
+        ON CONFLICT (request_id, request_month) DO UPDATE
+            SET stage_no = EXCLUDED.stage_no,
+                approver_role = EXCLUDED.approver_role,
+                enqueued_at = now(),
+                claimed_by = NULL,
+                claimed_at = NULL
+    """, [request_id, request_month])
+
+
+def request_stage(cur, request_id):
+    """Where a PENDING request waits: dict with stage_no, stage_name and approver_role, or None"""
+    cur.execute("""
+        SELECT q.stage_no, s.name AS stage_name, q.approver_role
+        FROM approval_queue q
+        JOIN approval_stage s ON s.stage_no = q.stage_no
+        WHERE q.request_id = %s
+    """, [request_id])
+    return fetch_dict(cur)
+
+
+def queue_depth(cur):
+    """Per stage: how many requests wait, how many are claimed, and the oldest wait"""
+    cur.execute("""
+        SELECT s.stage_no,
+               s.name AS stage_name,
+               s.approver_role,
+               s.min_amount,
+               COUNT(q.request_id) AS waiting,
+               COUNT(q.request_id) FILTER (
+                   WHERE q.claimed_at >= now() - make_interval(mins => %(lease)s)
+               ) AS claimed,
+               MIN(q.enqueued_at) AS oldest_enqueued_at,
+               COALESCE(EXTRACT(EPOCH FROM now() - MIN(q.enqueued_at)), 0)::int AS oldest_wait_seconds
+        FROM approval_stage s
+        LEFT JOIN approval_queue q ON q.stage_no = s.stage_no
+        GROUP BY s.stage_no
+        ORDER BY s.stage_no
+    """, {'lease': settings.APPROVAL_CLAIM_MINUTES})
+    return fetch_dicts(cur)
+
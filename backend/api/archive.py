@@ -0,0 +1,156 @@
+"""
+Cold tier for closed fiscal years.
+
+archive_fiscal_year() takes one fiscal year out of the hot tables:
+
+  - its budget_request, requested_event, requested_break_down_line and
+    approval partitions are detached, moved to the archive schema and
+    attached to the archive tables there (no rows are copied),
+  - its disbursements, and the expenses and receipts of events held that
+    year, are moved into archive.disbursement/expense/receipt,
+  - its soft-deleted requests are purged first rather than archived,
+  - every archived request gets a row in archive.archived_request, the
+    lookup index detail pages fall back to, and a 'D' row in the change
+    feed so synced clients drop it from their lists.
+
+export_fiscal_year() writes the archived rows of a year as gzipped CSV files
+for off-site retention.
+"""
+import gzip
+from pathlib import Path
+
+from . import partitions
+
+SCHEMA = 'archive'
+
+# Archive tables holding moved rows, with the query selecting one fiscal
+# year's rows for export (parameters: first day, end day)
+EXPORTS = {
+    'budget_request': "SELECT * FROM archive.budget_request WHERE month >= %s AND month < %s",
+    'requested_event': "SELECT * FROM archive.requested_event WHERE request_month >= %s AND request_month < %s",
+    'requested_break_down_line': (
+        "SELECT * FROM archive.requested_break_down_line WHERE request_month >= %s AND request_month < %s"
+    ),
+    'approval': "SELECT * FROM archive.approval WHERE request_month >= %s AND request_month < %s",
+    'disbursement': """
+        SELECT d.* FROM archive.disbursement d
+        JOIN archive.archived_request a ON a.request_id = d.request_id
+        WHERE a.month >= %s AND a.month < %s
+    """,
+    'expense': """
+        SELECT e.* FROM archive.expense e
+        JOIN event ev ON ev.event_id = e.event_id
+        WHERE ev.event_date >= %s AND ev.event_date < %s
+    """,
+    'receipt': """
+        SELECT r.* FROM archive.receipt r
+        JOIN archive.expense e ON e.expense_id = r.expense_id
+        JOIN event ev ON ev.event_id = e.event_id
+        WHERE ev.event_date >= %s AND ev.event_date < %s
+    """,
+}
+
+
+def archive_fiscal_year(cur, start, tablespace=None):
+    """
+    Move the fiscal year starting on `start` into the archive schema. Run it
+    inside a transaction. Returns {table: rows archived}, plus how many
+    soft-deleted requests were purged instead. Raises ValueError
+    when the year's partitions aren't all attached to the hot tables.
+    """
+    end = start.replace(year=start.year + 1)
+    missing = [
+        table for table in partitions.PARTITIONED_TABLES
+        if not any(first_day == start for _, first_day, _ in partitions.attached_partitions(cur, table))
+    ]
+    if missing:
+        raise ValueError(f"fiscal year {start} has no attached partition on {', '.join(missing)}")
+
+    # Queue rows go (archived requests can't be decided any more), and
+    # soft-deleted requests are purged rather than archived
+    counts = {'budget_request (purged)': partitions.release_fiscal_year(cur, start)}
+    detached = partitions.detach_fiscal_year(cur, start)
+    for table in partitions.PARTITIONED_TABLES:
+        name = detached[table]
+        cur.execute(f'ALTER TABLE {name} SET SCHEMA {SCHEMA}')
+        if tablespace:
+            cur.execute(f'ALTER TABLE {SCHEMA}.{name} SET TABLESPACE {tablespace}')
+        cur.execute(
+            f'ALTER TABLE {SCHEMA}.{table} ATTACH PARTITION {SCHEMA}.{name} FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        cur.execute(f'SELECT COUNT(*) FROM {SCHEMA}.{name}')
+        counts[table] = cur.fetchone()[0]
+
+    archived = f"{SCHEMA}.{detached['budget_request']}"
+    cur.execute(f"""
+        INSERT INTO archive.archived_request (request_id, month, requester_id, city_id)
+        SELECT request_id, month, requester_id, city_id FROM {archived}
+    """)
+    cur.execute(f"""
+        INSERT INTO budget_request_change (request_id, requester_id, city_id, op)
+        SELECT request_id, requester_id, city_id, 'D' FROM {archived}
+    """)
+
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM disbursement d
+            USING {archived} br
+            WHERE d.request_id = br.request_id
+            RETURNING d.*
+        )
+        INSERT INTO archive.disbursement SELECT * FROM moved
+    """)
+    counts['disbursement'] = cur.rowcount
+
+    # Receipts before their expenses (receipt.expense_id references expense)
+    cur.execute("""
+        WITH moved AS (
+            DELETE FROM receipt r
+            USING expense e, event ev
+            WHERE r.expense_id = e.expense_id
+              AND e.event_id = ev.event_id
+              AND ev.event_date >= %s AND ev.event_date < %s
+            RETURNING r.*
+        )
+        INSERT INTO archive.receipt SELECT * FROM moved
+    """, [start, end])
+    counts['receipt'] = cur.rowcount
+    cur.execute("""
+        WITH moved AS (
+            DELETE FROM expense e
+            USING event ev
+            WHERE e.event_id = ev.event_id
+              AND ev.event_date >= %s AND ev.event_date < %s
+            RETURNING e.*
+        )
+        INSERT INTO archive.expense SELECT * FROM moved
+    """, [start, end])
+    counts['expense'] = cur.rowcount
+    return counts
+
+
+def export_fiscal_year(cur, start, directory):
+    """
+    Write the archived rows of the fiscal year starting on `start` to
+    <directory>/fy<YYYY>_<MM>/<table>.csv.gz (with a header row). Returns the
+    paths written.
+    """
+    end = start.replace(year=start.year + 1)
+    target = Path(directory) / f'fy{start:%Y_%m}'
+    target.mkdir(parents=True, exist_ok=True)
+    written = []
+    for table, sql in EXPORTS.items():
+        query = cur.mogrify(sql, [start, end]).decode('utf-8')
+        path = target / f'{table}.csv.gz'
+        with gzip.open(path, 'wt', encoding='utf-8', newline='') as out:
+            cur.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', out)
+        written.append(path)
+    return written
+
+
+def archived_month(cur, request_id):
+    """The month of an archived request, or None when it isn't archived"""
+    cur.execute("SELECT month FROM archive.archived_request WHERE request_id = %s", [request_id])
+    row = cur.fetchone()
+    return row[0] if row else None
@@ -0,0 +1,134 @@
+"""
+Audit trail of writes to budget_request, requested_event,
+requested_break_down_line, approval and users.
+
+The rows are written by statement-level triggers (see triggers.sql), so
+every write is covered whichever view, command or SQL function made it, and
+the write path pays one INSERT per statement. The API only tells the
+database who is acting: audit_actor_middleware notes the signed-in user for
+the request (no query), and every INSERT/UPDATE/DELETE the request runs on
+the primary is sent together with set_config('app.user_id', ..., true).
+The setting is local to that statement's transaction, so it never outlives
+the write, reaches another request on a persistent connection, or costs a
+round trip of its own; reads pay nothing. history() reads the log newest
+first, with keyset pagination.
+"""
+import re
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+from .responses import fetch_dicts
+
+ENTITIES = ('budget_request', 'requested_event', 'requested_break_down_line', 'approval', 'users')
+
+# Statements that may write. EXECUTE covers api/queries.py's prepared
+# statements; prefixing one that only reads is harmless.
+WRITES = re.compile(r'^\s*(INSERT|UPDATE|DELETE|MERGE|WITH|EXECUTE)\b', re.IGNORECASE)
+
+_ACTOR_PREFIX = re.compile(r"^SELECT set_config\('app\.user_id', '\d+', true\); ")
+
+_EPOCH = datetime(1970, 1, 1)
+
+# The signed-in user of the request being handled
+_actor = ContextVar('audit_actor', default=None)
+
+
+def _with_actor(execute, sql, params, many, context):
+    """Execute wrapper: run writes in one transaction with the actor set locally"""
+    user_id = _actor.get()
+    if user_id is not None and WRITES.match(sql):
+        # One query string runs as one transaction even in autocommit, and
+        # the cursor keeps the last statement's result
+        sql = f"SELECT set_config('app.user_id', '{int(user_id)}', true); {sql}"
+    return execute(sql, params, many, context)
+
+
+def without_actor(sql):
+    """A statement as the view issued it, without the actor _with_actor() put in front"""
+    return _ACTOR_PREFIX.sub('', sql, count=1)
+
+
+@receiver(connection_created)
+def _install(sender, connection, **kwargs):
+    if connection.alias == DEFAULT_DB_ALIAS and _with_actor not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_with_actor)
+
+
+@sync_and_async_middleware
+def audit_actor_middleware(get_response):
+    """Record the signed-in user as the actor of the request's writes, for that request only"""
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _actor.set(await request.session.aget('user_id'))
+            try:
+                return await get_response(request)
+            finally:
+                _actor.reset(token)
+    else:
+        def middleware(request):
+            token = _actor.set(request.session.get('user_id'))
+            try:
+                return get_response(request)
+            finally:
+                _actor.reset(token)
+    return middleware
+
+
+def encode_cursor(row):
+    """Cursor '<changed_at in µs since the epoch>.<audit_id>' of a history row"""
+    changed_at = row['changed_at']
+    if changed_at.tzinfo is not None:
+        changed_at = changed_at.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return f"{(changed_at - _EPOCH) // timedelta(microseconds=1)}.{row['audit_id']}"
+
+
+def parse_cursor(value):
+    """Cursor -> (changed_at, audit_id); raises ValueError"""
+    micros, audit_id = value.split('.')
+    micros, audit_id = int(micros), int(audit_id)
+    if micros < 0 or audit_id < 0:
+        raise ValueError(value)
+    return _EPOCH + timedelta(microseconds=micros), audit_id
+
+
+def history(cur, entity=None, entity_id=None, request_id=None, actor_id=None,
+            since=None, until=None, before=None, limit=50):
+    """
+    Audit rows matching every filter given, newest first. since/until bound
+    changed_at (inclusive/exclusive); before is a parse_cursor() result to
+    continue after. request_id matches a request's own rows and those of
+    its events, lines and approvals.
+    """
+    where, params = [], []
+    for column, value in (('entity', entity), ('entity_id', entity_id),
+                          ('request_id', request_id), ('actor_id', actor_id)):
+        if value is not None:
+            where.append(f'a.{column} = %s')
+            params.append(value)
+    if since is not None:
+        where.append('a.changed_at >= %s')
+        params.append(since)
+    if until is not None:
+        where.append('a.changed_at < %s')
+        params.append(until)
+    if before is not None:
+        where.append('(a.changed_at, a.audit_id) < (%s, %s)')
+        params.extend(before)
+
+    cur.execute(f"""
+        SELECT a.audit_id, a.changed_at, a.actor_id, u.name AS actor_name,
+               a.entity, a.entity_id, a.request_id, a.op, a.before, a.after
+        FROM audit_log a
+        LEFT JOIN users u ON u.user_id = a.actor_id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY a.changed_at DESC, a.audit_id DESC
+        LIMIT %s
+    """, [*params, limit])
+    return fetch_dicts(cur)
@@ -0,0 +1,145 @@
+"""
+Per-process cache for treasurer views, sharded by city.
+
+Treasurers only see their own city's requests, so every cached value lives
+in its city's shard and is keyed inside it by view and user. A write to any
+request in a city invalidates that city's shard only:
+
+  - write paths call invalidate_city() (deferred to transaction commit), and
+  - the live listener (api/live.py) invalidates on the budget_events
+    NOTIFYs, which covers writes made by other processes.
+
+Invalidation bumps the shard's generation instead of walking its keys; stale
+entries are never read again and age out of the LRU. Memory is bounded by
+API_CACHE_MAX_ENTRIES per process, and API_CACHE_TTL_SECONDS caps staleness
+if a notification is ever missed.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+_MISSING = object()
+
+
+class ShardedLRUCache:
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _generation(self, shard):
+        return self._epoch, self._generations.get(shard, 0)
+
+    def _key(self, shard, key):
+        return shard, self._generation(shard), key
+
+    def get(self, shard, key):
+        now = time.monotonic()
+        with self._lock:
+            full_key = self._key(shard, key)
+            entry = self._entries.get(full_key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[full_key]
+            self.misses += 1
+            return _MISSING
+
+    def set(self, shard, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation(shard):
+                return  # invalidated while the value was being computed
+            full_key = self._key(shard, key)
+            self._entries[full_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, shard, key, compute):
+        """Cached value of compute() for (shard, key)"""
+        value = self.get(shard, key)
+        if value is _MISSING:
+            with self._lock:
+                generation = self._generation(shard)
+            value = compute()
+            self.set(shard, key, value, generation)
+        return value
+
+    def invalidate(self, shard):
+        with self._lock:
+            self._generations[shard] = self._generations.get(shard, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+treasurer_cache = ShardedLRUCache(
+    max_entries=getattr(settings, 'API_CACHE_MAX_ENTRIES', 2048),
+    ttl=getattr(settings, 'API_CACHE_TTL_SECONDS', 60),
+)
+
+_listening = False
+_listening_lock = threading.Lock()
+
+
+def _on_event(event):
+    if event.get('type') == 'resync':
+        treasurer_cache.clear()
+    elif event.get('city_id') is not None:
+        treasurer_cache.invalidate(('city', event['city_id']))
+
+
+def _ensure_listening():
+    global _listening
+    if _listening:
+        return
+    with _listening_lock:
+        if not _listening:
+            from .live import listener
+            listener.add_callback(_on_event)
+            _listening = True
+
+
+def cached_for_treasurer(city_id, user_id, name, compute):
+    """compute() cached in city_id's shard under (name, user_id)"""
+    _ensure_listening()
+    return treasurer_cache.get_or_set(('city', city_id), (name, user_id), compute)
+
+
+def invalidate_city(city_id):
+    """Drop cached treasurer views for a city once the current transaction commits"""
+    if city_id is None:
+        return
+    transaction.on_commit(lambda: treasurer_cache.invalidate(('city', city_id)))
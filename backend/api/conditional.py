@@ -0,0 +1,97 @@
+"""
+Conditional GET support for the polled API endpoints.
+
+A state function returns a small fingerprint of what a response would
+contain (normally read from budget_request.version/updated_at, which the
+database triggers keep current) plus its last-modified time, or None when
+the request can't be answered conditionally (not logged in, wrong role,
+unknown resource). @conditional turns that into ETag/Last-Modified headers
+and lets Django answer If-None-Match/If-Modified-Since with 304 before the
+view runs.
+"""
+import hashlib
+from functools import wraps
+
+from django.db import connection
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import queries
+from .cache import cached_for_treasurer
+from .replicas import read_connection
+from .views.auth_views import get_current_user
+
+
+def conditional(state_func):
+    """state_func(request, *args, **kwargs) -> (fingerprint, last_modified) or None"""
+
+    def state(request, *args, **kwargs):
+        # condition() asks for the ETag and Last-Modified separately; compute once
+        if not hasattr(request, '_conditional_state'):
+            request._conditional_state = state_func(request, *args, **kwargs)
+        return request._conditional_state
+
+    def etag(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if current is None:
+            return None
+        return hashlib.sha1(repr(current[0]).encode('utf-8')).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        return current[1] if current else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                # Let the browser keep the body but always revalidate it
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapped
+    return decorator
+
+
+def request_state(request, request_id):
+    """One primary-key lookup: the request's version and updated_at"""
+    user_id, role, _ = get_current_user(request)
+    if not user_id:
+        return None
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT version, updated_at FROM budget_request WHERE request_id = %s AND deleted_at IS NULL",
+            [request_id],
+        )
+        row = cur.fetchone()
+    if not row:
+        return None
+    return ('request', request_id, row[0]), row[1]
+
+
+def requester_state(request):
+    """Count, version sum and newest updated_at of the treasurer's own requests"""
+    user_id, role, city_id = get_current_user(request)
+    if not user_id or role != 'TREASURER':
+        return None
+
+    def load():
+        with connection.cursor() as cur:
+            return queries.REQUESTER_STATE.one(cur, requester_id=user_id)
+
+    # Cached alongside the dashboard, so a 304 doesn't touch Postgres either
+    count, versions, newest = cached_for_treasurer(city_id, user_id, 'requester_state', load)
+    return ('requester', user_id, count, versions, newest), newest
+
+
+def review_queue_state(request):
+    """Same fingerprint over the PENDING and REJECTED requests admins review"""
+    user_id, role, _ = get_current_user(request)
+    if not user_id or role != 'ADMIN':
+        return None
+    # Read where api_pending_requests reads, so the ETag matches the body
+    with read_connection(request).cursor() as cur:
+        count, versions, newest = queries.REVIEW_QUEUE_STATE.one(cur)
+    return ('review_queue', count, versions, newest), newest
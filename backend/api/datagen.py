@@ -0,0 +1,368 @@
+"""
+Synthetic data for scale testing (used by the generate_data command).
+
+Data is generated city by city: a city's requests, events, lines, approvals,
+expenses, disbursements and petty cash all come from one random.Random seeded
+with (seed, city index), so the output only depends on the seed and the
+scale options, never on how many worker processes load it.
+
+Ids are assigned from fixed slots instead of sequences (request slot n owns
+event slots 2n..2n+1, and so on), which lets every chunk be generated and
+COPY'd independently. Slots that go unused simply leave gaps in the ids.
+
+This module only needs the standard library and psycopg2 so worker processes
+don't have to set up Django.
+"""
+import csv
+import io
+import random
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+import psycopg2
+
+MAX_EVENTS_PER_REQUEST = 2
+MAX_LINES_PER_EVENT = 8
+MAX_APPROVALS_PER_REQUEST = 2
+MAX_PETTY_CASH_PER_REQUEST = 2
+
+HST_RATE_PERCENT = 13
+
+PROVINCES = ['ON', 'QC', 'BC', 'AB', 'MB', 'SK', 'NS', 'NB', 'NL', 'PE']
+CITY_NAMES = [
+    'Toronto', 'Montreal', 'Vancouver', 'Calgary', 'Edmonton', 'Ottawa', 'Winnipeg',
+    'Quebec City', 'Hamilton', 'Kitchener', 'London', 'Halifax', 'Victoria', 'Windsor',
+    'Saskatoon', 'Regina', 'Mississauga', 'Brampton', 'Surrey', 'Laval', 'Markham',
+    'Gatineau', 'Burnaby', 'Oshawa', 'Sherbrooke', 'Guelph', 'Moncton', 'Kelowna',
+]
+FIRST_NAMES = [
+    'Fatima', 'Zainab', 'Aliya', 'Dina', 'Maryam', 'Aisha', 'Sara', 'Noor', 'Huda',
+    'Amina', 'Yusuf', 'Omar', 'Ali', 'Hamza', 'Bilal', 'Ibrahim', 'Khadija', 'Layla',
+    'Salma', 'Hana', 'Imran', 'Zaid', 'Rania', 'Samira',
+]
+EVENT_NAMES = [
+    'Paint Night', 'Iftar Dinner', 'Youth Halaqa', 'Sports Day', 'Quran Competition',
+    'Fundraising Gala', 'Study Circle', 'Community BBQ', 'Winter Clothing Drive',
+    'Charity Run', 'Eid Festival', 'Movie Night', 'Sisters Retreat', 'Camping Trip',
+]
+LINE_DESCRIPTIONS = [
+    'Paint and Canvases', 'Food Vendor', 'Hall Rental', 'Decorations', 'Printing',
+    'Prizes', 'Bus Rental', 'Speaker Honorarium', 'Snacks and Drinks', 'Sound System',
+    'Tables and Chairs', 'Gift Bags',
+]
+VENDORS = ['Dollarama', 'Walmart', 'Costco', 'Staples', 'Michaels', 'Canadian Tire', 'No Frills']
+METHODS = ['E-Transfer', 'Cheque', 'Cash']
+DEFAULT_CATEGORIES = ['Supplies', 'Decor', 'Food', 'Venue', 'Transport', 'Printing', 'Prizes']
+
+# Columns written by COPY, in load order (parents before children)
+COLUMNS = {
+    'budget_request': [
+        'request_id', 'city_id', 'requester_id', 'recipient_id', 'month', 'description',
+        'status', 'created_at', 'requester_name', 'city_name', 'total_amount',
+        'event_count', 'line_count', 'last_decision', 'last_decided_at',
+    ],
+    'requested_event': [
+        'req_event_id', 'request_id', 'request_month', 'name', 'event_date', 'total_amount', 'notes',
+    ],
+    'requested_break_down_line': [
+        'line_id', 'req_event_id', 'request_month', 'category_id', 'description', 'amount',
+    ],
+    'approval': [
+        'approval_id', 'request_id', 'request_month', 'approver_id', 'decision', 'note', 'decided_at',
+    ],
+    'event': ['event_id', 'city_id', 'name', 'event_date', 'attendees_count', 'prepared_by'],
+    'expense': [
+        'expense_id', 'event_id', 'category_id', 'vendor', 'item_desc', 'amount_before_tax',
+        'hst', 'round_off', 'total_amount', 'receipt_number', 'spent_at', 'volunteer_name',
+    ],
+    'receipt': ['receipt_id', 'expense_id', 'file_path', 'uploaded_at'],
+    'disbursement': ['disb_id', 'amount', 'method', 'sent_at', 'ref_no', 'reason', 'city_id', 'request_id'],
+    'petty_cash_statement': [
+        'pcs_id', 'month', 'opening_balance', 'total_spent', 'closing_balance',
+        'carried_forward', 'cash_in_hand', 'city_id', 'prepared_by', 'approved_by',
+    ],
+    'petty_cash_expense': [
+        'pcx_id', 'pcs_id', 'event_id', 'nature_of_expense', 'vendor', 'amount_before_tax',
+        'hst', 'round_off', 'total_amount', 'receipt_number', 'spent_at', 'volunteer_name',
+        'balance_on_hand_after',
+    ],
+}
+
+
+def money(cents):
+    sign = '-' if cents < 0 else ''
+    cents = abs(cents)
+    return f'{sign}{cents // 100}.{cents % 100:02d}'
+
+
+def month_starts(end_month, count):
+    """`count` first-of-month dates ending with end_month, oldest first"""
+    months = []
+    year, month = end_month.year, end_month.month
+    for _ in range(count):
+        months.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(months))
+
+
+def city_rows(spec):
+    """(city_id, name, province) for every generated city"""
+    rows = []
+    for c in range(spec['cities']):
+        city_id = spec['offsets']['city'] + c + 1
+        base = CITY_NAMES[c % len(CITY_NAMES)]
+        if c < len(CITY_NAMES) and not spec['offsets']['city']:
+            name = base
+        else:
+            # suffixed with the id so (name, province) stays unique next to existing cities
+            name = f'{base} {city_id}'
+        rows.append((city_id, name, PROVINCES[c % len(PROVINCES)]))
+    return rows
+
+
+def treasurer_id(spec, city_index, j):
+    return spec['offsets']['users'] + city_index * spec['treasurers_per_city'] + j + 1
+
+
+def admin_ids(spec):
+    first = spec['offsets']['users'] + spec['cities'] * spec['treasurers_per_city'] + 1
+    return list(range(first, first + spec['admins']))
+
+
+def user_name(user_id):
+    return f'{FIRST_NAMES[user_id % len(FIRST_NAMES)]} {chr(65 + (user_id // 7) % 26)}.'
+
+
+def user_rows(spec, password_hash):
+    """(user_id, name, email, whatsapp, role, password_hash, city_id, is_active)"""
+    rng = random.Random(f"{spec['seed']}:users")
+    rows = []
+    for c in range(spec['cities']):
+        city_id = spec['offsets']['city'] + c + 1
+        for j in range(spec['treasurers_per_city']):
+            uid = treasurer_id(spec, c, j)
+            rows.append((uid, user_name(uid), f'treasurer{uid}@example.org',
+                         f'1{rng.randrange(10**9, 10**10)}', 'TREASURER', password_hash, city_id, 't'))
+    for uid in admin_ids(spec):
+        city_id = spec['offsets']['city'] + rng.randrange(spec['cities']) + 1
+        rows.append((uid, user_name(uid), f'admin{uid}@example.org',
+                     f'1{rng.randrange(10**9, 10**10)}', 'ADMIN', password_hash, city_id, 't'))
+    return rows
+
+
+def requests_per_city(spec):
+    """
+    Split spec['requests'] across cities with a Zipf-like skew (a few big
+    cities do most of the work). Returns a list of counts indexed by city.
+    """
+    rng = random.Random(f"{spec['seed']}:cities")
+    ranks = list(range(spec['cities']))
+    rng.shuffle(ranks)
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in ranks]
+    scale = spec['requests'] / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    for c in sorted(range(spec['cities']), key=lambda i: -weights[i])[:spec['requests'] - sum(counts)]:
+        counts[c] += 1
+    return counts
+
+
+def plan_chunks(counts, chunk_size):
+    """Group consecutive cities into chunks of roughly chunk_size requests"""
+    chunks = []
+    first_slot = 0
+    current = {'cities': [], 'first_slot': 0, 'requests': 0}
+    for c, n in enumerate(counts):
+        if current['requests'] and current['requests'] + n > chunk_size:
+            chunks.append(current)
+            current = {'cities': [], 'first_slot': first_slot, 'requests': 0}
+        current['cities'].append((c, first_slot, n))
+        current['requests'] += n
+        first_slot += n
+    if current['cities']:
+        chunks.append(current)
+    return chunks
+
+
+class _Tables:
+    """One CSV buffer per table"""
+
+    def __init__(self):
+        self.buffers = {name: io.StringIO() for name in COLUMNS}
+        self.writers = {name: csv.writer(buf) for name, buf in self.buffers.items()}
+        self.counts = dict.fromkeys(COLUMNS, 0)
+
+    def add(self, table, row):
+        self.writers[table].writerow(row)
+        self.counts[table] += 1
+
+
+def generate_city(spec, tables, city_index, first_slot, n_requests):
+    rng = random.Random(f"{spec['seed']}:city:{city_index}")
+    offsets = spec['offsets']
+    months = [date.fromisoformat(m) for m in spec['months']]
+    n_months = len(months)
+    recent = max(n_months - 2, 0)
+    city_id = offsets['city'] + city_index + 1
+    city_name = spec['city_names'][city_index]
+    treasurers = [treasurer_id(spec, city_index, j) for j in range(spec['treasurers_per_city'])]
+    admins = admin_ids(spec)
+    categories = spec['categories']
+
+    # Later months are busier than earlier ones
+    month_weights = list(accumulate(1.0 + m / max(n_months - 1, 1) for m in range(n_months)))
+    approved_by_month = [[] for _ in range(n_months)]
+
+    for r in range(n_requests):
+        slot = first_slot + r
+        request_id = offsets['budget_request'] + slot + 1
+        m = rng.choices(range(n_months), cum_weights=month_weights)[0]
+        month = months[m]
+        requester = rng.choice(treasurers)
+        created_at = datetime.combine(month, datetime.min.time()) - timedelta(
+            days=rng.randrange(0, 25), seconds=rng.randrange(0, 86400))
+
+        roll = rng.random()
+        if m >= recent:
+            status = 'PENDING' if roll < 0.6 else 'REJECTED' if roll < 0.75 else 'APPROVED'
+        else:
+            status = 'APPROVED' if roll < 0.85 else 'REJECTED' if roll < 0.95 else 'PENDING'
+
+        # Requested events and their breakdown lines
+        event_name = rng.choice(EVENT_NAMES)
+        n_events = 1 if rng.random() < 0.9 else 2
+        total_cents = 0
+        line_count = 0
+        first_event_lines = []
+        for e in range(n_events):
+            event_slot = slot * MAX_EVENTS_PER_REQUEST + e
+            req_event_id = offsets['requested_event'] + event_slot + 1
+            n_lines = min(1 + int(rng.expovariate(0.5)), MAX_LINES_PER_EVENT)
+            event_cents = 0
+            for k in range(n_lines):
+                line_id = offsets['requested_break_down_line'] + event_slot * MAX_LINES_PER_EVENT + k + 1
+                cents = min(int(rng.lognormvariate(9.0, 0.9)), 500000)
+                category_id = rng.choice(categories)
+                description = rng.choice(LINE_DESCRIPTIONS)
+                tables.add('requested_break_down_line',
+                           (line_id, req_event_id, month.isoformat(), category_id, description, money(cents)))
+                event_cents += cents
+                if e == 0:
+                    first_event_lines.append((category_id, description, cents))
+            event_date = month + timedelta(days=rng.randrange(0, 27))
+            tables.add('requested_event', (
+                req_event_id, request_id, month.isoformat(), event_name if e == 0 else rng.choice(EVENT_NAMES),
+                event_date.isoformat(), money(event_cents), f'{event_name} for {city_name}',
+            ))
+            total_cents += event_cents
+            line_count += n_lines
+
+        # Decisions: a rejection may precede the final outcome
+        decisions = []
+        decided_at = created_at
+        if status != 'PENDING' or rng.random() < 0.1:
+            if status != 'REJECTED' and rng.random() < 0.1:
+                decided_at += timedelta(days=rng.randrange(1, 5), seconds=rng.randrange(0, 86400))
+                decisions.append(('NO-PLEASE RESEND', 'Please add receipts estimate', decided_at))
+            decided_at += timedelta(days=rng.randrange(1, 10), seconds=rng.randrange(0, 86400))
+            if status == 'APPROVED':
+                decisions.append(('YES', 'All good', decided_at))
+            elif status == 'REJECTED':
+                decisions.append(('NO-PLEASE RESEND', 'Over budget, please resend', decided_at))
+        for j, (decision, note, at) in enumerate(decisions[:MAX_APPROVALS_PER_REQUEST]):
+            approval_id = offsets['approval'] + slot * MAX_APPROVALS_PER_REQUEST + j + 1
+            tables.add('approval', (
+                approval_id, request_id, month.isoformat(), rng.choice(admins), decision, note, at.isoformat(),
+            ))
+        last = decisions[-1] if decisions else (None, None, None)
+
+        tables.add('budget_request', (
+            request_id, city_id, requester, None, month.isoformat(), event_name, status,
+            created_at.isoformat(), user_name(requester), city_name, money(total_cents),
+            n_events, line_count, last[0], last[2].isoformat() if last[2] else None,
+        ))
+
+        if status != 'APPROVED':
+            continue
+
+        # Approved requests turn into a held event with expenses and a disbursement
+        event_id = offsets['event'] + slot + 1
+        event_date = month + timedelta(days=rng.randrange(0, 27))
+        tables.add('event', (event_id, city_id, event_name, event_date.isoformat(),
+                             rng.randrange(5, 200), requester))
+        for k, (category_id, description, cents) in enumerate(first_event_lines):
+            expense_id = offsets['expense'] + slot * MAX_LINES_PER_EVENT + k + 1
+            before_tax = int(cents * rng.uniform(0.8, 1.0) * 100 / (100 + HST_RATE_PERCENT))
+            hst = round(before_tax * HST_RATE_PERCENT / 100)
+            receipt_number = rng.randrange(10000, 99999) if rng.random() < 0.9 else None
+            tables.add('expense', (
+                expense_id, event_id, category_id, rng.choice(VENDORS), description,
+                money(before_tax), money(hst), '0.00', money(before_tax + hst), receipt_number,
+                'Social Program', user_name(rng.choice(treasurers)),
+            ))
+            if receipt_number is not None:
+                receipt_id = offsets['receipt'] + slot * MAX_LINES_PER_EVENT + k + 1
+                tables.add('receipt', (receipt_id, expense_id, None, event_date.isoformat()))
+
+        sent_at = decided_at + timedelta(days=rng.randrange(1, 4))
+        tables.add('disbursement', (
+            offsets['disbursement'] + slot + 1, money(total_cents), rng.choice(METHODS),
+            sent_at.isoformat(), rng.randrange(1000, 99999), f'Disbursement for {event_name}'[:100],
+            city_id, request_id,
+        ))
+        approved_by_month[m].append((slot, event_id, requester))
+
+    # One petty cash statement per city and month, paying for small items at that
+    # month's events; balances roll forward and are topped up when they run low.
+    balance = 50000
+    for m, month in enumerate(months):
+        if balance < 20000:
+            balance += 50000
+        opening = balance
+        pcs_id = offsets['petty_cash_statement'] + city_index * n_months + m + 1
+        spent = 0
+        for slot, event_id, requester in approved_by_month[m]:
+            for k in range(rng.randrange(0, MAX_PETTY_CASH_PER_REQUEST + 1)):
+                before_tax = rng.randrange(500, 6000)
+                hst = round(before_tax * HST_RATE_PERCENT / 100)
+                total = before_tax + hst
+                spent += total
+                balance -= total
+                tables.add('petty_cash_expense', (
+                    offsets['petty_cash_expense'] + slot * MAX_PETTY_CASH_PER_REQUEST + k + 1,
+                    pcs_id, event_id, rng.choice(DEFAULT_CATEGORIES), rng.choice(VENDORS),
+                    money(before_tax), money(hst), '0.00', money(total),
+                    rng.randrange(10000, 99999), 'Social Program', user_name(requester), money(balance),
+                ))
+        tables.add('petty_cash_statement', (
+            pcs_id, month.strftime('%Y-%m'), money(opening), money(spent), money(balance),
+            money(balance), money(balance), city_id, treasurers[0], rng.choice(admins),
+        ))
+
+
+def copy_tables(conn, tables):
+    with conn.cursor() as cur:
+        for name, columns in COLUMNS.items():
+            buf = tables.buffers[name]
+            if not tables.counts[name]:
+                continue
+            buf.seek(0)
+            cur.copy_expert(
+                f"COPY {name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    conn.commit()
+
+
+def load_chunk(args):
+    """Worker entry point: generate one chunk of cities and COPY it in its own transaction"""
+    spec, chunk = args
+    tables = _Tables()
+    for city_index, first_slot, n_requests in chunk['cities']:
+        generate_city(spec, tables, city_index, first_slot, n_requests)
+
+    conn = psycopg2.connect(**spec['dsn'])
+    try:
+        copy_tables(conn, tables)
+    finally:
+        conn.close()
+    return tables.counts
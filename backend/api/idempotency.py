@@ -0,0 +1,199 @@
+"""
+Idempotency keys for API writes.
+
+A client that may retry a POST (flaky mobile connections) sends an
+Idempotency-Key header, any unique string per logical action. @idempotent
+runs the first request with a given key and stores its response in the
+idempotency_key table; a retry with the same key and the same body gets
+that stored response back (with an Idempotent-Replayed header) without the
+write running again. The same key with a different method, path or body is
+refused with 422.
+
+The key is claimed, the view runs and the response is stored in one
+transaction, so a write and its stored response commit together. A retry
+that arrives while the first request is still running waits on the key's
+row and then replays its response; if the first request failed with a 5xx
+(or raised) nothing is stored and the retry runs normally.
+
+Views whose work is too slow to hold a transaction open for (the bulk user
+import) use claim_key() and release_key() instead: the key is claimed and
+the response stored in two short transactions of their own, and a retry
+arriving in between gets 409. Such a view fingerprints what it parsed
+rather than the raw body, whose multipart boundary changes on every send.
+
+Keys are scoped per user and honoured for IDEMPOTENCY_KEY_TTL_HOURS;
+`manage.py expire_idempotency_keys` deletes older rows. Requests without
+the header, from anonymous users or with safe methods are passed through.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse
+
+from .responses import json_response
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# A claim_key() claim still unanswered after this long belongs to a request
+# that died; a retry takes it over
+STALE_CLAIM_MINUTES = 30
+
+
+def _fingerprint(request, body=None):
+    """sha256 of method, path and body (request.body unless given)"""
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.body if body is None else body):
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.digest()
+
+
+def _claim(cur, user_id, key, fingerprint):
+    """Insert the key (or take over an expired one); False if it's already in use"""
+    cur.execute("""
+        INSERT INTO idempotency_key (user_id, idem_key, fingerprint)
+        VALUES (%(user_id)s, %(key)s, %(fingerprint)s)
+        ON CONFLICT (user_id, idem_key) DO UPDATE
+            SET fingerprint = EXCLUDED.fingerprint,
+                status_code = NULL,
+                body = NULL,
+                created_at = now()
+            WHERE idempotency_key.created_at < now() - make_interval(hours => %(ttl_hours)s)
+               OR (idempotency_key.status_code IS NULL
+                   AND idempotency_key.created_at < now() - make_interval(mins => %(stale_minutes)s))
+        RETURNING 1
+    """, {
+        'user_id': user_id,
+        'key': key,
+        'fingerprint': fingerprint,
+        'ttl_hours': settings.IDEMPOTENCY_KEY_TTL_HOURS,
+        'stale_minutes': STALE_CLAIM_MINUTES,
+    })
+    return cur.fetchone() is not None
+
+
+def _stored(cur, user_id, key):
+    cur.execute("""
+        SELECT fingerprint, status_code, body
+        FROM idempotency_key
+        WHERE user_id = %s AND idem_key = %s
+    """, [user_id, key])
+    return cur.fetchone()
+
+
+def _store(cur, user_id, key, response):
+    cur.execute("""
+        UPDATE idempotency_key
+        SET status_code = %s, body = %s
+        WHERE user_id = %s AND idem_key = %s
+    """, [response.status_code, response.content, user_id, key])
+
+
+def _replay(status_code, body):
+    response = HttpResponse(bytes(body), status=status_code, content_type='application/json')
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _key(request):
+    """(user_id, key), None when the request doesn't use a key, or a 400 response"""
+    key = request.headers.get(HEADER)
+    # The session directly, as get_current_user does: auth_views uses @idempotent
+    user_id = request.session.get('user_id')
+    if key is None or request.method in SAFE_METHODS or not user_id:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return json_response(
+            {'detail': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}, status=400,
+        )
+    return user_id, key
+
+
+def _refusal_or_replay(cur, user_id, key, fingerprint):
+    stored_fingerprint, status_code, body = _stored(cur, user_id, key)
+    if bytes(stored_fingerprint) != fingerprint:
+        return json_response(
+            {'detail': f'{HEADER} was already used for a different request'}, status=422,
+        )
+    if status_code is None:
+        return json_response(
+            {'detail': f'A request with this {HEADER} is still running'}, status=409,
+        )
+    return _replay(status_code, body)
+
+
+def claim_key(request, data):
+    """
+    Claim the request's Idempotency-Key, committed at once, for a view that
+    runs its work outside a transaction. `data` (JSON-serializable) is what
+    the view parsed from the body; it stands in for the body in the
+    fingerprint. Returns (claim, response): return `response` as it is when
+    there is one (a replay or a refusal); otherwise do the work and pass
+    `claim` to release_key().
+    """
+    found = _key(request)
+    if found is None:
+        return None, None
+    if not isinstance(found, tuple):
+        return None, found
+    user_id, key = found
+    body = json.dumps([request.GET.urlencode(), data], sort_keys=True, default=str).encode()
+    fingerprint = _fingerprint(request, body)
+    with transaction.atomic(), connection.cursor() as cur:
+        if _claim(cur, user_id, key, fingerprint):
+            return (user_id, key), None
+        return None, _refusal_or_replay(cur, user_id, key, fingerprint)
+
+
+def release_key(claim, response=None):
+    """
+    Store the response of a claim_key() claim for retries to replay. Without
+    a response (the work raised), or with a 5xx, the key is freed instead so
+    a retry runs again.
+    """
+    if claim is None:
+        return
+    user_id, key = claim
+    with transaction.atomic(), connection.cursor() as cur:
+        if response is None or response.status_code >= 500 or response.streaming:
+            cur.execute("DELETE FROM idempotency_key WHERE user_id = %s AND idem_key = %s", [user_id, key])
+        else:
+            _store(cur, user_id, key, response)
+
+
+def idempotent(view):
+    """Honour the Idempotency-Key header on a JSON write view"""
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        found = _key(request)
+        if found is None:
+            return view(request, *args, **kwargs)
+        if not isinstance(found, tuple):
+            return found
+        user_id, key = found
+        fingerprint = _fingerprint(request)
+
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                # Blocks while another request holds the same key
+                claimed = _claim(cur, user_id, key, fingerprint)
+                if not claimed:
+                    return _refusal_or_replay(cur, user_id, key, fingerprint)
+
+            response = view(request, *args, **kwargs)
+
+            if response.status_code >= 500 or response.streaming:
+                # Let a retry run the write again
+                transaction.set_rollback(True)
+                return response
+            with connection.cursor() as cur:
+                _store(cur, user_id, key, response)
+        return response
+    return wrapped
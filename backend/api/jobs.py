@@ -0,0 +1,334 @@
+"""
+Database-backed background jobs.
+
+Work is a row in the job table, run by `manage.py run_jobs`; there is no
+broker. Tasks are plain functions registered with @task (see api/tasks.py),
+optionally on a schedule:
+
+    @task('refresh_monthly_totals', schedule=Hourly(), concurrency=1)
+    def refresh_monthly_totals():
+        ...
+
+One-off jobs are queued with enqueue(cur, name, **args). The runner
+
+  - queues every periodic task's latest slot (schedule_due); the job's
+    dedupe_key makes that a no-op once the slot is queued, so several
+    runners can share the database,
+  - claims due jobs with FOR UPDATE SKIP LOCKED (claim), so runners never
+    pick the same job, and never runs more than a task's `concurrency`
+    jobs at once across all runners,
+  - runs them in a process pool (execute) and records every attempt in
+    job_run, retrying failures max_attempts times with exponential backoff,
+  - puts jobs back whose runner died mid-run once they exceed their
+    timeout (reap).
+"""
+import io
+import json
+import os
+import socket
+import traceback
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .responses import fetch_dicts
+
+# Seconds before the first retry; doubled on every further attempt
+RETRY_DELAY = 60
+
+
+# ---------- Schedules ----------
+# latest(now) is the most recent slot at or before `now` (an aware datetime in
+# the current time zone); each slot is queued once.
+
+@dataclass(frozen=True)
+class Every:
+    minutes: int = 1
+
+    def __post_init__(self):
+        if not 1 <= self.minutes <= 60 or 60 % self.minutes:
+            raise ValueError('Every minutes must divide an hour')
+
+    def latest(self, now):
+        return now.replace(minute=now.minute - now.minute % self.minutes, second=0, microsecond=0)
+
+    def __str__(self):
+        return f'every {self.minutes} min'
+
+
+@dataclass(frozen=True)
+class Hourly:
+    minute: int = 0
+
+    def latest(self, now):
+        slot = now.replace(minute=self.minute, second=0, microsecond=0)
+        return slot if slot <= now else slot - timedelta(hours=1)
+
+    def __str__(self):
+        return f'hourly at :{self.minute:02d}'
+
+
+@dataclass(frozen=True)
+class Daily:
+    hour: int = 0
+    minute: int = 0
+
+    def latest(self, now):
+        slot = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        return slot if slot <= now else slot - timedelta(days=1)
+
+    def __str__(self):
+        return f'daily at {self.hour:02d}:{self.minute:02d}'
+
+
+@dataclass(frozen=True)
+class Monthly:
+    day: int = 1
+    hour: int = 0
+    minute: int = 0
+
+    def __post_init__(self):
+        if not 1 <= self.day <= 28:
+            raise ValueError('Monthly day must be 1-28 so every month has it')
+
+    def latest(self, now):
+        slot = now.replace(day=self.day, hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if slot <= now:
+            return slot
+        previous = (now.replace(day=1) - timedelta(days=1)).replace(day=self.day)
+        return previous.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+
+    def __str__(self):
+        return f'monthly on day {self.day} at {self.hour:02d}:{self.minute:02d}'
+
+
+# ---------- Registry ----------
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: object
+    schedule: object = None
+    concurrency: int = 1        # jobs of this task running at once; None for no limit
+    max_attempts: int = 3
+    timeout: int = 3600         # seconds before a RUNNING job counts as abandoned
+
+
+TASKS = {}
+
+
+def task(name, schedule=None, concurrency=1, max_attempts=3, timeout=3600, enabled=True):
+    """Register a job function; enabled=False keeps it off the registry (e.g. unconfigured)"""
+
+    def decorator(func):
+        if enabled:
+            TASKS[name] = Task(name, func, schedule, concurrency, max_attempts, timeout)
+        return func
+    return decorator
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# ---------- Queueing ----------
+
+def enqueue(cur, name, run_at=None, dedupe_key=None, **args):
+    """Queue a job of a registered task. Returns its job_id, or None if dedupe_key was already queued."""
+    spec = TASKS[name]
+    cur.execute("""
+        INSERT INTO job (name, args, run_at, max_attempts, timeout_seconds, dedupe_key)
+        VALUES (%s, %s, COALESCE(%s, now()), %s, %s, %s)
+        ON CONFLICT (dedupe_key) DO NOTHING
+        RETURNING job_id
+    """, [name, json.dumps(args), run_at, spec.max_attempts, spec.timeout, dedupe_key])
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def schedule_due(cur, now=None):
+    """Queue the latest slot of every periodic task (once per slot). Returns the names queued."""
+    now = timezone.localtime(now)
+    queued = []
+    for spec in TASKS.values():
+        if spec.schedule is None:
+            continue
+        slot = spec.schedule.latest(now)
+        key = f'{spec.name}@{slot.isoformat(timespec="minutes")}'
+        if enqueue(cur, spec.name, run_at=slot, dedupe_key=key) is not None:
+            queued.append(spec.name)
+    return queued
+
+
+def claim(cur, limit, worker):
+    """
+    Mark up to `limit` due jobs RUNNING for `worker` and return their ids.
+    Run it inside transaction.atomic(). Jobs of unknown tasks (deployed on a
+    newer runner) and of tasks at their concurrency limit are left queued.
+    """
+    cur.execute("""
+        SELECT job_id, name
+        FROM job
+        WHERE status = 'QUEUED' AND run_at <= now()
+        ORDER BY run_at, job_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, [limit * 4])
+    candidates = cur.fetchall()
+
+    claimed = []
+    full = set()
+    for job_id, name in candidates:
+        if len(claimed) == limit:
+            break
+        spec = TASKS.get(name)
+        if spec is None or name in full:
+            continue
+        if spec.concurrency is not None:
+            # Runners claiming the same task take turns, so the count is exact
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ['job:' + name])
+            cur.execute("SELECT COUNT(*) FROM job WHERE name = %s AND status = 'RUNNING'", [name])
+            if cur.fetchone()[0] >= spec.concurrency:
+                full.add(name)
+                continue
+        cur.execute("""
+            UPDATE job
+            SET status = 'RUNNING', attempts = attempts + 1, locked_by = %s, locked_at = now()
+            WHERE job_id = %s
+        """, [worker, job_id])
+        claimed.append(job_id)
+    return claimed
+
+
+def _retry_or_fail(cur, job_ids):
+    """Requeue (with backoff) the jobs that have attempts left; fail the others"""
+    cur.execute("""
+        UPDATE job
+        SET status = CASE WHEN attempts < max_attempts THEN 'QUEUED' ELSE 'FAILED' END,
+            run_at = CASE WHEN attempts < max_attempts
+                          THEN now() + make_interval(secs => %s * 2 ^ (attempts - 1))
+                          ELSE run_at END,
+            finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE now() END,
+            locked_by = NULL,
+            locked_at = NULL
+        WHERE job_id = ANY(%s)
+    """, [RETRY_DELAY, list(job_ids)])
+
+
+def reap(cur):
+    """Retry or fail RUNNING jobs past their timeout (their runner died). Returns how many."""
+    cur.execute("""
+        SELECT job_id, attempts, locked_by, locked_at
+        FROM job
+        WHERE status = 'RUNNING'
+          AND locked_at < now() - make_interval(secs => timeout_seconds)
+        FOR UPDATE SKIP LOCKED
+    """)
+    abandoned = cur.fetchall()
+    for job_id, attempt, worker, started_at in abandoned:
+        cur.execute("""
+            INSERT INTO job_run (job_id, attempt, worker, started_at, succeeded, error)
+            VALUES (%s, %s, %s, %s, FALSE, 'timed out (runner stopped or job took too long)')
+        """, [job_id, attempt, worker, started_at])
+    if abandoned:
+        _retry_or_fail(cur, [row[0] for row in abandoned])
+    return len(abandoned)
+
+
+# ---------- Running ----------
+
+def init_worker():
+    """Process pool initializer: set up Django in a fresh (spawned) worker"""
+    import signal
+
+    import django
+    # Ctrl-C reaches the whole process group; the runner decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+    from . import tasks  # noqa: F401  registers the tasks
+
+
+def execute(job_id, worker):
+    """
+    Run one claimed job in this process and record the attempt. Returns
+    True when it succeeded. Output printed by the task is kept in job_run.
+    """
+    with connection.cursor() as cur:
+        cur.execute("SELECT name, args, attempts, locked_at FROM job WHERE job_id = %s", [job_id])
+        name, args, attempt, started_at = cur.fetchone()
+    if isinstance(args, str):
+        args = json.loads(args)
+
+    output = io.StringIO()
+    error = None
+    try:
+        with redirect_stdout(output):
+            result = TASKS[name].func(**args)
+        if result is not None:
+            output.write(str(result))
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        connection.close_if_unusable_or_obsolete()
+
+    with transaction.atomic(), connection.cursor() as cur:
+        # Only if it's still ours: reap() may have handed it on meanwhile
+        cur.execute("""
+            SELECT 1 FROM job
+            WHERE job_id = %s AND status = 'RUNNING' AND locked_by = %s AND attempts = %s
+            FOR UPDATE
+        """, [job_id, worker, attempt])
+        if cur.fetchone() is None:
+            return False
+        cur.execute("""
+            INSERT INTO job_run (job_id, attempt, worker, started_at, succeeded, output, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [job_id, attempt, worker, started_at, error is None, output.getvalue() or None, error])
+        if error is None:
+            cur.execute("""
+                UPDATE job
+                SET status = 'DONE', finished_at = now(), locked_by = NULL, locked_at = NULL
+                WHERE job_id = %s
+            """, [job_id])
+        else:
+            _retry_or_fail(cur, [job_id])
+    return error is None
+
+
+# ---------- History ----------
+
+def last_success(cur, name):
+    """When the latest successful run of a task finished, or None (one probe of idx_job_done)"""
+    cur.execute("""
+        SELECT finished_at
+        FROM job
+        WHERE name = %s AND status = 'DONE'
+        ORDER BY finished_at DESC
+        LIMIT 1
+    """, [name])
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def recent_runs(cur, limit=20):
+    cur.execute("""
+        SELECT j.job_id, j.name, j.status, r.attempt, r.worker, r.started_at, r.finished_at,
+               r.succeeded, r.error
+        FROM job_run r
+        JOIN job j ON j.job_id = r.job_id
+        ORDER BY r.run_id DESC
+        LIMIT %s
+    """, [limit])
+    return fetch_dicts(cur)
+
+
+def prune(cur, days):
+    """Delete finished jobs (and their runs) older than `days`. Returns how many."""
+    cur.execute("""
+        DELETE FROM job
+        WHERE status IN ('DONE', 'FAILED') AND finished_at < now() - make_interval(days => %s)
+    """, [days])
+    return cur.rowcount
@@ -0,0 +1,184 @@
+"""
+Live dashboard events: Postgres NOTIFY fanned out to server-sent events.
+
+Triggers in triggers.sql NOTIFY the budget_events channel when requests are
+created, deleted or edited, or get a decision. Each process
+runs one listener thread with its own connection that LISTENs on the channel
+and hands every event to the asyncio queue of each subscribed SSE stream.
+The number of database connections therefore doesn't grow with the number
+of open dashboards.
+
+Streams are long-lived, so serve the API with the ASGI app
+(uvicorn server.asgi:application) rather than the WSGI dev server, where
+each open stream ties up a worker thread.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+import psycopg2
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'budget_events'
+# How often idle streams get a keep-alive comment (and the listener wakes up)
+HEARTBEAT_SECONDS = 15
+# Events buffered per stream before it is told to resync instead
+QUEUE_SIZE = 100
+RECONNECT_SECONDS = (1, 2, 5, 10, 30)
+
+RESYNC = {'type': 'resync'}
+
+
+def _offer(queue, event):
+    """Runs on the subscriber's event loop"""
+    if queue.full():
+        # The client fell behind: drop what is queued and tell it to refetch
+        while not queue.empty():
+            queue.get_nowait()
+        event = RESYNC
+    queue.put_nowait(event)
+
+
+class Listener:
+    """One LISTEN connection per process, shared by every open stream"""
+
+    def __init__(self, channel=CHANNEL):
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._callbacks = []
+        self._thread = None
+
+    def subscribe(self, accepts=None):
+        """
+        Register the running event loop for events. accepts(event) -> bool
+        filters what this subscriber sees. Returns a queue; pass it to
+        unsubscribe() when the stream ends.
+        """
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue, accepts)
+        with self._lock:
+            self._subscribers.add(entry)
+            self._start()
+        queue.entry = entry
+        return queue
+
+    def add_callback(self, callback):
+        """
+        Call callback(event) from the listener thread for every event (and
+        for resyncs). Callbacks keep the listener running for the life of
+        the process.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            self._start()
+
+    def _start(self):
+        # caller holds self._lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='live-listener', daemon=True)
+            self._thread.start()
+
+    def _active(self):
+        with self._lock:
+            if self._subscribers or self._callbacks:
+                return True
+            self._thread = None
+            return False
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.discard(queue.entry)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception('live listener callback failed')
+        for loop, queue, accepts in subscribers:
+            if event is not RESYNC and accepts is not None and not accepts(event):
+                continue
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                pass  # loop already closed; the stream's finally will unsubscribe
+
+    def _connect(self):
+        params = connection.get_connection_params()
+        params.pop('cursor_factory', None)
+        conn = psycopg2.connect(**params)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN {self.channel}')
+        return conn
+
+    def _run(self):
+        failures = 0
+        while self._active():
+            try:
+                conn = self._connect()
+            except psycopg2.Error:
+                delay = RECONNECT_SECONDS[min(failures, len(RECONNECT_SECONDS) - 1)]
+                logger.warning('live listener could not connect; retrying in %ss', delay, exc_info=True)
+                failures += 1
+                time.sleep(delay)
+                continue
+
+            if failures:
+                # Events may have been missed while disconnected
+                self.publish(RESYNC)
+            failures = 0
+            try:
+                self._listen(conn)
+            except (psycopg2.Error, OSError):
+                logger.warning('live listener lost its connection', exc_info=True)
+                failures = 1
+            finally:
+                conn.close()
+
+    def _listen(self, conn):
+        while self._active():
+            readable, _, _ = select.select([conn], [], [], HEARTBEAT_SECONDS)
+            if not readable:
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    event = json.loads(notify.payload)
+                except ValueError:
+                    logger.warning('ignoring malformed %s payload: %r', self.channel, notify.payload)
+                    continue
+                self.publish(event)
+
+
+listener = Listener()
+
+
+def format_sse(event, name='message'):
+    return f'event: {name}\ndata: {json.dumps(event, separators=(",", ":"))}\n\n'
+
+
+async def event_stream(accepts=None):
+    """Async iterator of SSE frames for one client"""
+    queue = listener.subscribe(accepts)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield format_sse(event, 'resync' if event is RESYNC else event.get('table', 'message'))
+    finally:
+        listener.unsubscribe(queue)
@@ -0,0 +1,94 @@
+"""
+Move closed fiscal years out of the hot tables into the archive schema.
+
+    python manage.py archive_fiscal_years --keep-years 3            # archive years ended 3+ years ago
+    python manage.py archive_fiscal_years --year 2021 --export-dir /srv/archive
+    python manage.py archive_fiscal_years --keep-years 3 --tablespace cold_storage --dry-run
+
+Only fiscal years that have ended are archived, and a year that still has
+PENDING requests is skipped unless --include-pending is given. Each year is
+archived in its own transaction (see api/archive.py for what moves).
+--export-dir also writes the year's archived rows as gzipped CSV files, and
+--tablespace moves the archived partitions to a tablespace on cheaper
+storage, which must already exist.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api import archive, partitions
+
+
+class Command(BaseCommand):
+    help = 'Archive closed fiscal years into the archive schema'
+
+    def add_arguments(self, parser):
+        which = parser.add_mutually_exclusive_group(required=True)
+        which.add_argument('--year', type=int, action='append',
+                           help='Archive the fiscal year starting in this calendar year (repeatable)')
+        which.add_argument('--keep-years', type=int,
+                           help='Archive fiscal years that ended more than this many years '
+                                'before the current one')
+        parser.add_argument('--include-pending', action='store_true',
+                            help='Archive years that still have PENDING requests')
+        parser.add_argument('--export-dir',
+                            help='Also write each archived year as gzipped CSV under this directory')
+        parser.add_argument('--tablespace',
+                            help='Move the archived partitions to this tablespace')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Show what would be archived, then roll back')
+
+    def handle(self, *args, **options):
+        current = partitions.fiscal_year_start(date.today())
+
+        with connection.cursor() as cur:
+            attached = sorted({
+                first_day for _, first_day, _ in partitions.attached_partitions(cur, 'budget_request')
+            })
+
+        if options['year']:
+            start_month = current.month
+            starts = sorted({date(year, start_month, 1) for year in options['year']})
+            for start in starts:
+                if start >= current:
+                    raise CommandError(f'fiscal year {start} has not ended yet')
+                if start not in attached:
+                    raise CommandError(f'fiscal year {start} is not in the hot tables')
+        else:
+            if options['keep_years'] < 0:
+                raise CommandError('--keep-years must not be negative')
+            before = current.replace(year=current.year - options['keep_years'])
+            starts = [start for start in attached if start.replace(year=start.year + 1) <= before]
+
+        archived = 0
+        for start in starts:
+            with transaction.atomic():
+                with connection.cursor() as cur:
+                    if not options['include_pending'] and partitions.has_pending(cur, start):
+                        self.stdout.write(self.style.WARNING(
+                            f'  skipped  fiscal year {start}: it still has PENDING requests'
+                        ))
+                        continue
+                    try:
+                        counts = archive.archive_fiscal_year(cur, start, options['tablespace'])
+                    except ValueError as exc:
+                        raise CommandError(str(exc))
+
+                    self.stdout.write(f'  archived fiscal year {start}')
+                    for table, n in counts.items():
+                        self.stdout.write(f'    {table:<28} {n:>12,}')
+
+                    if options['export_dir'] and not options['dry_run']:
+                        for path in archive.export_fiscal_year(cur, start, options['export_dir']):
+                            self.stdout.write(f'    wrote {path}')
+
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+                else:
+                    archived += 1
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: rolled back'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'{archived} fiscal year(s) archived'))
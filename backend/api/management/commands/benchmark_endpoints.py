@@ -0,0 +1,248 @@
+"""
+Endpoint benchmarks with latency percentiles.
+
+Drives the scenarios from api/scenarios.py (every route in api/urls.py) with
+concurrent virtual users per role and reports p50/p95/p99 latency, throughput
+and queries per request for each endpoint.
+
+    python manage.py benchmark_endpoints --users-per-role 8 --iterations 50 \\
+        --output benchmarks/$(git rev-parse --short HEAD).json
+    python manage.py benchmark_endpoints --compare benchmarks/abc1234.json
+
+By default requests go through django.test.Client in-process, so query counts
+are available. With --base-url the same read-only scenarios are sent to a
+running server instead (log in with --admin-email/--treasurer-email and
+--password). Either way, point the settings at a local Postgres, ideally one
+loaded with generate_data.
+"""
+import json
+import math
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from api.scenarios import build_scenarios, login_client, resolve_fixtures, rolled_back, run_scenario
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, wall_seconds):
+    """samples: list of (elapsed_ms, status_code, query_count or None)"""
+    timings = sorted(s[0] for s in samples)
+    queries = [s[2] for s in samples if s[2] is not None]
+    return {
+        'count': len(samples),
+        'errors': sum(1 for s in samples if s[1] >= 500),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'throughput_rps': round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class _ServerClient:
+    """Just enough of the test Client's interface to replay scenarios over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header('Accept', 'application/json')
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            with self.opener.open(req) as res:
+                res.read()
+                return res.status
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return exc.code
+
+    def login(self, email, password):
+        status = self.request('POST', '/api/login/', {'email': email, 'password': password})
+        if status != 200:
+            raise CommandError(f'Login as {email} failed with HTTP {status}')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API/HTML route with concurrent virtual users per role'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users-per-role', type=int, default=4,
+                            help='Concurrent virtual users for each role (ADMIN, TREASURER, anonymous)')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Passes each virtual user makes over its role\'s scenarios')
+        parser.add_argument('--warmup', type=int, default=1,
+                            help='Untimed passes before measuring')
+        parser.add_argument('--scenario', action='append', default=[],
+                            help='Only run the named scenario (repeatable)')
+        parser.add_argument('--include-writes', action='store_true',
+                            help='Also run write scenarios (each inside a rolled-back transaction)')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='Print p95 deltas against an earlier results file')
+        parser.add_argument('--base-url', help='Benchmark a running server instead of the test client')
+        parser.add_argument('--admin-email')
+        parser.add_argument('--treasurer-email')
+        parser.add_argument('--password')
+
+    def handle(self, *args, **options):
+        try:
+            fx = resolve_fixtures()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        server = options['base_url']
+        if server and not (options['admin_email'] and options['treasurer_email'] and options['password']):
+            raise CommandError('--base-url needs --admin-email, --treasurer-email and --password')
+
+        scenarios = build_scenarios(fx)
+        if options['scenario']:
+            scenarios = [s for s in scenarios if s['name'] in options['scenario']]
+        if server or not options['include_writes']:
+            # A live server can't roll writes back (and HTML forms need CSRF tokens)
+            scenarios = [s for s in scenarios if not s['writes']]
+        if not scenarios:
+            raise CommandError('No scenarios selected')
+
+        by_role = {}
+        for scenario in scenarios:
+            by_role.setdefault(scenario['role'], []).append(scenario)
+
+        samples = {s['name']: [] for s in scenarios}
+        session_cookie = settings.SESSION_COOKIE_NAME
+        lock = threading.Lock()
+        errors = []
+
+        def virtual_user(role, role_scenarios):
+            try:
+                if server:
+                    client = _ServerClient(server)
+                    if role is not None:
+                        email = options['admin_email'] if role == 'ADMIN' else options['treasurer_email']
+                        client.login(email, options['password'])
+                else:
+                    client = login_client(Client(), fx, role)
+
+                for iteration in range(options['warmup'] + options['iterations']):
+                    for scenario in role_scenarios:
+                        result = self._timed(client, scenario, server)
+                        if iteration >= options['warmup']:
+                            with lock:
+                                samples[scenario['name']].append(result)
+                        if not server and role is not None:
+                            cookie = client.cookies.get(session_cookie)
+                            if not (cookie and cookie.value):
+                                login_client(client, fx, role)  # the logout scenario ends the session
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=virtual_user, args=(role, role_scenarios))
+            for role, role_scenarios in by_role.items()
+            for _ in range(options['users_per_role'])
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+
+        if errors:
+            raise CommandError(f'{len(errors)} virtual user(s) failed: {errors[0]!r}')
+
+        all_samples = [s for values in samples.values() for s in values]
+        results = {
+            'commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'mode': 'server' if server else 'client',
+            'users_per_role': options['users_per_role'],
+            'iterations': options['iterations'],
+            'wall_seconds': round(wall, 3),
+            'endpoints': {name: summarize(values, wall) for name, values in samples.items() if values},
+            'total': summarize(all_samples, wall),
+        }
+
+        self._print(results)
+        if options['compare']:
+            self._print_comparison(results, json.loads(Path(options['compare']).read_text()))
+        if options['output']:
+            path = Path(options['output'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
+
+    def _timed(self, client, scenario, server):
+        if server:
+            started = time.perf_counter()
+            status = client.request(scenario['method'], scenario['path'], scenario['json'])
+            return (time.perf_counter() - started) * 1000, status, None
+
+        with rolled_back() if scenario['writes'] else nullcontext():
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = run_scenario(client, scenario)
+                elapsed = (time.perf_counter() - started) * 1000
+        queries = [q for q in ctx.captured_queries if 'django_session' not in q['sql']]
+        return elapsed, response.status_code, len(queries)
+
+    def _print(self, results):
+        header = f"{'endpoint':<32} {'n':>6} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>8} {'q/req':>6}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        rows = sorted(results['endpoints'].items()) + [('TOTAL', results['total'])]
+        for name, r in rows:
+            qpr = '' if r['queries_per_request'] is None else f"{r['queries_per_request']:.1f}"
+            self.stdout.write(
+                f"{name:<32} {r['count']:>6} {r['errors']:>4} {r['p50_ms']:>8.2f}ms "
+                f"{r['p95_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms {r['throughput_rps']:>8.1f} {qpr:>6}"
+            )
+
+    def _print_comparison(self, results, previous):
+        self.stdout.write(f"\nCompared with {previous.get('commit', '?')} ({previous.get('created_at', '?')}):")
+        for name, r in sorted(results['endpoints'].items()):
+            old = previous.get('endpoints', {}).get(name)
+            if not old:
+                self.stdout.write(f'{name:<32} (new)')
+                continue
+            change = (r['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+            style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+            self.stdout.write(style(
+                f"{name:<32} p95 {old['p95_ms']:>8.2f}ms -> {r['p95_ms']:>8.2f}ms ({change:+.1f}%)"
+            ))
@@ -0,0 +1,105 @@
+"""
+Microbenchmark for API response serialization.
+
+Builds synthetic rows shaped like the request list endpoints return and times
+turning them into a response body three ways: the old per-field
+isoformat()/float() mapping plus JsonResponse, json_response() with the
+stdlib encoder, and json_response() with orjson (when installed).
+
+    python manage.py benchmark_serialization --rows 10000 --repeat 20
+
+Needs no database.
+"""
+import datetime
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+
+from api import responses
+
+
+def synthetic_rows(n, seed=0):
+    """Rows as fetch_dicts() would return them for the budget request list"""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1, 9, 0)
+    return [
+        {
+            'request_id': i,
+            'month': datetime.date(2024, 1 + i % 12, 1),
+            'description': f'Monthly programme budget #{i}',
+            'status': rng.choice(('PENDING', 'APPROVED', 'REJECTED')),
+            'created_at': start + datetime.timedelta(minutes=i),
+            'requester': f'Treasurer {i % 500}',
+            'requester_id': i % 500 + 1,
+            'total_amount': Decimal(rng.randint(1000, 500000)) / 100,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def legacy(rows):
+    """What the views did before: convert every field by hand, then JsonResponse"""
+    data = [
+        {
+            'request_id': r['request_id'],
+            'month': r['month'].isoformat() if r['month'] else None,
+            'description': r['description'],
+            'status': r['status'],
+            'created_at': r['created_at'].isoformat() if r['created_at'] else None,
+            'requester': r['requester'],
+            'requester_id': r['requester_id'],
+            'total_amount': float(r['total_amount']) if r['total_amount'] else 0,
+        }
+        for r in rows
+    ]
+    return JsonResponse({'requests': data})
+
+
+def with_backend(dumps):
+    def serialize(rows):
+        responses._dumps = dumps
+        return responses.json_response({'requests': rows})
+    return serialize
+
+
+class Command(BaseCommand):
+    help = 'Time JSON serialization of a large result set with each available encoder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per encoder; the median is reported')
+
+    def handle(self, *args, **options):
+        rows = synthetic_rows(options['rows'])
+        candidates = [
+            ('legacy JsonResponse', legacy),
+            ('json_response stdlib', with_backend(responses._stdlib_dumps)),
+        ]
+        if responses.orjson is not None:
+            candidates.append(('json_response orjson', with_backend(responses._orjson_dumps)))
+        else:
+            self.stdout.write(self.style.WARNING('orjson is not installed; skipping it'))
+
+        saved = responses._dumps
+        results = []
+        try:
+            for name, serialize in candidates:
+                serialize(rows)  # warm up
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    response = serialize(rows)
+                    timings.append((time.perf_counter() - started) * 1000)
+                results.append((name, statistics.median(timings), len(response.content)))
+        finally:
+            responses._dumps = saved
+
+        baseline = results[0][1]
+        self.stdout.write(f"{options['rows']} rows, median of {options['repeat']} runs")
+        for name, ms, size in results:
+            self.stdout.write(f'  {name:<22} {ms:>9.2f} ms  {size:>10,} bytes  x{baseline / ms:.1f}')
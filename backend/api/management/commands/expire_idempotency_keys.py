@@ -0,0 +1,45 @@
+"""
+Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL_HOURS.
+
+    python manage.py expire_idempotency_keys
+    python manage.py expire_idempotency_keys --batch-size 5000
+
+Expired keys are already ignored by api/idempotency.py, so this only keeps
+the table small; run it from cron (hourly or daily). Rows are deleted in
+batches so no single transaction holds many row locks.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows deleted per transaction (default 10000)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        deleted = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM idempotency_key
+                    WHERE (user_id, idem_key) IN (
+                        SELECT user_id, idem_key
+                        FROM idempotency_key
+                        WHERE created_at < now() - make_interval(hours => %s)
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                """, [settings.IDEMPOTENCY_KEY_TTL_HOURS, options['batch_size']])
+                count = cur.rowcount
+            deleted += count
+            if count < options['batch_size']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted:,} expired idempotency key(s) deleted'))
@@ -0,0 +1,314 @@
+"""
+EXPLAIN plan regression harness.
+
+Replays every scenario from api/scenarios.py through the Django test client
+and, just before each SQL statement a view runs, runs it under
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) in a savepoint that is rolled back.
+A write is thus analyzed against the same data the view's own statement
+then sees, rather than replayed after it (where an INSERT would hit its own
+row's unique key). Plan shape, cost and latency are
+compared with a baseline file; the command fails when a statement starts
+sequentially scanning a big table, stops using one of the indexes listed in
+EXPECTED_INDEXES, or gets slower than its baseline allows.
+
+    python manage.py explain_plans --record    # write/refresh the baselines
+    python manage.py explain_plans             # compare against the baselines
+
+Run it against a local Postgres loaded with a large dataset (see the
+generate_data command). Write scenarios run inside a transaction that is
+rolled back, so the data is left untouched.
+"""
+import hashlib
+import json
+import re
+import statistics
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test import Client
+
+from api.audit import without_actor
+from api.scenarios import build_scenarios, login_client, resolve_fixtures, rolled_back, run_scenario
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR).parent / 'database' / 'plan_baselines.json'
+
+# Indexes from schema.sql that the hot queries must use once the table they
+# belong to is big enough for the planner to prefer them over a seq scan.
+EXPECTED_INDEXES = {
+    'api_admin_dashboard': [
+        ('budget_request', 'idx_budget_request_pending_created'),
+        ('budget_request', 'idx_budget_request_created'),
+    ],
+    'api_pending_requests': [('budget_request', 'idx_budget_request_pending_created')],
+    'api_treasurer_dashboard': [('budget_request', 'idx_budget_request_requester_created')],
+    'api_budget_list_treasurer': [('budget_request', 'idx_budget_request_requester_created')],
+    'api_budget_detail': [('approval', 'idx_approval_request_decided')],
+    'api_budget_changes_admin': [('budget_request_change', 'idx_budget_request_change_cursor')],
+    'api_budget_changes_treasurer': [
+        ('budget_request_change', 'idx_budget_request_change_requester_cursor'),
+    ],
+    'api_budget_search_admin': [
+        ('budget_request', 'idx_budget_request_search'),
+        ('users', 'idx_users_name_trgm'),
+        ('requested_event', 'idx_requested_event_name_trgm'),
+    ],
+}
+
+# EXECUTE covers the prepared statements of api/queries.py; they are still
+# prepared on this connection when the statement is explained
+EXPLAINABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|EXECUTE)\b', re.IGNORECASE)
+IGNORED_TABLES = re.compile(r'\bdjango_\w+', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """Normalize literals and whitespace so the same statement maps to the same key"""
+    normalized = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    normalized = re.sub(r'\b\d+(?:\.\d+)?\b', '?', normalized)
+    normalized = ' '.join(normalized.split())
+    return hashlib.sha1(normalized.lower().encode('utf-8')).hexdigest()[:12], normalized
+
+
+def partition_roots():
+    """
+    Partition (and partition index) name -> its partitioned table (or index).
+    Plans are reported against the partitioned table, so baselines and
+    EXPECTED_INDEXES don't change as fiscal-year partitions come and go.
+    """
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, root.relname
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_class root ON root.oid = pg_partition_root(c.oid)
+            WHERE n.nspname = current_schema()
+              AND c.relispartition
+        """)
+        return dict(cur.fetchall())
+
+
+def big_tables(min_rows):
+    """Tables with at least min_rows rows; a partitioned table counts all its partitions"""
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT COALESCE(root.relname, c.relname)
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_class root ON c.relispartition AND root.oid = pg_partition_root(c.oid)
+            WHERE n.nspname = current_schema()
+              AND c.relkind = 'r'
+            GROUP BY 1
+            HAVING SUM(GREATEST(c.reltuples, 0)) >= %s
+        """, [min_rows])
+        return {r[0] for r in cur.fetchall()}
+
+
+def summarize_plan(explain_output, big, roots=None):
+    """Reduce EXPLAIN JSON to the parts we baseline: node shape, seq scans, cost, time, buffers"""
+    roots = roots or {}
+    if isinstance(explain_output, str):
+        explain_output = json.loads(explain_output)
+    root = explain_output[0]
+    plan = root['Plan']
+
+    nodes = []
+    seq_scans = set()
+
+    def walk(node):
+        label = node['Node Type']
+        relation = roots.get(node.get('Relation Name'), node.get('Relation Name'))
+        if relation:
+            label += f' on {relation}'
+        if 'Index Name' in node:
+            label += f" using {roots.get(node['Index Name'], node['Index Name'])}"
+        nodes.append(label)
+        if node['Node Type'] == 'Seq Scan' and relation in big:
+            seq_scans.add(relation)
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan)
+    return {
+        'nodes': nodes,
+        'seq_scans': sorted(seq_scans),
+        'total_cost': plan.get('Total Cost'),
+        'execution_ms': root.get('Execution Time'),
+        'shared_buffers': plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0),
+    }
+
+
+def explain(sql, params, big, repeat, roots=None):
+    """EXPLAIN ANALYZE one statement `repeat` times (each in a rolled-back savepoint)"""
+    runs = []
+    for _ in range(repeat):
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                cur.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+                runs.append(summarize_plan(cur.fetchone()[0], big, roots))
+            transaction.set_rollback(True)
+
+    summary = runs[-1]
+    timings = [r['execution_ms'] for r in runs if r['execution_ms'] is not None]
+    summary['execution_ms'] = round(statistics.median(timings), 3) if timings else None
+    return summary
+
+
+class PlanRecorder:
+    """
+    connection.execute_wrapper that explains each statement before letting
+    it run. plans collects (sql with its parameters inlined, plan summary or
+    {'error': ...}) in execution order.
+    """
+
+    def __init__(self, big, repeat, roots):
+        self.big, self.repeat, self.roots = big, repeat, roots
+        self.plans = []
+        self._explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = without_actor(sql)
+        if self._explaining or many or not EXPLAINABLE.match(statement) or IGNORED_TABLES.search(statement):
+            return execute(sql, params, many, context)
+        self._explaining = True   # the savepoints and EXPLAINs below pass through here too
+        try:
+            with connection.cursor() as cur:
+                text = cur.mogrify(statement, params).decode()
+            try:
+                entry = explain(statement, params, self.big, self.repeat, self.roots)
+            except DatabaseError as exc:
+                entry = {'error': str(exc).strip()}
+        finally:
+            self._explaining = False
+        self.plans.append((text, entry))
+        return execute(sql, params, many, context)
+
+
+def missing_indexes(scenario_name, entries, big):
+    """Expected indexes (on big tables) that none of the scenario's plans used"""
+    used = ' | '.join(label for e in entries for label in e.get('nodes', []))
+    return [
+        index for table, index in EXPECTED_INDEXES.get(scenario_name, [])
+        if table in big and f'using {index}' not in used
+    ]
+
+
+def compare(current, baseline, tolerance, slack_ms):
+    failures = []
+    notes = []
+    for key, cur in sorted(current.items()):
+        base = baseline.get(key)
+        if base is None:
+            notes.append(f'{key}: no baseline recorded')
+            continue
+        if 'error' in cur:
+            failures.append(f"{key}: {cur['error']}")
+            continue
+
+        new_scans = sorted(set(cur['seq_scans']) - set(base.get('seq_scans', [])))
+        if new_scans:
+            failures.append(f"{key}: new sequential scan on {', '.join(new_scans)}")
+
+        if cur['execution_ms'] is not None and base.get('execution_ms') is not None:
+            limit = base['execution_ms'] * (1 + tolerance) + slack_ms
+            if cur['execution_ms'] > limit:
+                failures.append(
+                    f"{key}: {cur['execution_ms']:.2f} ms exceeds baseline "
+                    f"{base['execution_ms']:.2f} ms (limit {limit:.2f} ms)"
+                )
+
+        if cur['nodes'] != base.get('nodes'):
+            notes.append(f'{key}: plan shape changed')
+    return failures, notes
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN every SQL statement the views run and compare plans against baselines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--record', action='store_true',
+                            help='Write the current plans as the new baselines')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                            help='Baseline JSON file (default: database/plan_baselines.json)')
+        parser.add_argument('--scenario', action='append', default=[],
+                            help='Only run the named scenario (repeatable)')
+        parser.add_argument('--skip-writes', action='store_true',
+                            help='Skip scenarios that write (POST/PUT/DELETE)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='EXPLAIN ANALYZE runs per statement; the median time is kept')
+        parser.add_argument('--big-table-rows', type=int, default=10000,
+                            help='Tables with at least this many rows must not be seq-scanned')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed relative slowdown over the baseline (0.5 = +50%%)')
+        parser.add_argument('--slack-ms', type=float, default=2.0,
+                            help='Absolute slowdown always allowed, to absorb noise on fast queries')
+
+    def handle(self, *args, **options):
+        try:
+            fx = resolve_fixtures()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        scenarios = build_scenarios(fx)
+        if options['scenario']:
+            scenarios = [s for s in scenarios if s['name'] in options['scenario']]
+        if options['skip_writes']:
+            scenarios = [s for s in scenarios if not s['writes']]
+
+        big = big_tables(options['big_table_rows'])
+        roots = partition_roots()
+        current = {}
+        failures = []
+
+        for scenario in scenarios:
+            client = login_client(Client(), fx, scenario['role'])
+            seen = {}
+            entries = []
+            recorder = PlanRecorder(big, options['repeat'], roots)
+            with rolled_back():
+                with connection.execute_wrapper(recorder):
+                    response = run_scenario(client, scenario)
+                if response.status_code >= 500:
+                    failures.append(f"{scenario['name']}: view returned {response.status_code}")
+
+            for sql, entry in recorder.plans:
+                fp, normalized = fingerprint(sql)
+                seen[fp] = seen.get(fp, 0) + 1
+                key = f"{scenario['name']}:{fp}"
+                if seen[fp] > 1:
+                    key += f'#{seen[fp]}'
+                entry['sql'] = normalized
+                current[key] = entry
+                entries.append(entry)
+
+            for index in missing_indexes(scenario['name'], entries, big):
+                failures.append(f"{scenario['name']}: expected plan to use {index}")
+
+            self.stdout.write(
+                f"{scenario['name']:<32} {response.status_code}  "
+                f"{len(recorder.plans)} statement(s)"
+            )
+
+        path = Path(options['baseline'])
+        baseline = json.loads(path.read_text()) if path.exists() else {}
+
+        if options['record']:
+            if options['scenario']:
+                prefixes = tuple(f'{name}:' for name in options['scenario'])
+                baseline = {k: v for k, v in baseline.items() if not k.startswith(prefixes)}
+                baseline.update(current)
+            else:
+                baseline = current
+            path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Recorded {len(current)} plan(s) to {path}'))
+            return
+
+        regressions, notes = compare(current, baseline, options['tolerance'], options['slack_ms'])
+        failures.extend(regressions)
+        for note in notes:
+            self.stdout.write(self.style.WARNING(note))
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(failure))
+            raise CommandError(f'{len(failures)} plan regression(s)')
+        self.stdout.write(self.style.SUCCESS(f'{len(current)} plan(s) match the baselines'))
@@ -0,0 +1,222 @@
+"""
+Generate a large, referentially consistent dataset for benchmarks and plan tests.
+
+    python manage.py generate_data --truncate --cities 2000 --requests 2000000 --workers 8
+
+Cities and users are loaded first; requests and everything hanging off them
+(events, breakdown lines, approvals, held events, expenses, receipts,
+disbursements, petty cash statements and expenses) are generated in chunks of
+cities by a pool of worker processes, each COPYing its own chunk. The same
+--seed and scale options always produce the same rows (see api/datagen.py).
+
+Trigger-maintained columns are written directly, so user triggers are
+disabled on the loaded tables for the duration of the load. Only run this
+against a local development database.
+"""
+import csv
+import io
+import os
+import time
+from datetime import date
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import datagen, partitions
+
+# Same list (and order) seed.sql truncates
+APP_TABLES = [
+    'disbursement', 'deposit', 'cash_collection', 'petty_cash_expense', 'petty_cash_statement',
+    'receipt', 'expense', 'event', 'approval', 'approval_queue', 'budget_request_change',
+    'audit_log', 'idempotency_key', 'notification', 'requested_break_down_line', 'requested_event',
+    'budget_request', 'users', 'category', 'city',
+    'archive.archived_request', 'archive.receipt', 'archive.expense', 'archive.disbursement',
+    'archive.approval', 'archive.requested_break_down_line', 'archive.requested_event',
+    'archive.budget_request',
+]
+
+ID_COLUMNS = {
+    'city': 'city_id',
+    'users': 'user_id',
+    'budget_request': 'request_id',
+    'requested_event': 'req_event_id',
+    'requested_break_down_line': 'line_id',
+    'approval': 'approval_id',
+    'event': 'event_id',
+    'expense': 'expense_id',
+    'receipt': 'receipt_id',
+    'disbursement': 'disb_id',
+    'petty_cash_statement': 'pcs_id',
+    'petty_cash_expense': 'pcx_id',
+}
+
+# Statements run after the load, while user triggers are still disabled, to
+# rebuild data that triggers normally maintain but the generator does not
+# write itself.
+POST_LOAD_SQL = [
+    "UPDATE budget_request "
+    "SET search_document = request_search_document(request_id, month, description, requester_name)",
+    # What trg_budget_request_queue does for each new PENDING request
+    "INSERT INTO approval_queue (request_id, request_month, stage_no, approver_role, enqueued_at) "
+    "SELECT br.request_id, br.month, s.stage_no, s.approver_role, br.created_at "
+    "FROM budget_request br, (SELECT * FROM approval_stage ORDER BY stage_no LIMIT 1) s "
+    "WHERE br.status = 'PENDING' "
+    "ON CONFLICT (request_id, request_month) DO NOTHING",
+    # Normally kept fresh by the refresh_monthly_totals job
+    "REFRESH MATERIALIZED VIEW mv_monthly_totals",
+]
+
+
+def _dsn():
+    db = settings.DATABASES['default']
+    dsn = {'dbname': db['NAME'], 'user': db['USER'], 'password': db['PASSWORD']}
+    if db.get('HOST'):
+        dsn['host'] = db['HOST']
+    if db.get('PORT'):
+        dsn['port'] = db['PORT']
+    return dsn
+
+
+def _copy_rows(cur, table, columns, rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic cities, users, requests, expenses and petty cash at scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--cities', type=int, default=1000)
+        parser.add_argument('--treasurers-per-city', type=int, default=3)
+        parser.add_argument('--admins', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=100000,
+                            help='Total budget requests, spread across cities with a Zipf-like skew')
+        parser.add_argument('--months', type=int, default=36,
+                            help='How many months of history to spread requests over')
+        parser.add_argument('--end-month', default=None,
+                            help='Newest month as YYYY-MM (default: current month)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=20000,
+                            help='Approximate number of requests per worker chunk')
+        parser.add_argument('--password', default='password',
+                            help='Password every generated user can log in with')
+        parser.add_argument('--truncate', action='store_true',
+                            help='Empty all application tables first (like seed.sql does)')
+
+    def handle(self, *args, **options):
+        if options['cities'] < 1 or options['treasurers_per_city'] < 1 or options['admins'] < 1:
+            raise CommandError('--cities, --treasurers-per-city and --admins must be at least 1')
+
+        if options['end_month']:
+            try:
+                end_month = date.fromisoformat(options['end_month'] + '-01')
+            except ValueError:
+                raise CommandError('--end-month must look like YYYY-MM')
+        else:
+            end_month = date.today().replace(day=1)
+
+        months = datagen.month_starts(end_month, options['months'])
+
+        started = time.monotonic()
+        with connection.cursor() as cur:
+            if options['truncate']:
+                cur.execute(f"TRUNCATE TABLE {', '.join(APP_TABLES)} RESTART IDENTITY CASCADE")
+
+            try:
+                partitions.ensure_partitions(cur, months[0], months[-1])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+            offsets = {}
+            for table, column in ID_COLUMNS.items():
+                cur.execute(f'SELECT COALESCE(MAX({column}), 0) FROM {table}')
+                offsets[table] = cur.fetchone()[0]
+
+            cur.execute('SELECT category_id FROM category ORDER BY category_id')
+            categories = [r[0] for r in cur.fetchall()]
+            if not categories:
+                for name in datagen.DEFAULT_CATEGORIES:
+                    cur.execute('INSERT INTO category (name) VALUES (%s) RETURNING category_id', [name])
+                    categories.append(cur.fetchone()[0])
+
+        spec = {
+            'seed': options['seed'],
+            'cities': options['cities'],
+            'treasurers_per_city': options['treasurers_per_city'],
+            'admins': options['admins'],
+            'requests': options['requests'],
+            'months': [m.isoformat() for m in months],
+            'offsets': offsets,
+            'categories': categories,
+            'dsn': _dsn(),
+        }
+        cities = datagen.city_rows(spec)
+        spec['city_names'] = [name for _, name, _ in cities]
+
+        self.stdout.write(
+            f"Generating {options['requests']} requests for {options['cities']} cities "
+            f"({spec['months'][0][:7]} to {spec['months'][-1][:7]}), seed {options['seed']}"
+        )
+
+        loaded = datagen.COLUMNS.keys() | {'city', 'users'}
+        self._set_user_triggers(loaded, enabled=False)
+        try:
+            with connection.cursor() as cur:
+                _copy_rows(cur, 'city', ['city_id', 'name', 'province'], cities)
+                _copy_rows(
+                    cur, 'users',
+                    ['user_id', 'name', 'email', 'whatsapp', 'role', 'password_hash', 'city_id', 'is_active'],
+                    datagen.user_rows(spec, make_password(options['password'])),
+                )
+
+            counts = datagen.requests_per_city(spec)
+            chunks = datagen.plan_chunks(counts, options['chunk_size'])
+            totals = dict.fromkeys(datagen.COLUMNS, 0)
+
+            # Workers open their own connections; don't hand ours to forked children
+            connection.close()
+            with Pool(processes=max(1, options['workers'])) as pool:
+                jobs = [(spec, chunk) for chunk in chunks]
+                for done, chunk_counts in enumerate(pool.imap_unordered(datagen.load_chunk, jobs), 1):
+                    for table, n in chunk_counts.items():
+                        totals[table] += n
+                    self.stdout.write(
+                        f'  chunk {done}/{len(chunks)} loaded '
+                        f"({totals['budget_request']} requests so far)"
+                    )
+
+            with connection.cursor() as cur:
+                for sql in POST_LOAD_SQL:
+                    cur.execute(sql)
+        finally:
+            self._set_user_triggers(loaded, enabled=True)
+
+        with connection.cursor() as cur:
+            for table, column in ID_COLUMNS.items():
+                cur.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                    f'GREATEST((SELECT MAX({column}) FROM {table}), 1))'
+                )
+            for table in loaded:
+                cur.execute(f'ANALYZE {table}')
+
+        totals['city'] = len(cities)
+        totals['users'] = options['cities'] * options['treasurers_per_city'] + options['admins']
+        for table in sorted(totals):
+            self.stdout.write(f'  {table:<28} {totals[table]:>12,}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {time.monotonic() - started:.1f}s. '
+            f"All generated users log in with password '{options['password']}'."
+        ))
+
+    def _set_user_triggers(self, tables, enabled):
+        action = 'ENABLE' if enabled else 'DISABLE'
+        with connection.cursor() as cur:
+            for table in sorted(tables):
+                cur.execute(f'ALTER TABLE {table} {action} TRIGGER USER')
@@ -0,0 +1,51 @@
+"""
+Create user accounts in bulk from a CSV or JSON file (see api/provisioning.py).
+
+    python manage.py import_users volunteers.csv
+    python manage.py import_users volunteers.json --workers 8
+    python manage.py import_users volunteers.csv --dry-run
+
+CSV files need a header row with name, email, role, city_id and password
+(whatsapp optional); JSON files a list of objects with the same keys.
+Rows that can't be created (bad fields, duplicate emails) are listed and
+skipped; the others are created in one statement.
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import provisioning
+
+
+class Command(BaseCommand):
+    help = 'Create user accounts from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON (.json) file of users')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes hashing passwords (default PASSWORD_HASH_WORKERS)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate only; create nothing')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        try:
+            text = path.read_text(encoding='utf-8-sig')
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(f'cannot read {path}: {exc}')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        try:
+            rows = (provisioning.parse_json(text) if path.suffix.lower() == '.json'
+                    else provisioning.parse_csv(text))
+            result = provisioning.import_users(rows, options['workers'], options['dry_run'])
+        except provisioning.ImportRejected as exc:
+            raise CommandError(str(exc))
+
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(
+                f"  row {error['row']:>4}  {error['email'] or '—':<40} {error['detail']}"))
+        verb = 'would create' if options['dry_run'] else 'created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result['created'])} user(s), skipped {len(result['errors'])} row(s)"))
@@ -0,0 +1,96 @@
+"""
+Keep the fiscal-year partitions of budget_request and its child tables ahead
+of the calendar, and optionally detach old years.
+
+    python manage.py manage_partitions                  # create this year + 2 ahead
+    python manage.py manage_partitions --keep-years 5   # also detach older years
+    python manage.py manage_partitions --keep-years 5 --dry-run
+    python manage.py manage_partitions --keep-audit-months 24   # drop older audit months
+
+Run it from cron (monthly is plenty). Detached partitions are left in the
+database as standalone tables, e.g. budget_request_p2020_04, to be archived
+or dropped separately. Detaching takes an exclusive lock on the partitioned
+tables for the (short) duration of the command. Years still holding PENDING
+requests are skipped; a detached year loses its soft-deleted requests and
+approval-queue rows first (see partitions.release_fiscal_year).
+
+The monthly audit_log partitions are kept --audit-ahead months ahead too;
+with --keep-audit-months, older months are dropped (their rows are deleted).
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api import partitions
+
+
+def _add_months(first_day, months):
+    index = first_day.year * 12 + first_day.month - 1 + months
+    return first_day.replace(year=index // 12, month=index % 12 + 1)
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming fiscal-year partitions and detach old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=2,
+                            help='Fiscal years after the current one to create (default 2)')
+        parser.add_argument('--keep-years', type=int,
+                            help='Detach partitions of fiscal years that ended more than this many '
+                                 'years before the current one (default: detach nothing)')
+        parser.add_argument('--audit-ahead', type=int, default=3,
+                            help='Months after the current one to create audit_log partitions for (default 3)')
+        parser.add_argument('--keep-audit-months', type=int,
+                            help='Drop audit_log partitions of months that ended more than this many '
+                                 'months before the current one (default: drop nothing)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Show what would change, then roll back')
+
+    def handle(self, *args, **options):
+        if min(options['ahead'], options['audit_ahead'], options['keep_years'] or 0,
+               options['keep_audit_months'] or 0) < 0:
+            raise CommandError('--ahead, --audit-ahead, --keep-years and --keep-audit-months must not be negative')
+
+        current = partitions.fiscal_year_start(date.today())
+        last = current.replace(year=current.year + options['ahead'])
+
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                try:
+                    created = partitions.ensure_partitions(cur, current, last)
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+
+                detached, skipped = [], []
+                if options['keep_years'] is not None:
+                    before = current.replace(year=current.year - options['keep_years'])
+                    detached, skipped = partitions.detach_partitions(cur, before)
+
+                this_month = date.today().replace(day=1)
+                created += partitions.ensure_audit_partitions(
+                    cur, this_month, _add_months(this_month, options['audit_ahead']))
+                dropped = []
+                if options['keep_audit_months'] is not None:
+                    dropped = partitions.drop_audit_partitions(
+                        cur, _add_months(this_month, -options['keep_audit_months']))
+
+            for name in created:
+                self.stdout.write(f'  created  {name}')
+            for name in detached:
+                self.stdout.write(f'  detached {name}')
+            for start in skipped:
+                self.stdout.write(self.style.WARNING(
+                    f'  skipped  fiscal year {start}: it still has PENDING requests'
+                ))
+            for name in dropped:
+                self.stdout.write(f'  dropped  {name}')
+
+            if options['dry_run']:
+                transaction.set_rollback(True)
+                self.stdout.write(self.style.WARNING('Dry run: rolled back'))
+                return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(created)} partition(s) created, {len(detached)} detached, {len(dropped)} dropped'
+        ))
@@ -0,0 +1,127 @@
+"""
+Run background jobs (see api/jobs.py and api/tasks.py).
+
+    python manage.py run_jobs                       # daemon: poll and run until stopped
+    python manage.py run_jobs --workers 4 --poll 2
+    python manage.py run_jobs --once                # run what is due now, then exit (cron)
+    python manage.py run_jobs --enqueue close_petty_cash_month --arg month=2025-11
+    python manage.py run_jobs --list                # tasks, schedules and recent runs
+
+Jobs run in a pool of spawned worker processes; the main process only
+queues periodic slots, claims due jobs and waits. Several runners (on one
+or more hosts) can share the database. SIGTERM/SIGINT stop claiming and let
+running jobs finish.
+"""
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api import jobs, tasks  # noqa: F401  tasks registers itself with jobs
+
+
+class Command(BaseCommand):
+    help = 'Run scheduled and queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOB_WORKERS,
+                            help=f'Worker processes (default {settings.JOB_WORKERS})')
+        parser.add_argument('--poll', type=float, default=settings.JOB_POLL_SECONDS,
+                            help=f'Seconds between polls when idle (default {settings.JOB_POLL_SECONDS})')
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are due now, then exit')
+        parser.add_argument('--enqueue', metavar='TASK',
+                            help='Queue one job of TASK to run now, then exit')
+        parser.add_argument('--arg', action='append', default=[], metavar='NAME=VALUE',
+                            help='Argument for --enqueue (repeatable)')
+        parser.add_argument('--list', action='store_true',
+                            help='Show the registered tasks and recent runs, then exit')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            return self._list()
+        if options['enqueue']:
+            return self._enqueue(options['enqueue'], options['arg'])
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        self._run(options['workers'], options['poll'], options['once'])
+
+    def _list(self):
+        for spec in sorted(jobs.TASKS.values(), key=lambda t: t.name):
+            self.stdout.write(f'  {spec.name:<28} {str(spec.schedule or "on demand"):<30} '
+                              f'concurrency {spec.concurrency}, {spec.max_attempts} attempts')
+        with connection.cursor() as cur:
+            runs = jobs.recent_runs(cur)
+        if runs:
+            self.stdout.write('\nRecent runs:')
+        for run in runs:
+            outcome = 'ok' if run['succeeded'] else 'FAILED'
+            self.stdout.write(f"  #{run['job_id']:<8} {run['name']:<28} attempt {run['attempt']} "
+                              f"{outcome:<6} {run['finished_at']:%Y-%m-%d %H:%M} on {run['worker']}")
+
+    def _enqueue(self, name, pairs):
+        if name not in jobs.TASKS:
+            raise CommandError(f"unknown task {name!r}; see --list")
+        kwargs = {}
+        for pair in pairs:
+            key, sep, value = pair.partition('=')
+            if not sep:
+                raise CommandError(f'--arg must look like NAME=VALUE, not {pair!r}')
+            kwargs[key] = value
+        with transaction.atomic(), connection.cursor() as cur:
+            job_id = jobs.enqueue(cur, name, **kwargs)
+        self.stdout.write(self.style.SUCCESS(f'queued job #{job_id} ({name})'))
+
+    def _run(self, workers, poll, once):
+        worker = jobs.worker_name()
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+            self.stdout.write('Stopping: waiting for running jobs to finish')
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f'{worker}: {workers} worker(s), {len(jobs.TASKS)} task(s)')
+        running = {}
+        # Spawned, not forked: workers must not share this process's connection
+        with ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+                                 initializer=jobs.init_worker) as pool:
+            while not stopping:
+                with transaction.atomic(), connection.cursor() as cur:
+                    jobs.schedule_due(cur)
+                    reaped = jobs.reap(cur)
+                    claimed = jobs.claim(cur, workers - len(running), worker) if len(running) < workers else []
+                if reaped:
+                    self.stdout.write(self.style.WARNING(f'{reaped} abandoned job(s) requeued or failed'))
+                for job_id in claimed:
+                    running[pool.submit(jobs.execute, job_id, worker)] = job_id
+
+                if once and not running:
+                    break
+                if running:
+                    done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._report(running.pop(future), future)
+                else:
+                    time.sleep(poll)
+
+            for future in list(running):
+                wait([future])
+                self._report(running.pop(future), future)
+
+    def _report(self, job_id, future):
+        exc = future.exception()
+        if exc is not None:
+            # The worker process itself failed; reap() retries the job after its timeout
+            self.stderr.write(f'job #{job_id}: worker error {exc!r}')
+        elif future.result():
+            self.stdout.write(f'job #{job_id} done')
+        else:
+            self.stdout.write(self.style.WARNING(f'job #{job_id} failed (see run_jobs --list)'))
@@ -1,4 +1,5 @@
 # backend/api/models.py
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 class City(models.Model):
@@ -24,6 +25,7 @@ class Users(models.Model):
     email = models.CharField(max_length=100, unique=True)
     whatsapp = models.CharField(max_length=50, null=True)
     role = models.CharField(max_length=50)
+    approver_role = models.CharField(max_length=50, null=True)
     password_hash = models.TextField()
     city = models.ForeignKey(City, null=True, on_delete=models.SET_NULL, db_column='city_id')
     is_active = models.BooleanField(default=True)
@@ -43,6 +45,23 @@ class BudgetRequest(models.Model):
     description = models.TextField(null=True)
     status = models.CharField(max_length=10)
     created_at = models.DateTimeField()
+    # Denormalized summary maintained by database triggers
+    requester_name = models.CharField(max_length=50, null=True)
+    city_name = models.CharField(max_length=100, null=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    event_count = models.IntegerField(default=0)
+    line_count = models.IntegerField(default=0)
+    last_decision = models.CharField(max_length=20, null=True)
+    last_decided_at = models.DateTimeField(null=True)
+    # Bumped by triggers on any change to the request or its children
+    updated_at = models.DateTimeField()
+    version = models.IntegerField(default=1)
+    # Full-text document maintained by database triggers (see functions.sql)
+    search_document = SearchVectorField(null=True)
+    # Soft delete: set while the request waits to be purged (see api/tasks.py)
+    deleted_at = models.DateTimeField(null=True)
+    deleted_by = models.ForeignKey(Users, null=True, on_delete=models.SET_NULL, db_column='deleted_by',
+                                   related_name='requests_deleted')
 
     class Meta:
         db_table = 'budget_request'
@@ -51,6 +70,8 @@ class BudgetRequest(models.Model):
 class RequestedEvent(models.Model):
     req_event_id = models.AutoField(primary_key=True)
     request = models.ForeignKey(BudgetRequest, on_delete=models.CASCADE, db_column='request_id')
+    # Parent request's month: the partition key (see schema.sql)
+    request_month = models.DateField()
     name = models.CharField(max_length=100, null=True)
     event_date = models.DateField(null=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True)
@@ -63,6 +84,7 @@ class RequestedEvent(models.Model):
 class RequestedBreakDownLine(models.Model):
     line_id = models.AutoField(primary_key=True)
     req_event = models.ForeignKey(RequestedEvent, on_delete=models.CASCADE, db_column='req_event_id')
+    request_month = models.DateField()
     category = models.ForeignKey(Category, on_delete=models.CASCADE, db_column='category_id')
     description = models.TextField(null=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -74,10 +96,12 @@ class RequestedBreakDownLine(models.Model):
 class Approval(models.Model):
     approval_id = models.AutoField(primary_key=True)
     request = models.ForeignKey(BudgetRequest, on_delete=models.CASCADE, db_column='request_id')
+    request_month = models.DateField()
     approver = models.ForeignKey(Users, on_delete=models.CASCADE, db_column='approver_id')
     decision = models.CharField(max_length=20)
     note = models.TextField(null=True)
     decided_at = models.DateTimeField(null=True)
+    stage_no = models.SmallIntegerField(null=True)
 
     class Meta:
         db_table = 'approval'
@@ -134,6 +158,7 @@ class PettyCashStatement(models.Model):
     city = models.ForeignKey(City, on_delete=models.CASCADE, db_column='city_id')
     prepared_by = models.ForeignKey(Users, related_name="pcs_prepared", on_delete=models.CASCADE, db_column='prepared_by')
     approved_by = models.ForeignKey(Users, related_name="pcs_approved", on_delete=models.CASCADE, db_column='approved_by')
+    closed_at = models.DateTimeField(null=True)
 
     class Meta:
         db_table = 'petty_cash_statement'
@@ -189,8 +214,136 @@ class Disbursement(models.Model):
     ref_no = models.IntegerField(null=True)
     reason = models.CharField(max_length=100, null=True)
     city = models.ForeignKey(City, on_delete=models.CASCADE, db_column='city_id')
-    request = models.ForeignKey(BudgetRequest, on_delete=models.CASCADE, db_column='request_id')
+    request = models.ForeignKey(BudgetRequest, on_delete=models.DO_NOTHING, db_column='request_id',
+                                db_constraint=False)
 
     class Meta:
         db_table = 'disbursement'
         managed = False
+
+class BudgetRequestChange(models.Model):
+    # Append-only change feed written by triggers; no FK so deletes leave tombstones
+    seq = models.BigAutoField(primary_key=True)
+    txid = models.CharField(max_length=20)  # xid8
+    request_id = models.IntegerField()
+    requester_id = models.IntegerField(null=True)
+    city_id = models.IntegerField(null=True)
+    op = models.CharField(max_length=1)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'budget_request_change'
+        managed = False
+
+class IdempotencyKey(models.Model):
+    # Stored responses for retried API writes (see api/idempotency.py)
+    pk = models.CompositePrimaryKey('user', 'idem_key')
+    user = models.ForeignKey(Users, on_delete=models.CASCADE, db_column='user_id')
+    idem_key = models.CharField(max_length=255)
+    fingerprint = models.BinaryField()
+    status_code = models.SmallIntegerField(null=True)
+    body = models.BinaryField(null=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'idempotency_key'
+        managed = False
+
+class ApprovalStage(models.Model):
+    stage_no = models.SmallIntegerField(primary_key=True)
+    name = models.CharField(max_length=100)
+    approver_role = models.CharField(max_length=50)
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        db_table = 'approval_stage'
+        managed = False
+
+class ApprovalQueue(models.Model):
+    # PENDING requests waiting at an approval stage (see api/approvals.py)
+    pk = models.CompositePrimaryKey('request_id', 'request_month')
+    request_id = models.IntegerField()
+    request_month = models.DateField()
+    stage = models.ForeignKey(ApprovalStage, on_delete=models.DO_NOTHING, db_column='stage_no')
+    approver_role = models.CharField(max_length=50)
+    enqueued_at = models.DateTimeField()
+    claimed_by = models.ForeignKey(Users, null=True, on_delete=models.SET_NULL, db_column='claimed_by')
+    claimed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'approval_queue'
+        managed = False
+
+class Job(models.Model):
+    # Background work run by manage.py run_jobs (see api/jobs.py)
+    job_id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict)
+    status = models.CharField(max_length=10)
+    run_at = models.DateTimeField()
+    attempts = models.IntegerField()
+    max_attempts = models.IntegerField()
+    timeout_seconds = models.IntegerField()
+    dedupe_key = models.CharField(max_length=200, unique=True, null=True)
+    locked_by = models.CharField(max_length=100, null=True)
+    locked_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'job'
+        managed = False
+
+class JobRun(models.Model):
+    run_id = models.BigAutoField(primary_key=True)
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, db_column='job_id')
+    attempt = models.IntegerField()
+    worker = models.CharField(max_length=100, null=True)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    succeeded = models.BooleanField()
+    output = models.TextField(null=True)
+    error = models.TextField(null=True)
+
+    class Meta:
+        db_table = 'job_run'
+        managed = False
+
+class Notification(models.Model):
+    # Outbox of messages to users (see api/notifications.py)
+    notification_id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(Users, on_delete=models.CASCADE, db_column='user_id')
+    channel = models.CharField(max_length=10)
+    recipient = models.CharField(max_length=100)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    request_id = models.IntegerField(null=True)
+    status = models.CharField(max_length=10)
+    attempts = models.IntegerField()
+    send_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, null=True)
+    locked_until = models.DateTimeField(null=True)
+    created_at = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True)
+    last_error = models.TextField(null=True)
+
+    class Meta:
+        db_table = 'notification'
+        managed = False
+
+class AuditLog(models.Model):
+    # Appended by the audit triggers (see triggers.sql and api/audit.py)
+    pk = models.CompositePrimaryKey('changed_at', 'audit_id')
+    audit_id = models.BigIntegerField()
+    changed_at = models.DateTimeField()
+    actor_id = models.IntegerField(null=True)
+    entity = models.CharField(max_length=40)
+    entity_id = models.TextField()
+    request_id = models.IntegerField(null=True)
+    op = models.CharField(max_length=1)
+    before = models.JSONField(null=True)
+    after = models.JSONField(null=True)
+
+    class Meta:
+        db_table = 'audit_log'
+        managed = False
@@ -0,0 +1,145 @@
+"""
+Money handling for amounts stored in NUMERIC(10, 2) columns.
+
+Amounts are parsed straight into Decimal (never through float), validated
+against the column's precision and summed exactly. Breakdown lines are
+inserted with one statement and the event total is computed by Postgres from
+the rows it just inserted, so Python never accumulates a running total.
+API responses encode Decimals as strings (see api/responses.py).
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+CENT = Decimal('0.01')
+# Largest value NUMERIC(10, 2) can hold
+MAX_AMOUNT = Decimal('99999999.99')
+# Ontario HST
+HST_RATE = Decimal('0.13')
+
+
+class MoneyError(ValueError):
+    """An amount that can't be stored exactly in a NUMERIC(10, 2) column"""
+
+
+def parse_amount(value, field='amount', allow_negative=False):
+    """
+    Parse a user-supplied amount (str, int or Decimal) into a Decimal with
+    two places. Blank values are zero. Raises MoneyError for anything that
+    is not a finite amount with at most two decimal places, or that is
+    negative unless allow_negative is set.
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return Decimal('0.00')
+    if isinstance(value, bool):
+        raise MoneyError(f'{field} must be a number')
+    try:
+        # str() first so floats from JSON keep their short repr (12.3, not 12.2999...)
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise MoneyError(f'{field} must be a number')
+    if not amount.is_finite():
+        raise MoneyError(f'{field} must be a number')
+    if amount < 0 and not allow_negative:
+        raise MoneyError(f'{field} cannot be negative')
+    if amount != amount.quantize(CENT):
+        raise MoneyError(f'{field} cannot have more than two decimal places')
+    if abs(amount) > MAX_AMOUNT:
+        raise MoneyError(f'{field} is too large')
+    return amount.quantize(CENT)
+
+
+def _category(value):
+    if value in ('', None):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_lines(lines):
+    """
+    Validate breakdown lines in one pass.
+
+    `lines` is an iterable of (category_id, description, amount) tuples as
+    they came from the client. Lines with neither a description nor an
+    amount are dropped. Returns (rows, total) where rows are
+    (category_id, description, Decimal amount) and total is their exact sum.
+    """
+    rows = []
+    for number, (category_id, description, amount) in enumerate(lines, 1):
+        description = (description or '').strip()
+        if not description and (amount is None or str(amount).strip() == ''):
+            continue
+        rows.append((
+            _category(category_id),
+            description,
+            parse_amount(amount, field=f'Line {number} amount'),
+        ))
+    total = sum((row[2] for row in rows), Decimal('0.00'))
+    if total > MAX_AMOUNT:
+        raise MoneyError('Total amount is too large')
+    return rows, total
+
+
+def parse_json_lines(lines):
+    """parse_lines() for the list of dicts the React client sends"""
+    return parse_lines(
+        (line.get('category_id'), line.get('description'), line.get('amount'))
+        for line in lines
+    )
+
+
+def insert_lines(cur, req_event_id, request_month, rows):
+    """
+    Insert breakdown lines for one event in a single statement and set the
+    event's total_amount to their sum, computed by Postgres. request_month is
+    the parent request's month (the partition key). Returns the total.
+    """
+    cur.execute("""
+        WITH inserted AS (
+            INSERT INTO requested_break_down_line
+                (req_event_id, request_month, category_id, description, amount)
+            SELECT %s, %s, l.category_id, l.description, l.amount
+            FROM unnest(%s::int[], %s::text[], %s::numeric[])
+                 AS l(category_id, description, amount)
+            RETURNING amount
+        )
+        UPDATE requested_event
+        SET total_amount = (SELECT COALESCE(SUM(amount), 0) FROM inserted)
+        WHERE req_event_id = %s AND request_month = %s
+        RETURNING total_amount
+    """, [
+        req_event_id,
+        request_month,
+        [row[0] for row in rows],
+        [row[1] for row in rows],
+        [row[2] for row in rows],
+        req_event_id,
+        request_month,
+    ])
+    return cur.fetchone()[0]
+
+
+def hst_for(amount_before_tax, rate=HST_RATE):
+    """HST on a pre-tax amount, rounded to the cent"""
+    return (parse_amount(amount_before_tax) * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def check_expense(amount_before_tax, hst, round_off, total_amount, rate=HST_RATE):
+    """
+    Check one expense or petty cash line: HST must be within a cent of
+    `rate` times the pre-tax amount, and the total must equal
+    amount_before_tax + hst + round_off exactly. Returns a list of problems
+    (empty when the line adds up).
+    """
+    problems = []
+    before_tax = parse_amount(amount_before_tax, 'amount_before_tax')
+    hst = parse_amount(hst, 'hst')
+    round_off = parse_amount(round_off, 'round_off', allow_negative=True)
+    total = parse_amount(total_amount, 'total_amount')
+
+    if abs(hst - hst_for(before_tax, rate)) > CENT:
+        problems.append(f'HST {hst} is not {(rate * 100).normalize()}% of {before_tax}')
+    if before_tax + hst + round_off != total:
+        problems.append(f'{before_tax} + {hst} + {round_off} does not equal total {total}')
+    return problems
@@ -0,0 +1,300 @@
+"""
+Outgoing notifications (email, WhatsApp) through an outbox.
+
+Decisions write their messages to the notification table in the same
+transaction as the decision (queue_decision), so a message exists exactly
+when the decision commits and sending never adds to the approve/reject
+response time. The dispatch_notifications job (api/tasks.py) sends them:
+
+  - leases due rows per channel (status SENDING until NOTIFY_LEASE_SECONDS
+    from now), picked with FOR UPDATE SKIP LOCKED in a short transaction,
+    at most NOTIFY_BATCH_SIZE at a time and no more than the channel's
+    NOTIFY_RATE_PER_MINUTE allows over the last minute,
+  - folds several messages for one recipient into one,
+  - hands each channel's messages to its backend (NOTIFICATION_BACKENDS)
+    with no transaction open,
+  - marks them SENT, or retries them with backoff until
+    NOTIFY_MAX_ATTEMPTS.
+
+Delivery is at least once: if the dispatcher dies after sending but before
+recording the results, its lease runs out and the batch goes out again.
+"""
+import json
+import time
+import urllib.request
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import jobs
+from .responses import fetch_dict, fetch_dicts
+
+EMAIL = 'EMAIL'
+WHATSAPP = 'WHATSAPP'
+
+# Seconds before the first retry; doubled on every further attempt
+RETRY_DELAY = 60
+
+
+class Message(NamedTuple):
+    ids: list           # the notification rows folded into this message
+    recipient: str      # email address or WhatsApp number
+    subject: str
+    body: str
+
+
+# ---------- Queueing ----------
+
+def queue(cur, user_id, channel, recipient, subject, body, request_id=None):
+    cur.execute("""
+        INSERT INTO notification (user_id, channel, recipient, subject, body, request_id)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [user_id, channel, recipient, subject, body, request_id])
+
+
+def queue_decision(cur, request_id, status, note=None):
+    """
+    Tell the requester their request was approved or rejected, on every
+    configured channel they have an address for. Returns how many messages
+    were queued. Call it in the decision's transaction.
+    """
+    cur.execute("""
+        SELECT u.user_id, u.name, u.email, u.whatsapp, br.month, br.total_amount
+        FROM budget_request br
+        JOIN users u ON u.user_id = br.requester_id
+        WHERE br.request_id = %s AND u.is_active
+    """, [request_id])
+    row = fetch_dict(cur)
+    if row is None:
+        return 0
+
+    subject = f"Budget request #{request_id} {status.lower()}"
+    body = (f"Hi {row['name']}, your budget request #{request_id} for "
+            f"{row['month']:%B %Y} (${row['total_amount']:,.2f}) was {status.lower()}.")
+    if note:
+        body += f"\nComment: {note}"
+
+    addresses = {EMAIL: row['email'], WHATSAPP: row['whatsapp']}
+    queued = 0
+    for channel in settings.NOTIFICATION_BACKENDS:
+        if addresses.get(channel):
+            queue(cur, row['user_id'], channel, addresses[channel], subject, body, request_id)
+            queued += 1
+    return queued
+
+
+# ---------- Backends ----------
+
+class Backend:
+    """
+    Sends the messages of one channel. send() returns one error string (or
+    None when it went out) per message; subclasses usually implement
+    send_one() and raise on failure.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, messages):
+        errors = []
+        for message in messages:
+            try:
+                self.send_one(message)
+                errors.append(None)
+            except Exception as exc:
+                errors.append(f'{type(exc).__name__}: {exc}')
+        return errors
+
+    def send_one(self, message):
+        raise NotImplementedError
+
+
+class EmailBackend(Backend):
+    """Email through Django's EMAIL_BACKEND (SMTP, or the file backend locally), one connection per batch"""
+
+    def send(self, messages):
+        with mail.get_connection() as self.connection:
+            return super().send(messages)
+
+    def send_one(self, message):
+        mail.EmailMessage(message.subject, message.body, to=[message.recipient],
+                          connection=self.connection).send()
+
+
+class WhatsAppBackend(Backend):
+    """
+    WhatsApp Cloud API text messages (WHATSAPP_PHONE_NUMBER_ID, WHATSAPP_TOKEN).
+    Free-form text only reaches users who wrote to the number in the last
+    24 hours; others need an approved template.
+    """
+
+    def send_one(self, message):
+        request = urllib.request.Request(
+            f'https://graph.facebook.com/{settings.WHATSAPP_API_VERSION}/'
+            f'{settings.WHATSAPP_PHONE_NUMBER_ID}/messages',
+            data=json.dumps({
+                'messaging_product': 'whatsapp',
+                'to': message.recipient,
+                'type': 'text',
+                'text': {'body': f'{message.subject}\n\n{message.body}'},
+            }).encode(),
+            headers={'Authorization': f'Bearer {settings.WHATSAPP_TOKEN}',
+                     'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+
+
+class FileBackend(Backend):
+    """Local stand-in: appends each message as a JSON line to NOTIFICATION_FILE_DIR/<channel>.jsonl"""
+
+    def send(self, messages):
+        directory = Path(settings.NOTIFICATION_FILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / f'{self.channel.lower()}.jsonl', 'a') as self.file:
+            return super().send(messages)
+
+    def send_one(self, message):
+        self.file.write(json.dumps({
+            'sent_at': timezone.now().isoformat(), **message._asdict(),
+        }) + '\n')
+
+
+def get_backend(channel):
+    return import_string(settings.NOTIFICATION_BACKENDS[channel])(channel)
+
+
+# ---------- Dispatch ----------
+
+def _requeue_expired(cur):
+    """Requeue (or fail, out of attempts) rows whose dispatcher's lease ran out. Returns how many."""
+    cur.execute("""
+        UPDATE notification
+        SET status = CASE WHEN attempts < %s THEN 'QUEUED' ELSE 'FAILED' END,
+            locked_by = NULL,
+            locked_until = NULL,
+            last_error = 'lease expired (dispatcher stopped before recording the result)'
+        WHERE status = 'SENDING' AND locked_until < now()
+    """, [settings.NOTIFY_MAX_ATTEMPTS])
+    return cur.rowcount
+
+
+def _claim(cur, channel, batch_size, worker):
+    """
+    Lease up to batch_size due rows of a channel to `worker` (status SENDING),
+    fewer if its rate limit is near. Messages being sent count against it.
+    """
+    limit = batch_size
+    rate = settings.NOTIFY_RATE_PER_MINUTE.get(channel)
+    if rate is not None:
+        cur.execute("""
+            SELECT COUNT(*) FROM notification
+            WHERE channel = %s
+              AND ((status = 'SENT' AND sent_at > now() - interval '1 minute')
+                   OR status = 'SENDING')
+        """, [channel])
+        limit = min(limit, rate - cur.fetchone()[0])
+    if limit <= 0:
+        return []
+    cur.execute("""
+        UPDATE notification
+        SET status = 'SENDING', attempts = attempts + 1, locked_by = %s,
+            locked_until = now() + make_interval(secs => %s)
+        WHERE notification_id IN (
+            SELECT notification_id
+            FROM notification
+            WHERE channel = %s AND status = 'QUEUED' AND send_after <= now()
+            ORDER BY send_after, notification_id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING notification_id, recipient, subject, body
+    """, [worker, settings.NOTIFY_LEASE_SECONDS, channel, limit])
+    return sorted(fetch_dicts(cur), key=lambda row: row['notification_id'])
+
+
+def _fold(rows):
+    """One Message per recipient; several notifications become one digest"""
+    by_recipient = {}
+    for row in rows:
+        by_recipient.setdefault(row['recipient'], []).append(row)
+    messages = []
+    for recipient, group in by_recipient.items():
+        if len(group) == 1:
+            subject, body = group[0]['subject'], group[0]['body']
+        else:
+            subject = f'{len(group)} updates on your budget requests'
+            body = '\n\n'.join(f"{row['subject']}\n{row['body']}" for row in group)
+        messages.append(Message([row['notification_id'] for row in group], recipient, subject, body))
+    return messages
+
+
+# Results only count while the lease is still ours: once it has expired the
+# rows may have been requeued and leased to another dispatcher
+
+def _mark_sent(cur, ids, worker):
+    cur.execute("""
+        UPDATE notification
+        SET status = 'SENT', sent_at = now(), last_error = NULL, locked_by = NULL, locked_until = NULL
+        WHERE notification_id = ANY(%s) AND status = 'SENDING' AND locked_by = %s
+    """, [ids, worker])
+
+
+def _retry_or_fail(cur, ids, worker, error):
+    cur.execute("""
+        UPDATE notification
+        SET status = CASE WHEN attempts < %s THEN 'QUEUED' ELSE 'FAILED' END,
+            send_after = now() + make_interval(secs => %s * 2 ^ (attempts - 1)),
+            last_error = %s,
+            locked_by = NULL,
+            locked_until = NULL
+        WHERE notification_id = ANY(%s) AND status = 'SENDING' AND locked_by = %s
+    """, [settings.NOTIFY_MAX_ATTEMPTS, RETRY_DELAY, error, ids, worker])
+
+
+def dispatch(batch_size=None, max_seconds=None):
+    """
+    Send due notifications a batch per channel at a time, until none are
+    due, every channel reached its rate limit, or max_seconds have passed.
+    Each batch is leased in one short transaction, sent with no transaction
+    open, and its results recorded in another. Returns (sent, failed)
+    counts of notification rows.
+    """
+    batch_size = batch_size or settings.NOTIFY_BATCH_SIZE
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    worker = jobs.worker_name()
+    with transaction.atomic(), connection.cursor() as cur:
+        _requeue_expired(cur)
+
+    backends = {}
+    sent = failed = 0
+    channels = list(settings.NOTIFICATION_BACKENDS)
+    while channels and (deadline is None or time.monotonic() < deadline):
+        for channel in list(channels):
+            with transaction.atomic(), connection.cursor() as cur:
+                rows = _claim(cur, channel, batch_size, worker)
+            if not rows:
+                channels.remove(channel)
+                continue
+            messages = _fold(rows)
+            if channel not in backends:
+                backends[channel] = get_backend(channel)
+            try:
+                errors = backends[channel].send(messages)
+            except Exception as exc:
+                # e.g. the SMTP server is down: the whole batch waits
+                errors = [f'{type(exc).__name__}: {exc}'] * len(messages)
+            with transaction.atomic(), connection.cursor() as cur:
+                for message, error in zip(messages, errors):
+                    if error is None:
+                        _mark_sent(cur, message.ids, worker)
+                        sent += len(message.ids)
+                    else:
+                        _retry_or_fail(cur, message.ids, worker, error)
+                        failed += len(message.ids)
+    return sent, failed
@@ -0,0 +1,258 @@
+"""
+Fiscal-year partitions of budget_request and the tables hanging off it.
+
+budget_request is range-partitioned on month, and requested_event,
+requested_break_down_line and approval on the request's month (their
+request_month column), all with the same bounds. Partition
+<table>_p<YYYY>_<MM> holds the fiscal year starting on that month;
+FISCAL_YEAR_START_MONTH in settings.py sets which month that is.
+
+schema.sql creates the first partitions; the manage_partitions command
+creates upcoming years and detaches old ones, and archive_fiscal_years moves
+closed years into the archive schema (see api/archive.py).
+
+audit_log is range-partitioned on changed_at by calendar month instead
+(audit_log_p<YYYY>_<MM>); old months are dropped, not archived.
+"""
+import re
+from datetime import date, timedelta
+
+from django.conf import settings
+
+# Parents first: partitions are created in this order and detached in reverse,
+# so a child partition never references a detached parent.
+PARTITIONED_TABLES = ['budget_request', 'requested_event', 'requested_break_down_line', 'approval']
+
+AUDIT_TABLE = 'audit_log'
+AUDIT_DEFAULT = 'audit_log_default'
+
+# Date bounds, or timestamp bounds at midnight ('2025-04-01 00:00:00')
+_BOUNDS = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})[^']*'\) TO \('(\d{4}-\d{2}-\d{2})[^']*'\)")
+
+
+def fiscal_year_start(day):
+    """First day of the fiscal year containing `day`"""
+    start_month = settings.FISCAL_YEAR_START_MONTH
+    year = day.year if day.month >= start_month else day.year - 1
+    return date(year, start_month, 1)
+
+
+def partition_name(table, start):
+    return f'{table}_p{start:%Y_%m}'
+
+
+def attached_partitions(cur, table):
+    """[(name, first_day, end_day)] of the table's range partitions, oldest first"""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, [table])
+    found = []
+    for name, bound in cur.fetchall():
+        match = _BOUNDS.search(bound)
+        if match:
+            found.append((name, date.fromisoformat(match[1]), date.fromisoformat(match[2])))
+    return sorted(found, key=lambda p: p[1])
+
+
+class MonthOutOfRange(ValueError):
+    """A request's month that no attached fiscal-year partition can hold"""
+
+
+def check_month(cur, month):
+    """
+    The request month `month` (a date or 'YYYY-MM-DD') as a date. Raises
+    MonthOutOfRange when it isn't a date or falls outside the fiscal years
+    that have partitions (there is no default partition to catch it).
+    """
+    try:
+        day = month if isinstance(month, date) else date.fromisoformat(str(month))
+    except ValueError:
+        raise MonthOutOfRange('month must be a date (YYYY-MM-DD)')
+    years = attached_partitions(cur, 'budget_request')
+    if not any(first_day <= day < end_day for _, first_day, end_day in years):
+        if not years:
+            raise MonthOutOfRange('No fiscal year is open for requests')
+        raise MonthOutOfRange(
+            f'month must be between {years[0][1]:%Y-%m-%d} and {years[-1][2] - timedelta(days=1):%Y-%m-%d}'
+        )
+    return day
+
+
+def ensure_partitions(cur, first_month, last_month):
+    """
+    Create the fiscal-year partitions covering first_month..last_month that
+    don't exist yet. Returns the names created. Raises ValueError when an
+    existing partition only partly overlaps a fiscal year, which means
+    FISCAL_YEAR_START_MONTH no longer matches the database.
+    """
+    created = []
+    for table in PARTITIONED_TABLES:
+        existing = attached_partitions(cur, table)
+        start = fiscal_year_start(first_month)
+        while start <= last_month:
+            end = start.replace(year=start.year + 1)
+            overlapping = [(lo, hi) for _, lo, hi in existing if lo < end and start < hi]
+            if not overlapping:
+                name = partition_name(table, start)
+                cur.execute(
+                    f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+                    [start, end],
+                )
+                created.append(name)
+            elif overlapping != [(start, end)]:
+                raise ValueError(
+                    f'{table} has partitions that do not line up with the fiscal year '
+                    f'{start}..{end}; check FISCAL_YEAR_START_MONTH'
+                )
+            start = end
+    return created
+
+
+def has_pending(cur, start):
+    """Whether the fiscal year starting on `start` still has PENDING requests"""
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM budget_request
+            WHERE month >= %s AND month < %s AND status = 'PENDING' AND deleted_at IS NULL
+        )
+    """, [start, start.replace(year=start.year + 1)])
+    return cur.fetchone()[0]
+
+
+def release_fiscal_year(cur, start):
+    """
+    Clear what would keep the fiscal year starting on `start` from being
+    detached, or be stranded by it: its approval_queue rows (the queue
+    references budget_request, and a detached request can't be decided)
+    and its soft-deleted requests (the purge only scans the attached
+    tables), which are deleted with their events, lines and approvals.
+    Returns how many soft-deleted requests were purged.
+    """
+    end = start.replace(year=start.year + 1)
+    cur.execute(
+        "DELETE FROM approval_queue WHERE request_month >= %s AND request_month < %s",
+        [start, end],
+    )
+    cur.execute(
+        "DELETE FROM budget_request WHERE month >= %s AND month < %s AND deleted_at IS NOT NULL",
+        [start, end],
+    )
+    return cur.rowcount
+
+
+def detach_fiscal_year(cur, start):
+    """
+    Detach the partitions of the fiscal year starting on `start` (children
+    first) and drop the foreign keys the detached tables keep pointing at
+    the partitioned tables. Call release_fiscal_year() first. Returns
+    {table: detached partition name}.
+    """
+    detached = {}
+    for table in reversed(PARTITIONED_TABLES):
+        for name, first_day, _ in attached_partitions(cur, table):
+            if first_day != start:
+                continue
+            cur.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+            cur.execute("""
+                SELECT conname
+                FROM pg_constraint
+                WHERE conrelid = %s::regclass
+                  AND contype = 'f'
+                  AND confrelid = ANY(%s::regclass[])
+            """, [name, PARTITIONED_TABLES])
+            for (constraint,) in cur.fetchall():
+                cur.execute(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"')
+            detached[table] = name
+    return detached
+
+
+def detach_partitions(cur, before):
+    """
+    Detach every fiscal year that ends on or before `before`, except those
+    still holding PENDING requests. The detached tables stay in the database
+    as standalone tables. Returns (detached names, starts of years skipped).
+    """
+    starts = sorted({
+        first_day
+        for table in PARTITIONED_TABLES
+        for _, first_day, end_day in attached_partitions(cur, table)
+        if end_day <= before
+    })
+    detached, skipped = [], []
+    for start in starts:
+        if has_pending(cur, start):
+            skipped.append(start)
+            continue
+        release_fiscal_year(cur, start)
+        detached += detach_fiscal_year(cur, start).values()
+    return detached, skipped
+
+
+def _next_month(day):
+    return day.replace(year=day.year + 1, month=1) if day.month == 12 else day.replace(month=day.month + 1)
+
+
+def _default_holds(cur, month, following):
+    """Whether audit_log's default partition has rows in [month, following)"""
+    cur.execute(f"SELECT to_regclass('{AUDIT_DEFAULT}')")
+    if cur.fetchone()[0] is None:
+        return False
+    cur.execute(f"""
+        SELECT EXISTS (SELECT 1 FROM {AUDIT_DEFAULT} WHERE changed_at >= %s AND changed_at < %s)
+    """, [month, following])
+    return cur.fetchone()[0]
+
+
+def ensure_audit_partitions(cur, first_month, last_month):
+    """
+    Create the monthly audit_log partitions covering first_month..last_month
+    that don't exist yet. Returns their names.
+
+    A month whose rows already landed in audit_log_default (maintenance fell
+    behind) can't simply be created: the default partition is detached, the
+    month created and its rows moved in, and the default reattached. audit_log
+    stays locked until the transaction ends.
+    """
+    existing = {first_day for _, first_day, _ in attached_partitions(cur, AUDIT_TABLE)}
+    created = []
+    detached_default = False
+    month = first_month.replace(day=1)
+    while month <= last_month:
+        following = _next_month(month)
+        if month not in existing:
+            name = partition_name(AUDIT_TABLE, month)
+            move = detached_default or _default_holds(cur, month, following)
+            if move and not detached_default:
+                cur.execute(f'ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {AUDIT_DEFAULT}')
+                detached_default = True
+            cur.execute(
+                f'CREATE TABLE {name} PARTITION OF {AUDIT_TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [month, following],
+            )
+            if move:
+                cur.execute(f"""
+                    WITH moved AS (
+                        DELETE FROM {AUDIT_DEFAULT}
+                        WHERE changed_at >= %s AND changed_at < %s
+                        RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                """, [month, following])
+            created.append(name)
+        month = following
+    if detached_default:
+        cur.execute(f'ALTER TABLE {AUDIT_TABLE} ATTACH PARTITION {AUDIT_DEFAULT} DEFAULT')
+    return created
+
+
+def drop_audit_partitions(cur, before):
+    """Drop the monthly audit_log partitions that end on or before `before`. Returns their names."""
+    dropped = []
+    for name, _, end_day in attached_partitions(cur, AUDIT_TABLE):
+        if end_day <= before:
+            cur.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+    return dropped
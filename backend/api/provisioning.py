@@ -0,0 +1,177 @@
+"""
+Bulk user import (`POST /api/admin/users/import/`, `manage.py import_users`).
+
+Rows are dicts with the api_create_user fields (name, email, whatsapp,
+role, city_id, password), read from CSV (header row) or JSON. An import
+
+  - validates every row, checking emails and cities against the database
+    in one query each,
+  - hashes the valid rows' passwords in a process pool (PBKDF2 at Django's
+    iteration count is the slow part: about a second a password per core),
+  - inserts them in one multi-row INSERT ... ON CONFLICT (email) DO NOTHING,
+    so an email taken meanwhile is reported like any other duplicate.
+
+Bad rows never stop the good ones; each is reported with its row number.
+"""
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from .responses import fetch_dicts
+
+FIELDS = ('name', 'email', 'whatsapp', 'role', 'city_id', 'password')
+# Column widths in the users table (schema.sql)
+MAX_LENGTHS = {'name': 50, 'email': 100, 'whatsapp': 50}
+ROLES = ('ADMIN', 'TREASURER')
+
+# Below this many passwords, starting worker processes costs more than it saves
+POOL_THRESHOLD = 4
+
+
+class ImportRejected(ValueError):
+    """The upload as a whole can't be read (not a bad row)"""
+
+
+def parse_csv(text):
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames is None:
+        raise ImportRejected('CSV is empty')
+    missing = {'name', 'email', 'role', 'city_id', 'password'} - {f.strip() for f in reader.fieldnames}
+    if missing:
+        raise ImportRejected(f"CSV header lacks {', '.join(sorted(missing))}")
+    return [{key.strip(): value for key, value in row.items() if key} for row in reader]
+
+
+def parse_json(text):
+    """A list of user objects, or {"users": [...]}"""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        raise ImportRejected('Invalid JSON')
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ImportRejected('Expected a list of users')
+    return data
+
+
+def _clean(row):
+    """(user dict, None) or (None, reason)"""
+    user = {field: str(row.get(field) or '').strip() for field in FIELDS}
+    if not (user['name'] and user['email'] and user['password'] and user['city_id']):
+        return None, 'Name, email, password, and city are required'
+    if user['role'] not in ROLES:
+        return None, 'Role must be ADMIN or TREASURER'
+    for field, limit in MAX_LENGTHS.items():
+        if len(user[field]) > limit:
+            return None, f'{field.capitalize()} must be at most {limit} characters'
+    try:
+        validate_email(user['email'])
+    except ValidationError:
+        return None, 'Invalid email'
+    try:
+        user['city_id'] = int(user['city_id'])
+    except ValueError:
+        return None, 'Invalid city_id'
+    return user, None
+
+
+def validate(cur, rows):
+    """
+    Split rows into (valid, errors). valid is a list of (row_no, user);
+    errors a list of {'row', 'email', 'detail'}. Row numbers count from 1.
+    """
+    valid, errors = [], []
+    seen = set()
+    for row_no, row in enumerate(rows, start=1):
+        user, reason = _clean(row)
+        if user is not None and user['email'].lower() in seen:
+            user, reason = None, 'Email appears earlier in this import'
+        if user is None:
+            errors.append({'row': row_no, 'email': str(row.get('email') or ''), 'detail': reason})
+            continue
+        seen.add(user['email'].lower())
+        valid.append((row_no, user))
+
+    if valid:
+        cur.execute("SELECT lower(email) FROM users WHERE lower(email) = ANY(%s)",
+                    [[user['email'].lower() for _, user in valid]])
+        taken = {email for (email,) in cur.fetchall()}
+        cur.execute("SELECT city_id FROM city WHERE city_id = ANY(%s)",
+                    [list({user['city_id'] for _, user in valid})])
+        cities = {city_id for (city_id,) in cur.fetchall()}
+
+        checked = []
+        for row_no, user in valid:
+            if user['email'].lower() in taken:
+                errors.append({'row': row_no, 'email': user['email'], 'detail': 'Email already exists'})
+            elif user['city_id'] not in cities:
+                errors.append({'row': row_no, 'email': user['email'], 'detail': 'Invalid city_id'})
+            else:
+                checked.append((row_no, user))
+        valid = checked
+    return valid, errors
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """make_password for each, across `workers` processes (default PASSWORD_HASH_WORKERS)"""
+    workers = min(workers or settings.PASSWORD_HASH_WORKERS, len(passwords))
+    if workers <= 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    # Spawned, not forked: the workers must not share this process's connection
+    with ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+                             initializer=_init_worker) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+def create_users(cur, users, hashes):
+    """Insert users in one statement; returns the rows created (emails already taken are skipped)"""
+    rows = [(u['name'], u['email'], u['whatsapp'] or None, u['role'], pw_hash, u['city_id'])
+            for u, pw_hash in zip(users, hashes)]
+    execute_values(cur, """
+        INSERT INTO users (name, email, whatsapp, role, password_hash, city_id, invited_at, is_active)
+        VALUES %s
+        ON CONFLICT (email) DO NOTHING
+        RETURNING user_id, name, email, role, city_id
+    """, rows, template='(%s, %s, %s, %s, %s, %s, NOW(), TRUE)', page_size=len(rows))
+    return fetch_dicts(cur)
+
+
+def import_users(rows, workers=None, dry_run=False):
+    """
+    Validate, hash and insert rows. Returns {'created': [user, ...],
+    'errors': [{'row', 'email', 'detail'}, ...]}; with dry_run nothing is
+    hashed or written and 'created' lists the rows that would be.
+    """
+    if len(rows) > settings.USER_IMPORT_MAX_ROWS:
+        raise ImportRejected(f'At most {settings.USER_IMPORT_MAX_ROWS} users per import')
+    with connection.cursor() as cur:
+        valid, errors = validate(cur, rows)
+    if dry_run or not valid:
+        would_create = [{k: v for k, v in user.items() if k != 'password'} for _, user in valid]
+        return {'created': would_create, 'errors': errors}
+
+    # Hash outside the transaction: it takes seconds, and holds no locks
+    hashes = hash_passwords([user['password'] for _, user in valid], workers)
+    with transaction.atomic(), connection.cursor() as cur:
+        created = create_users(cur, [user for _, user in valid], hashes)
+
+    inserted = {user['email'] for user in created}
+    errors += [{'row': row_no, 'email': user['email'], 'detail': 'Email already exists'}
+               for row_no, user in valid if user['email'] not in inserted]
+    errors.sort(key=lambda error: error['row'])
+    return {'created': created, 'errors': errors}
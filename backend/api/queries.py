@@ -0,0 +1,451 @@
+"""
+Shared query layer for the HTML and JSON views.
+
+Each query both kinds of views run lives here once, as a named Statement.
+A statement is PREPAREd the first time a database session runs it and
+EXECUTEd by name after that. Under WSGI connections are kept open between
+requests (CONN_MAX_AGE), so Postgres parses and plans each statement once
+per worker connection instead of once per request. Under ASGI connections
+are closed after each request by default (see settings.py), so a statement
+is only reused within a request. Set DB_PREPARED_STATEMENTS=False
+when connecting through a pooler in transaction mode, which can't keep
+prepared statements; statements then run as plain parameterized SQL.
+
+Rows come back as the NamedTuple row types below. Templates index them like
+the tuples they replace (row.0), and JSON views call ._asdict() (see
+as_dicts). Rows are immutable, so cached results (see treasurer_dashboard)
+can be shared between requests safely.
+
+Statements take %(name)s parameters; add an explicit cast where Postgres
+can't infer a parameter's type from the statement alone.
+"""
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import approvals, jobs, partitions, states
+from .cache import cached_for_treasurer
+from .money import insert_lines
+
+_PARAM = re.compile(r'%\((\w+)\)s')
+
+
+@receiver(connection_created)
+def _new_session(sender, connection, **kwargs):
+    # A new session has no prepared statements yet
+    connection.prepared_statements = set()
+
+
+class Statement:
+    """A named, parameterized statement, run server-side prepared"""
+
+    def __init__(self, name, sql, row=None):
+        self.name = name
+        self.sql = sql.strip().rstrip(';')
+        self.row = row
+        self.params = list(dict.fromkeys(_PARAM.findall(self.sql)))
+        positional = _PARAM.sub(lambda m: f'${self.params.index(m[1]) + 1}', self.sql)
+        # PREPARE runs without parameters, so psycopg2 doesn't unescape %%
+        self.prepare_sql = f'PREPARE {name} AS {positional.replace("%%", "%")}'
+        if self.params:
+            self.execute_sql = f"EXECUTE {name}({', '.join(['%s'] * len(self.params))})"
+        else:
+            self.execute_sql = f'EXECUTE {name}'
+
+    def execute(self, cur, **params):
+        if not settings.DB_PREPARED_STATEMENTS:
+            cur.execute(self.sql, params)
+            return cur
+        prepared = cur.db.__dict__.setdefault('prepared_statements', set())
+        if self.name not in prepared:
+            cur.execute(self.prepare_sql)
+            prepared.add(self.name)
+        cur.execute(self.execute_sql, [params[p] for p in self.params])
+        return cur
+
+    def all(self, cur, **params):
+        rows = self.execute(cur, **params).fetchall()
+        return [self.row._make(r) for r in rows] if self.row else rows
+
+    def one(self, cur, **params):
+        row = self.execute(cur, **params).fetchone()
+        return self.row._make(row) if self.row and row is not None else row
+
+
+def as_dicts(rows):
+    return [row._asdict() for row in rows]
+
+
+# ---------- Row types ----------
+
+class StatusCounts(NamedTuple):
+    pending: int
+    approved: int
+    rejected: int
+    total: int
+
+
+class RequestSummary(NamedTuple):
+    request_id: int
+    city_name: Optional[str]
+    month: date
+    description: Optional[str]
+    status: str
+    requester_name: Optional[str]
+    created_at: datetime
+
+
+class ActivityRow(NamedTuple):
+    request_id: int
+    city_name: Optional[str]
+    month: date
+    status: str
+    requester_name: Optional[str]
+    created_at: datetime
+
+
+class MonthlyTotal(NamedTuple):
+    city: Optional[str]
+    month: str
+    total_amount: Decimal
+
+
+class OwnRequest(NamedTuple):
+    request_id: int
+    city_name: Optional[str]
+    month: date
+    description: Optional[str]
+    status: str
+    created_at: datetime
+
+
+class ListRow(NamedTuple):
+    request_id: int
+    month: date
+    description: Optional[str]
+    status: str
+    created_at: datetime
+    requester_name: Optional[str]
+    requester_id: int
+    total_amount: Optional[Decimal]
+
+    def as_api(self):
+        """The shape the JSON list and change feed send"""
+        data = self._asdict()
+        data['requester'] = data.pop('requester_name')
+        return data
+
+
+class Category(NamedTuple):
+    category_id: int
+    name: str
+
+
+class QueueState(NamedTuple):
+    count: int
+    versions: int
+    newest: Optional[datetime]
+
+
+# ---------- Statements ----------
+
+_STATUS_COUNTS = """
+    SELECT COUNT(*) FILTER (WHERE status = 'PENDING'),
+           COUNT(*) FILTER (WHERE status = 'APPROVED'),
+           COUNT(*) FILTER (WHERE status = 'REJECTED'),
+           COUNT(*)
+    FROM budget_request
+    WHERE deleted_at IS NULL
+"""
+STATUS_COUNTS = Statement('status_counts', _STATUS_COUNTS, StatusCounts)
+REQUESTER_STATUS_COUNTS = Statement(
+    'requester_status_counts', _STATUS_COUNTS + " AND requester_id = %(requester_id)s", StatusCounts,
+)
+
+LATEST_PENDING = Statement('latest_pending', """
+    SELECT request_id, city_name, month, description, status, requester_name, created_at
+    FROM budget_request
+    WHERE status = 'PENDING' AND deleted_at IS NULL
+    ORDER BY created_at DESC
+    LIMIT %(limit)s
+""", RequestSummary)
+
+RECENT_ACTIVITY = Statement('recent_activity', """
+    SELECT request_id, city_name, month, status, requester_name, created_at
+    FROM budget_request
+    WHERE deleted_at IS NULL
+    ORDER BY created_at DESC
+    LIMIT %(limit)s
+""", ActivityRow)
+
+# Approved totals per city and month; NULL bounds mean unbounded, and the
+# bounds prune fiscal-year partitions at execution time
+MONTHLY_TOTALS = Statement('monthly_totals', """
+    SELECT city_name, TO_CHAR(month, 'YYYY-MM'), COALESCE(SUM(total_amount), 0)
+    FROM budget_request
+    WHERE status = 'APPROVED' AND deleted_at IS NULL
+      AND month >= COALESCE(%(first)s::date, '-infinity'::date)
+      AND month <= COALESCE(%(last)s::date, 'infinity'::date)
+    GROUP BY budget_request.month, city_name
+    ORDER BY budget_request.month DESC, city_name
+""", MonthlyTotal)
+
+# Same rows, from the copy the refresh_monthly_totals job keeps (api/tasks.py)
+PRECOMPUTED_MONTHLY_TOTALS = Statement('precomputed_monthly_totals', """
+    SELECT city_name, TO_CHAR(month, 'YYYY-MM'), total_amount
+    FROM mv_monthly_totals
+    WHERE month >= COALESCE(%(first)s::date, '-infinity'::date)
+      AND month <= COALESCE(%(last)s::date, 'infinity'::date)
+    ORDER BY month DESC, city_name
+""", MonthlyTotal)
+
+USER_COUNT = Statement('user_count', "SELECT COUNT(*) FROM users")
+APPROVED_AMOUNT = Statement('approved_amount', """
+    SELECT COALESCE(SUM(total_amount), 0) FROM budget_request
+    WHERE status = 'APPROVED' AND deleted_at IS NULL
+""")
+
+OWN_REQUESTS = Statement('own_requests', """
+    SELECT request_id, city_name, month, description, status, created_at
+    FROM budget_request
+    WHERE requester_id = %(requester_id)s AND deleted_at IS NULL
+    ORDER BY created_at DESC
+""", OwnRequest)
+
+_REQUEST_LIST = """
+    SELECT br.request_id, br.month, br.description, br.status, br.created_at,
+           br.requester_name, br.requester_id, br.total_amount
+    FROM budget_request br
+    WHERE br.deleted_at IS NULL{where}
+    ORDER BY br.created_at DESC
+"""
+_OWN = " AND br.requester_id = %(requester_id)s"
+_IDS = " AND br.request_id = ANY(%(request_ids)s::int[])"
+# Keyed by (admin?, limited to request_ids?): one plan per shape
+REQUEST_LIST = {
+    (True, False): Statement('request_list', _REQUEST_LIST.format(where=''), ListRow),
+    (False, False): Statement('request_list_own', _REQUEST_LIST.format(where=_OWN), ListRow),
+    (True, True): Statement('request_list_ids', _REQUEST_LIST.format(where=_IDS), ListRow),
+    (False, True): Statement('request_list_own_ids', _REQUEST_LIST.format(where=_OWN + _IDS), ListRow),
+}
+
+CATEGORIES = Statement('categories', "SELECT category_id, name FROM category ORDER BY name", Category)
+
+REQUESTER_STATE = Statement('requester_state', """
+    SELECT COUNT(*), COALESCE(SUM(version), 0), MAX(updated_at)
+    FROM budget_request
+    WHERE requester_id = %(requester_id)s AND deleted_at IS NULL
+""", QueueState)
+
+REVIEW_QUEUE_STATE = Statement('review_queue_state', """
+    SELECT COUNT(*), COALESCE(SUM(version), 0), MAX(updated_at)
+    FROM budget_request
+    WHERE (status = 'PENDING' OR status = 'REJECTED') AND deleted_at IS NULL
+""", QueueState)
+
+INSERT_REQUEST = Statement('insert_request', """
+    INSERT INTO budget_request
+        (city_id, requester_id, recipient_id, month, description, status, created_at)
+    VALUES
+        (%(city_id)s, %(requester_id)s, NULL, %(month)s::date, %(description)s, 'PENDING', NOW())
+    RETURNING request_id, month
+""")
+
+INSERT_EVENT = Statement('insert_event', """
+    INSERT INTO requested_event
+        (request_id, request_month, name, event_date, total_amount, notes)
+    VALUES
+        (%(request_id)s, %(request_month)s, %(name)s, %(event_date)s::date, %(total_amount)s::numeric, %(notes)s)
+    RETURNING req_event_id
+""")
+
+# Soft delete: one row update, whatever the request holds; its events,
+# lines and approvals stay until the purge. The status check makes it a
+# compare-and-set, like states.transition().
+DELETE_REQUEST = Statement('delete_request', """
+    UPDATE budget_request
+    SET deleted_at = now(), deleted_by = %(deleted_by)s
+    WHERE request_id = %(request_id)s
+      AND month = %(month)s
+      AND status = ANY(%(deletable)s::text[])
+      AND deleted_at IS NULL
+    RETURNING city_id
+""")
+
+RESTORE_REQUEST = Statement('restore_request', """
+    UPDATE budget_request
+    SET deleted_at = NULL, deleted_by = NULL
+    WHERE request_id = %(request_id)s
+      AND month = %(month)s
+      AND deleted_at >= now() - make_interval(days => %(grace_days)s)
+    RETURNING city_id
+""")
+
+DELETED_REQUEST = Statement('deleted_request', """
+    SELECT requester_id, month, deleted_at >= now() - make_interval(days => %(grace_days)s)
+    FROM budget_request
+    WHERE request_id = %(request_id)s AND deleted_at IS NOT NULL
+""")
+
+# Events, breakdown lines, approvals and queue rows go with each request
+# (ON DELETE CASCADE). Oldest tombstones first; SKIP LOCKED lets a restore
+# in progress win.
+PURGE_DELETED = Statement('purge_deleted', """
+    DELETE FROM budget_request br
+    USING (
+        SELECT request_id, month
+        FROM budget_request
+        WHERE deleted_at < now() - make_interval(days => %(grace_days)s)
+        ORDER BY deleted_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ) expired
+    WHERE br.request_id = expired.request_id AND br.month = expired.month
+""")
+
+DELETE_EVENT_LINES = Statement('delete_event_lines', """
+    DELETE FROM requested_break_down_line
+    WHERE request_month = %(request_month)s AND req_event_id IN (
+        SELECT req_event_id FROM requested_event
+        WHERE request_id = %(request_id)s AND request_month = %(request_month)s
+    )
+""")
+
+DELETE_EVENTS = Statement('delete_events', """
+    DELETE FROM requested_event WHERE request_id = %(request_id)s AND request_month = %(request_month)s
+""")
+
+
+# ---------- Queries ----------
+
+def admin_overview(cur, limit=10):
+    """(status counts, latest pending, recent activity, approved monthly totals) for the admin dashboards"""
+    return (
+        STATUS_COUNTS.one(cur),
+        LATEST_PENDING.all(cur, limit=limit),
+        RECENT_ACTIVITY.all(cur, limit=limit),
+        MONTHLY_TOTALS.all(cur, first=None, last=None),
+    )
+
+
+def monthly_totals(cur, first=None, last=None):
+    return MONTHLY_TOTALS.all(cur, first=first, last=last)
+
+
+def report_monthly_totals(cur, first=None, last=None):
+    """
+    (rows, refreshed_at) for the monthly report: the precomputed totals as of
+    the last refresh_monthly_totals run, or live totals (refreshed_at None)
+    until that job has run.
+    """
+    refreshed_at = jobs.last_success(cur, 'refresh_monthly_totals')
+    if refreshed_at is None:
+        return monthly_totals(cur, first, last), None
+    return PRECOMPUTED_MONTHLY_TOTALS.all(cur, first=first, last=last), refreshed_at
+
+
+def treasurer_dashboard(city_id, user_id):
+    """(status counts, own requests) of a treasurer; cached until a write touches their city"""
+
+    def load():
+        with connection.cursor() as cur:
+            return (
+                REQUESTER_STATUS_COUNTS.one(cur, requester_id=user_id),
+                OWN_REQUESTS.all(cur, requester_id=user_id),
+            )
+
+    return cached_for_treasurer(city_id, user_id, 'treasurer_dashboard', load)
+
+
+def request_list(cur, user_id, role, request_ids=None):
+    """
+    ListRows, newest first. Admins see every request, treasurers their own;
+    request_ids optionally limits the list to those requests.
+    """
+    statement = REQUEST_LIST[(role == 'ADMIN', request_ids is not None)]
+    params = {'requester_id': user_id}
+    if request_ids is not None:
+        params['request_ids'] = list(request_ids)
+    return statement.all(cur, **params)
+
+
+def categories(cur):
+    return CATEGORIES.all(cur)
+
+
+def create_request(cur, city_id, user_id, month, description, event_name, event_date, notes, lines):
+    """
+    Insert a PENDING request with its event and breakdown lines. Returns
+    (request_id, req_event_id). Raises partitions.MonthOutOfRange. Run it
+    inside transaction.atomic().
+    """
+    month = partitions.check_month(cur, month)
+    request_id, request_month = INSERT_REQUEST.one(
+        cur, city_id=city_id, requester_id=user_id, month=month, description=description,
+    )
+    (req_event_id,) = INSERT_EVENT.one(
+        cur, request_id=request_id, request_month=request_month, name=event_name,
+        event_date=event_date, total_amount=None, notes=notes,
+    )
+    if lines:
+        insert_lines(cur, req_event_id, request_month, lines)
+    return request_id, req_event_id
+
+
+def resubmit_request(cur, request_id, month, description, event_name, event_date, notes, lines, version=None):
+    """
+    Replace a PENDING or REJECTED request's month, description, event and
+    breakdown lines and set it back to PENDING (states.transition, so a
+    stale version or a concurrent decision raises TransitionError). Returns
+    its city_id. Raises partitions.MonthOutOfRange. Run it inside
+    transaction.atomic().
+    """
+    month = partitions.check_month(cur, month)
+    city_id, request_month = states.transition(
+        cur, request_id, 'resubmit', version, month=month, description=description,
+    )
+    # Lines first: they reference the event
+    DELETE_EVENT_LINES.execute(cur, request_id=request_id, request_month=request_month)
+    DELETE_EVENTS.execute(cur, request_id=request_id, request_month=request_month)
+    (req_event_id,) = INSERT_EVENT.one(
+        cur, request_id=request_id, request_month=request_month, name=event_name,
+        event_date=event_date, total_amount=0, notes=notes,
+    )
+    insert_lines(cur, req_event_id, request_month, lines)
+    # Changed requests are reviewed again from the first stage
+    approvals.restart(cur, request_id, request_month)
+    return city_id
+
+
+def delete_request(cur, request_id, month, deleted_by=None):
+    """
+    Soft-delete a PENDING or REJECTED request (restore_request undoes it for
+    SOFT_DELETE_GRACE_DAYS). Returns its city_id, or None when nothing was deleted.
+    """
+    row = DELETE_REQUEST.one(cur, request_id=request_id, month=month, deleted_by=deleted_by,
+                             deletable=list(states.DELETABLE))
+    return row[0] if row else None
+
+
+def deleted_request(cur, request_id):
+    """(requester_id, month, restorable) of a soft-deleted request, or None"""
+    return DELETED_REQUEST.one(cur, request_id=request_id, grace_days=settings.SOFT_DELETE_GRACE_DAYS)
+
+
+def restore_request(cur, request_id, month):
+    """Undo a soft delete within the grace period. Returns the city_id, or None"""
+    row = RESTORE_REQUEST.one(cur, request_id=request_id, month=month,
+                              grace_days=settings.SOFT_DELETE_GRACE_DAYS)
+    return row[0] if row else None
+
+
+def purge_deleted(cur, limit):
+    """Delete up to `limit` requests soft-deleted before the grace period, for good. Returns how many."""
+    PURGE_DELETED.execute(cur, grace_days=settings.SOFT_DELETE_GRACE_DAYS, limit=limit)
+    return cur.rowcount
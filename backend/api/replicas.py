@@ -0,0 +1,164 @@
+"""
+Read-replica routing.
+
+When PG_REPLICA_HOST is set, settings.py adds a `replica` database alias.
+The heavy read paths (reports, the admin dashboard, request lists and search)
+run their SQL on read_connection(request), which is the replica unless
+
+  - the session wrote something in the last READ_YOUR_WRITES_SECONDS
+    (read_your_writes_middleware notes every successful POST/PUT/PATCH/DELETE),
+    so people always see their own changes, or
+  - the replica is more than REPLICA_MAX_LAG_SECONDS behind, unreachable or
+    no longer streaming from the primary; that is checked at most every
+    REPLICA_CHECK_SECONDS per process.
+
+Everything else keeps using django.db.connection, the primary. Without a
+replica configured read_connection() is always the primary. ReplicaRouter
+applies the same rules to ORM reads of this app's models (sessions and auth
+stay on the primary).
+
+To try it locally, run a second Postgres as a streaming standby of the first
+(pg_basebackup -R -D <dir> -h localhost -p 5432, then start it on port 5433)
+and set PG_REPLICA_HOST=localhost PG_REPLICA_PORT=5433.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+from django.utils.decorators import sync_and_async_middleware
+
+REPLICA = 'replica'
+SESSION_KEY = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# True while handling a write, or a request from a session that wrote recently
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+_health_lock = threading.Lock()
+_health = {'checked': None, 'usable': False, 'lag': None}
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def replica_lag():
+    """
+    Seconds the replica is behind (0 once it has replayed all it received),
+    infinity when it isn't streaming from the primary (it can't know what it
+    missed), None if unreachable
+    """
+    try:
+        with connections[REPLICA].cursor() as cur:
+            # pg_stat_wal_receiver hides status from roles without
+            # pg_read_all_stats; a running receiver then counts as streaming
+            cur.execute("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN NOT EXISTS (
+                        SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+                    ) THEN NULL
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+            """)
+            lag = cur.fetchone()[0]
+            return float('inf') if lag is None else float(lag)
+    except DatabaseError:
+        connections[REPLICA].close()
+        return None
+
+
+def replica_usable():
+    """Whether the replica is reachable and close enough; cached for REPLICA_CHECK_SECONDS"""
+    now = time.monotonic()
+    checked = _health['checked']
+    if checked is not None and now - checked < settings.REPLICA_CHECK_SECONDS:
+        return _health['usable']
+    # One thread re-checks; the others keep using the last answer meanwhile
+    if not _health_lock.acquire(blocking=False):
+        return _health['usable']
+    try:
+        lag = replica_lag()
+        _health.update(
+            checked=time.monotonic(),
+            lag=lag,
+            usable=lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS,
+        )
+        return _health['usable']
+    finally:
+        _health_lock.release()
+
+
+def _recently_wrote(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(SESSION_KEY, 0) > time.time()
+
+
+def read_connection(request):
+    """The connection a heavy read for this request should use"""
+    if (
+        replica_configured()
+        and not _pinned.get()
+        and not _recently_wrote(request)
+        and replica_usable()
+    ):
+        return connections[REPLICA]
+    return connection
+
+
+@sync_and_async_middleware
+def read_your_writes_middleware(get_response):
+    """Pin writes, and the session's requests for a while after them, to the primary"""
+
+    def before(request):
+        return _pinned.set(request.method not in SAFE_METHODS or _recently_wrote(request))
+
+    def after(request, response):
+        session = getattr(request, 'session', None)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and session is not None:
+            session[SESSION_KEY] = time.time() + settings.READ_YOUR_WRITES_SECONDS
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = before(request)
+            try:
+                response = await get_response(request)
+            finally:
+                _pinned.reset(token)
+            after(request, response)
+            return response
+    else:
+        def middleware(request):
+            token = before(request)
+            try:
+                response = get_response(request)
+            finally:
+                _pinned.reset(token)
+            after(request, response)
+            return response
+    return middleware
+
+
+class ReplicaRouter:
+    """Send ORM reads of the api app's models to the replica under the same rules"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'api' or not replica_configured():
+            return None
+        if _pinned.get() or not replica_usable():
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
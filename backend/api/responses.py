@@ -0,0 +1,90 @@
+"""
+JSON responses and row mapping shared by the API views.
+
+json_response() is a drop-in for JsonResponse. Dates, datetimes and Decimals
+are encoded by the serializer itself, so views can return database rows
+as-is instead of calling .isoformat() and float() on every field. Decimals
+(money) are sent as strings such as "113.00" so no precision is lost.
+
+The serializer is picked by the API_JSON_BACKEND setting:
+  'auto'    orjson when it is installed, otherwise the stdlib encoder (default)
+  'orjson'  / 'stdlib'
+  any dotted path to a callable taking the data and returning bytes
+"""
+import datetime
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(value):
+    """Types neither encoder handles on its own"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data, default=_default)
+
+
+def _stdlib_dumps(data):
+    return json.dumps(data, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+BACKENDS = {
+    'orjson': _orjson_dumps,
+    'stdlib': _stdlib_dumps,
+}
+
+_dumps = None
+
+
+def get_dumps():
+    """Resolve (once) the dumps callable named by API_JSON_BACKEND"""
+    global _dumps
+    if _dumps is None:
+        name = getattr(settings, 'API_JSON_BACKEND', 'auto')
+        if name == 'auto':
+            name = 'orjson' if orjson is not None else 'stdlib'
+        if name == 'orjson' and orjson is None:
+            raise ImportError("API_JSON_BACKEND is 'orjson' but orjson is not installed")
+        _dumps = BACKENDS[name] if name in BACKENDS else import_string(name)
+    return _dumps
+
+
+def dumps(data):
+    return get_dumps()(data)
+
+
+def json_response(data, status=200, safe=True):
+    """Like JsonResponse(data, status=status, safe=safe), using the configured serializer"""
+    if safe and not isinstance(data, dict):
+        raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+# ---------- Row mappers ----------
+
+def fetch_dicts(cur):
+    """All remaining rows of cur as dicts keyed by column name (use SQL aliases to rename)"""
+    columns = [col[0] for col in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def fetch_dict(cur):
+    """Next row of cur as a dict keyed by column name, or None"""
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip([col[0] for col in cur.description], row))
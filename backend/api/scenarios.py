@@ -0,0 +1,220 @@
+"""
+Request scenarios shared by the plan harness and the endpoint benchmarks.
+
+Every route in api/urls.py has at least one scenario, except the server-sent
+event stream (api_live_events), which never completes. Ids are resolved from
+whatever data is already in the database (see resolve_fixtures), so the same
+list works against seed.sql and against generated data.
+"""
+import json
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+
+
+def resolve_fixtures():
+    """
+    Pick an admin, a treasurer and one of the treasurer's open requests.
+    Raises ValueError when the database has nothing to drive the scenarios with.
+    """
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT user_id, city_id, email
+            FROM users
+            WHERE role = 'ADMIN' AND is_active = TRUE
+            ORDER BY user_id
+            LIMIT 1
+        """)
+        admin = cur.fetchone()
+
+        cur.execute("""
+            SELECT br.requester_id, u.city_id, br.request_id
+            FROM budget_request br
+            JOIN users u ON u.user_id = br.requester_id
+            WHERE u.role = 'TREASURER'
+              AND u.is_active = TRUE
+              AND br.status = 'PENDING'
+              AND br.deleted_at IS NULL
+            ORDER BY br.created_at DESC
+            LIMIT 1
+        """)
+        treasurer = cur.fetchone()
+
+        cur.execute("SELECT category_id FROM category ORDER BY category_id LIMIT 1")
+        category = cur.fetchone()
+
+    if not admin or not treasurer:
+        raise ValueError(
+            'Need an active ADMIN and an active TREASURER with a PENDING request'
+        )
+
+    return {
+        'admin_id': admin[0],
+        'admin_city_id': admin[1],
+        'admin_email': admin[2],
+        'treasurer_id': treasurer[0],
+        'treasurer_city_id': treasurer[1],
+        'request_id': treasurer[2],
+        'category_id': category[0] if category else None,
+    }
+
+
+def _scenario(name, role, method, url_name, kwargs=None, json_body=None, form=None, writes=False, query=None):
+    path = reverse(url_name, kwargs=kwargs)
+    if query:
+        path += '?' + urlencode(query)
+    return {
+        'name': name,
+        'role': role,
+        'method': method,
+        'path': path,
+        'json': json_body,
+        'form': form,
+        'writes': writes,
+    }
+
+
+def build_scenarios(fx):
+    """
+    Returns one scenario per route (plus extra HTTP methods on the same route).
+    role is None for anonymous requests; writes=True marks scenarios that must
+    run inside rolled_back().
+    """
+    request_kw = {'request_id': fx['request_id']}
+    budget_payload = {
+        'month': '2025-11-01',
+        'description': 'Benchmark request',
+        'event': {'name': 'Paint Night', 'event_date': '2025-11-08', 'notes': ''},
+        'breakdown': [
+            {'category_id': fx['category_id'], 'description': 'Paint and Canvases', 'amount': '113.00'},
+            {'category_id': fx['category_id'], 'description': 'Food Vendor', 'amount': '113.00'},
+        ],
+    }
+    budget_form = {
+        'month': '2025-11-01',
+        'description': 'Benchmark request',
+        'event_name': 'Paint Night',
+        'event_date': '2025-11-08',
+        'event_notes': '',
+        'line_category': [fx['category_id'] or ''],
+        'line_description': ['Paint and Canvases'],
+        'line_amount': ['113.00'],
+    }
+
+    return [
+        # ----- Auth + home -----
+        _scenario('home', 'ADMIN', 'GET', 'home'),
+        _scenario('login_page', None, 'GET', 'login'),
+        _scenario('logout', 'TREASURER', 'GET', 'logout'),
+        _scenario('create_account_page', 'ADMIN', 'GET', 'create_account'),
+        _scenario('api_login', None, 'POST', 'api_login',
+                  json_body={'email': fx['admin_email'], 'password': 'not-the-password'}),
+        _scenario('api_current_user', 'TREASURER', 'GET', 'api_current_user'),
+        _scenario('api_cities', 'TREASURER', 'GET', 'api_cities'),
+        _scenario('api_create_user', 'ADMIN', 'POST', 'api_create_user', writes=True,
+                  json_body={'name': 'Bench User', 'email': 'bench-user@example.com',
+                             'role': 'TREASURER', 'city_id': fx['treasurer_city_id'],
+                             'password': 'bench-password'}),
+
+        # ----- Dashboards -----
+        _scenario('admin_dashboard', 'ADMIN', 'GET', 'admin_dashboard'),
+        _scenario('treasurer_dashboard', 'TREASURER', 'GET', 'treasurer_dashboard'),
+        _scenario('api_admin_dashboard', 'ADMIN', 'GET', 'api_admin_dashboard'),
+        _scenario('api_treasurer_dashboard', 'TREASURER', 'GET', 'api_treasurer_dashboard'),
+        _scenario('api_pending_requests', 'ADMIN', 'GET', 'api_pending_requests'),
+        _scenario('api_cache_stats', 'ADMIN', 'GET', 'api_cache_stats'),
+
+        # ----- Reports -----
+        _scenario('monthly_report', 'ADMIN', 'GET', 'monthly_report'),
+        _scenario('api_monthly_report', 'ADMIN', 'GET', 'api_monthly_report'),
+        _scenario('api_monthly_report_range', 'ADMIN', 'GET', 'api_monthly_report',
+                  query={'from': '2025-04', 'to': '2026-03'}),
+
+        # ----- Budget request reads -----
+        _scenario('budget_request_list_admin', 'ADMIN', 'GET', 'budget_request_list'),
+        _scenario('budget_request_list_treasurer', 'TREASURER', 'GET', 'budget_request_list'),
+        _scenario('api_budget_list_admin', 'ADMIN', 'GET', 'api_budget_list'),
+        _scenario('api_budget_list_treasurer', 'TREASURER', 'GET', 'api_budget_list'),
+        _scenario('api_budget_detail', 'TREASURER', 'GET', 'api_budget_detail', request_kw),
+        _scenario('api_budget_changes_admin', 'ADMIN', 'GET', 'api_budget_changes', query={'since': '0.0'}),
+        _scenario('api_budget_changes_treasurer', 'TREASURER', 'GET', 'api_budget_changes',
+                  query={'since': '0.0'}),
+        _scenario('api_budget_search_admin', 'ADMIN', 'GET', 'api_budget_search',
+                  query={'q': 'paint night'}),
+        _scenario('api_budget_search_treasurer', 'TREASURER', 'GET', 'api_budget_search',
+                  query={'q': 'paint night'}),
+        _scenario('pending_requests', 'ADMIN', 'GET', 'pending_requests'),
+        _scenario('request_detail', 'ADMIN', 'GET', 'request_detail', request_kw),
+        _scenario('new_budget_page', 'TREASURER', 'GET', 'new_budget'),
+        _scenario('edit_budget_page', 'TREASURER', 'GET', 'edit_budget', request_kw),
+
+        # ----- Budget request writes -----
+        _scenario('new_budget', 'TREASURER', 'POST', 'new_budget', form=budget_form, writes=True),
+        _scenario('edit_budget', 'TREASURER', 'POST', 'edit_budget', request_kw,
+                  form=budget_form, writes=True),
+        _scenario('api_budget_create', 'TREASURER', 'POST', 'api_budget_list',
+                  json_body=budget_payload, writes=True),
+        _scenario('api_budget_update', 'TREASURER', 'PUT', 'api_budget_detail', request_kw,
+                  json_body=budget_payload, writes=True),
+        _scenario('api_budget_approve', 'ADMIN', 'POST', 'api_budget_approve', request_kw,
+                  json_body={'comment': 'Looks good'}, writes=True),
+        _scenario('api_budget_reject', 'ADMIN', 'POST', 'api_budget_reject', request_kw,
+                  json_body={'comment': 'Please resend'}, writes=True),
+        _scenario('request_detail_reject', 'ADMIN', 'POST', 'request_detail', request_kw,
+                  form={'decision': 'REJECT', 'note': ''}, writes=True),
+        _scenario('delete_budget_request', 'TREASURER', 'GET', 'delete_budget_request',
+                  request_kw, writes=True),
+        _scenario('api_delete_budget_request', 'TREASURER', 'DELETE',
+                  'api_delete_budget_request', request_kw, writes=True),
+
+        # ----- Users -----
+        _scenario('delete_user', 'ADMIN', 'GET', 'delete_user',
+                  {'user_id': fx['treasurer_id']}, writes=True),
+        _scenario('api_delete_user', 'ADMIN', 'DELETE', 'api_delete_user',
+                  {'user_id': fx['treasurer_id']}, writes=True),
+    ]
+
+
+def login_client(client, fx, role):
+    """Put the admin or treasurer from fx into the client's session, like login_view does"""
+    if role is None:
+        return client
+    if role == 'ADMIN':
+        user_id, city_id = fx['admin_id'], fx['admin_city_id']
+    else:
+        user_id, city_id = fx['treasurer_id'], fx['treasurer_city_id']
+
+    session = client.session
+    session['user_id'] = user_id
+    session['role'] = role
+    session['city_id'] = city_id
+    session.save()
+    # client.session only sets the cookie the first time; keep it pointing at this session
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+    return client
+
+
+def run_scenario(client, scenario):
+    """Issue the scenario's request through a django.test.Client and return the response"""
+    method = scenario['method']
+    path = scenario['path']
+    if scenario['json'] is not None:
+        return client.generic(
+            method, path,
+            data=json.dumps(scenario['json']),
+            content_type='application/json',
+        )
+    if scenario['form'] is not None:
+        return client.post(path, scenario['form'])
+    return client.generic(method, path)
+
+
+@contextmanager
+def rolled_back():
+    """Run a block inside a transaction that is always rolled back"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
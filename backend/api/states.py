@@ -0,0 +1,125 @@
+"""
+Budget request state machine.
+
+TRANSITIONS lists, for each action, the statuses it may start from and the
+status it leads to. transition() applies an action as one compare-and-set
+UPDATE: the WHERE clause checks that the request is still in an allowed
+status and, when the caller passes the version it last saw, that nobody has
+changed it since (budget_request.version is bumped by a trigger on every
+update). Of two concurrent writers exactly one matches; the other gets a
+TransitionConflict, which the views turn into 409 Conflict. No row is locked
+beyond the UPDATE itself and nothing is retried.
+"""
+
+PENDING = 'PENDING'
+APPROVED = 'APPROVED'
+REJECTED = 'REJECTED'
+
+# action -> (statuses it may start from, status it leads to)
+TRANSITIONS = {
+    'approve': ((PENDING,), APPROVED),
+    'reject': ((PENDING,), REJECTED),
+    # Approved at one stage of several (see approvals.py); still PENDING
+    'advance': ((PENDING,), PENDING),
+    # Editing a request sends it back for review
+    'resubmit': ((PENDING, REJECTED), PENDING),
+}
+
+# approval.decision recorded for the actions that are decisions
+DECISIONS = {
+    'approve': 'YES',
+    'reject': 'NO-PLEASE RESEND',
+}
+
+# Statuses in which a request may still be deleted
+DELETABLE = (PENDING, REJECTED)
+
+# Columns an action may change along with the status
+_CHANGEABLE = {'month', 'description'}
+
+
+class TransitionError(Exception):
+    """An action that can't be applied to a request"""
+
+
+class RequestNotFound(TransitionError):
+    def __init__(self, request_id):
+        super().__init__(f'Request {request_id} not found')
+        self.request_id = request_id
+
+
+class TransitionConflict(TransitionError):
+    """The request's status doesn't allow the action, or its version moved on"""
+
+    def __init__(self, request_id, action, status, version):
+        super().__init__(f'Cannot {action} request {request_id}: it is {status} (version {version})')
+        self.request_id = request_id
+        self.action = action
+        self.status = status
+        self.version = version
+
+    def as_json(self):
+        return {
+            'detail': f'Request was changed concurrently or is {self.status}; reload it and try again',
+            'status': self.status,
+            'version': self.version,
+        }
+
+
+def allowed(action, status):
+    sources, _ = TRANSITIONS[action]
+    return status in sources
+
+
+def parse_version(value):
+    """Version sent by a client (int, numeric str, or None/'' for "don't check"). Raises ValueError."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    version = int(value)
+    if version < 1:
+        raise ValueError(value)
+    return version
+
+
+def transition(cur, request_id, action, version=None, **changes):
+    """
+    Apply `action` to a request with one conditional UPDATE, also setting
+    `changes` (month, description) in the same statement. With `version`,
+    the update only succeeds if the request is still at that version.
+    Returns (city_id, month) of the updated request. Raises RequestNotFound
+    or TransitionConflict.
+    """
+    sources, target = TRANSITIONS[action]
+    unknown = set(changes) - _CHANGEABLE
+    if unknown:
+        raise ValueError(f"{action} can't change {', '.join(sorted(unknown))}")
+
+    assignments = ''.join(f', {column} = %({column})s' for column in changes)
+    version_sql = ' AND version = %(version)s' if version is not None else ''
+    cur.execute(f"""
+        UPDATE budget_request
+        SET status = %(target)s{assignments}
+        WHERE request_id = %(request_id)s
+          AND deleted_at IS NULL
+          AND status = ANY(%(sources)s){version_sql}
+        RETURNING city_id, month
+    """, {
+        **changes,
+        'target': target,
+        'request_id': request_id,
+        'sources': list(sources),
+        'version': version,
+    })
+    row = cur.fetchone()
+    if row:
+        return row
+
+    # Find out why nothing matched, for the error
+    cur.execute("SELECT status, version FROM budget_request WHERE request_id = %s AND deleted_at IS NULL",
+                [request_id])
+    current = cur.fetchone()
+    if current is None:
+        raise RequestNotFound(request_id)
+    raise TransitionConflict(request_id, action, *current)
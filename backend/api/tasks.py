@@ -0,0 +1,129 @@
+"""
+Background tasks run by `manage.py run_jobs` (see api/jobs.py for how they
+are scheduled, claimed and retried). Anything a task prints ends up in its
+job_run row.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from . import jobs, notifications, queries
+from .jobs import Daily, Every, Hourly, Monthly, task
+
+
+@task('refresh_monthly_totals', schedule=Hourly(minute=5))
+def refresh_monthly_totals():
+    """Recompute the approved totals the monthly report reads (mv_monthly_totals)"""
+    with connection.cursor() as cur:
+        cur.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY mv_monthly_totals')
+
+
+@task('purge_deleted_requests', schedule=Hourly(minute=20), timeout=1800)
+def purge_deleted_requests():
+    """
+    Remove requests deleted more than SOFT_DELETE_GRACE_DAYS ago, with their
+    events, lines and approvals, PURGE_BATCH_SIZE requests per transaction
+    so no lock is held for long
+    """
+    purged = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cur:
+            batch = queries.purge_deleted(cur, settings.PURGE_BATCH_SIZE)
+        purged += batch
+        if batch < settings.PURGE_BATCH_SIZE:
+            break
+    if purged:
+        print(f'{purged} deleted request(s) purged')
+
+
+@task('dispatch_notifications', schedule=Every(minutes=1), timeout=600)
+def dispatch_notifications():
+    """
+    Send queued notifications in rate-limited batches (see api/notifications.py).
+    Stops taking new batches after half its timeout; the next run carries on.
+    """
+    sent, failed = notifications.dispatch(max_seconds=300)
+    if sent or failed:
+        print(f'{sent} notification(s) sent, {failed} to retry or failed')
+
+
+def _previous_month(today):
+    first = today.replace(day=1)
+    return (first.replace(year=first.year - 1, month=12) if first.month == 1
+            else first.replace(month=first.month - 1))
+
+
+@task('close_petty_cash_month', schedule=Monthly(day=1, hour=1))
+def close_petty_cash_month(month=None):
+    """
+    Close every city's petty cash statement of `month` ('YYYY-MM', default
+    last month): recompute its totals from its expenses, carry the closing
+    balance forward, mark it closed and open the next month's statement
+    with that balance. Statements already closed are left alone.
+    """
+    if month is None:
+        month = _previous_month(date.today()).strftime('%Y-%m')
+    first = date.fromisoformat(month + '-01')
+    following = (first.replace(year=first.year + 1, month=1) if first.month == 12
+                 else first.replace(month=first.month + 1)).strftime('%Y-%m')
+
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("""
+            UPDATE petty_cash_statement pcs
+            SET total_spent = spent.total,
+                closing_balance = pcs.opening_balance - spent.total,
+                carried_forward = pcs.opening_balance - spent.total,
+                cash_in_hand = pcs.opening_balance - spent.total,
+                closed_at = now()
+            FROM (
+                SELECT s.pcs_id, COALESCE(SUM(x.total_amount), 0) AS total
+                FROM petty_cash_statement s
+                LEFT JOIN petty_cash_expense x ON x.pcs_id = s.pcs_id
+                WHERE s.month = %s AND s.closed_at IS NULL
+                GROUP BY s.pcs_id
+            ) spent
+            WHERE pcs.pcs_id = spent.pcs_id
+        """, [month])
+        closed = cur.rowcount
+
+        cur.execute("""
+            INSERT INTO petty_cash_statement
+                (month, opening_balance, total_spent, closing_balance, carried_forward,
+                 cash_in_hand, city_id, prepared_by, approved_by)
+            SELECT %s, carried_forward, 0, carried_forward, carried_forward,
+                   carried_forward, city_id, prepared_by, approved_by
+            FROM petty_cash_statement
+            WHERE month = %s AND closed_at IS NOT NULL
+            ON CONFLICT (city_id, month) DO NOTHING
+        """, [following, month])
+        opened = cur.rowcount
+
+    print(f'{month}: closed {closed} statement(s), opened {opened} for {following}')
+
+
+@task('manage_partitions', schedule=Monthly(day=1, hour=2))
+def manage_partitions():
+    """Keep fiscal-year partitions created ahead of the calendar"""
+    call_command('manage_partitions')
+
+
+@task('archive_fiscal_years', schedule=Monthly(day=1, hour=3), timeout=6 * 3600,
+      enabled=settings.JOB_ARCHIVE_KEEP_YEARS is not None)
+def archive_fiscal_years():
+    """Archive closed fiscal years older than JOB_ARCHIVE_KEEP_YEARS (only scheduled when set)"""
+    call_command('archive_fiscal_years', keep_years=settings.JOB_ARCHIVE_KEEP_YEARS)
+
+
+@task('expire_idempotency_keys', schedule=Daily(hour=4))
+def expire_idempotency_keys():
+    call_command('expire_idempotency_keys')
+
+
+@task('prune_job_history', schedule=Daily(hour=4, minute=30))
+def prune_job_history():
+    """Delete finished jobs and their runs older than JOB_HISTORY_DAYS"""
+    with transaction.atomic(), connection.cursor() as cur:
+        deleted = jobs.prune(cur, settings.JOB_HISTORY_DAYS)
+    print(f'{deleted} finished job(s) deleted')
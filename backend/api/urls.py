@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import budget_api, auth_views, budget_views, admin_views, report_views, delete_views
+from .views import budget_api, auth_views, budget_views, admin_views, report_views, delete_views, live_views, audit_views
 
 urlpatterns = [
     # ----- Auth + home -----
@@ -20,6 +20,7 @@ urlpatterns = [
 
     # ----- Admin HTML pages -----
     path('admin/requests/', admin_views.pending_requests, name='pending_requests'),
+    path('admin/requests/next/', admin_views.review_next, name='review_next'),
     path('admin/requests/<int:request_id>/', admin_views.request_detail, name='request_detail'),
     path('admin/reports/monthly/', report_views.monthly_report, name='monthly_report'),
     path('admin/users/<int:user_id>/delete/', delete_views.delete_user, name='delete_user'),
@@ -29,14 +30,24 @@ urlpatterns = [
     path('api/current-user/', auth_views.api_current_user, name='api_current_user'),
     path('api/cities/', auth_views.api_cities, name='api_cities'),
     path('api/admin/users/', auth_views.api_create_user, name='api_create_user'),
+    path('api/admin/users/import/', auth_views.api_import_users, name='api_import_users'),
+    path('api/admin/audit/', audit_views.api_audit_log, name='api_audit_log'),
     path('api/admin/dashboard/', budget_api.api_admin_dashboard, name='api_admin_dashboard'),
     path('api/admin/pending-requests/', budget_api.api_pending_requests, name='api_pending_requests'),
     path('api/admin/reports/monthly/', report_views.api_monthly_report, name='api_monthly_report'),
+    path('api/admin/queue/claim/', budget_api.api_approval_queue_claim, name='api_approval_queue_claim'),
+    path('api/admin/queue/stats/', budget_api.api_approval_queue_stats, name='api_approval_queue_stats'),
+    path('api/admin/queue/<int:request_id>/release/', budget_api.api_approval_queue_release, name='api_approval_queue_release'),
+    path('api/admin/cache-stats/', budget_api.api_cache_stats, name='api_cache_stats'),
     path('api/treasurer/dashboard/', budget_api.api_treasurer_dashboard, name='api_treasurer_dashboard'),
+    path('api/live/', live_views.api_live_events, name='api_live_events'),
     path('api/budget-requests/', budget_api.api_budget_requests, name='api_budget_list'),
+    path('api/budget-requests/changes/', budget_api.api_budget_request_changes, name='api_budget_changes'),
+    path('api/budget-requests/search/', budget_api.api_budget_request_search, name='api_budget_search'),
     path('api/budget-requests/<int:request_id>/', budget_api.api_budget_request_detail, name='api_budget_detail'),
     path('api/budget-requests/<int:request_id>/approve/', budget_api.api_budget_approve, name='api_budget_approve'),
     path('api/budget-requests/<int:request_id>/reject/', budget_api.api_budget_reject, name='api_budget_reject'),
     path('api/budget-requests/<int:request_id>/delete/', delete_views.api_delete_budget_request, name='api_delete_budget_request'),
+    path('api/budget-requests/<int:request_id>/restore/', delete_views.api_restore_budget_request, name='api_restore_budget_request'),
     path('api/users/<int:user_id>/delete/', delete_views.api_delete_user, name='api_delete_user'),
 ]
@@ -1,6 +1,11 @@
 from django.shortcuts import render, redirect
-from django.db import connection
+from django.db import connection, transaction
 from django.contrib import messages
+from django.views.decorators.http import require_POST
+from .. import approvals, states
+from ..archive import archived_month
+from ..cache import invalidate_city
+from ..replicas import read_connection
 from .auth_views import get_current_user, require_role
 
 def pending_requests(request):
@@ -10,18 +15,19 @@ def pending_requests(request):
 
     user_id, role, city_id = get_current_user(request)
 
-    with connection.cursor() as cur:
+    with read_connection(request).cursor() as cur:
         cur.execute("""
             SELECT br.request_id,
-                   c.name AS city_name,
+                   br.city_name,
                    br.month,
                    br.description,
                    br.status,
-                   u.name AS requester_name
+                   br.requester_name,
+                   s.name AS stage_name
             FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN users u ON u.user_id = br.requester_id
-            WHERE br.status = 'PENDING'
+            LEFT JOIN approval_queue q ON q.request_id = br.request_id AND q.request_month = br.month
+            LEFT JOIN approval_stage s ON s.stage_no = q.stage_no
+            WHERE br.status = 'PENDING' AND br.deleted_at IS NULL
             ORDER BY br.created_at;
         """)
         rows = cur.fetchall()
@@ -32,6 +38,21 @@ def pending_requests(request):
     })
 
 
+@require_POST
+def review_next(request):
+    """Claim the oldest request waiting at a stage this admin approves and open it (Admin only)"""
+    if not require_role(request, 'ADMIN'):
+        return redirect('login')
+
+    user_id, _, _ = get_current_user(request)
+    with transaction.atomic(), connection.cursor() as cur:
+        claimed = approvals.claim_next(cur, user_id)
+    if claimed is None:
+        messages.info(request, "Nothing is waiting for your review.")
+        return redirect('pending_requests')
+    return redirect('request_detail', request_id=claimed['request_id'])
+
+
 def request_detail(request, request_id):
     """READ + UPDATE: View and approve/reject budget requests (Admin only)"""
     if not require_role(request, 'ADMIN'):
@@ -44,55 +65,79 @@ def request_detail(request, request_id):
         decision = request.POST.get('decision')
         note = request.POST.get('note', '').strip()
 
-        with connection.cursor() as cur:
-            if decision == 'APPROVE':
-                # Call your PL/pgSQL function
-                cur.execute("SELECT approve_request(%s, %s, %s);",
-                            [request_id, user_id, note])
-                messages.success(request, f"Request #{request_id} has been approved.")
-            elif decision == 'REJECT':
-                cur.execute("""
-                    UPDATE budget_request
-                    SET status = 'REJECTED'
-                    WHERE request_id = %s
-                """, [request_id])
-                messages.warning(request, f"Request #{request_id} has been rejected.")
+        actions = {'APPROVE': 'approve', 'REJECT': 'reject'}
+        if decision in actions:
+            action = actions[decision]
+            try:
+                with transaction.atomic(), connection.cursor() as cur:
+                    city_id, status = approvals.decide(
+                        cur, request_id, action, user_id, note or None,
+                        states.parse_version(request.POST.get('version')),
+                    )
+            except ValueError:
+                messages.error(request, "Invalid form submission.")
+            except approvals.StageError as exc:
+                messages.error(request, str(exc))
+            except states.RequestNotFound:
+                messages.error(request, f"Request #{request_id} no longer exists.")
+            except states.TransitionConflict as exc:
+                # Someone else decided or changed it after this page was loaded
+                messages.error(request, f"Request #{request_id} is {exc.status} and was changed since you opened it.")
+            else:
+                invalidate_city(city_id)
+                if status == states.PENDING:
+                    messages.success(request, f"Request #{request_id} approved at this stage; it moves on to the next one.")
+                elif action == 'approve':
+                    messages.success(request, f"Request #{request_id} has been approved.")
+                else:
+                    messages.warning(request, f"Request #{request_id} has been rejected.")
 
         return redirect('pending_requests')
 
-    # READ operation
+    # READ operation; requests of archived fiscal years are read-only and
+    # come from the archive schema
     req = None
     events = []
+    stage = None
+    schema = 'public'
 
     with connection.cursor() as cur:
+        month = archived_month(cur, request_id)
+        if month:
+            schema = 'archive'
+
         # Request header
-        cur.execute("""
-            SELECT br.request_id,
-                   c.name AS city_name,
-                   br.month,
-                   br.description,
-                   br.status,
-                   u.name AS requester_name
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN users u ON u.user_id = br.requester_id
-            WHERE br.request_id = %s;
+        cur.execute(f"""
+            SELECT request_id,
+                   city_name,
+                   month,
+                   description,
+                   status,
+                   requester_name,
+                   version
+            FROM {schema}.budget_request
+            WHERE request_id = %s AND deleted_at IS NULL;
         """, [request_id])
         req = cur.fetchone()
 
         # Requested events & breakdown, if any
-        cur.execute("""
+        cur.execute(f"""
             SELECT re.req_event_id,
                    re.name,
                    re.event_date,
                    re.total_amount
-            FROM requested_event re
-            WHERE re.request_id = %s;
-        """, [request_id])
+            FROM {schema}.requested_event re
+            WHERE re.request_id = %s AND re.request_month = %s;
+        """, [request_id, req[2] if req else None])
         events = cur.fetchall()
 
+        if schema == 'public':
+            stage = approvals.request_stage(cur, request_id)
+
     return render(request, 'admin/request_detail.html', {
         'req': req,
         'events': events,
+        'stage': stage,
+        'archived': schema == 'archive',
         'role': role,
     })
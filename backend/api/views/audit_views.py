@@ -0,0 +1,63 @@
+from datetime import date, datetime, timezone
+
+from .. import audit
+from ..replicas import read_connection
+from ..responses import json_response
+from .auth_views import require_role
+
+AUDIT_PAGE_SIZE = 50
+AUDIT_MAX_PAGE_SIZE = 200
+
+
+def _parse_time(value):
+    """'YYYY-MM-DD' or an ISO datetime -> naive UTC datetime; raises ValueError"""
+    if len(value) == 10:
+        return datetime.combine(date.fromisoformat(value), datetime.min.time())
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def api_audit_log(request):
+    """
+    ADMIN-only: who changed what, newest first (see api/audit.py).
+    Optional filters: ?entity=<table>&entity_id=<key>, ?request_id=<id>
+    (the request with its events, lines and approvals), ?actor_id=<user>,
+    ?from=/?to= (date or ISO datetime, UTC; to is exclusive) and ?limit=.
+    Returns {entries: [...], cursor}; pass ?cursor= to get the next page,
+    cursor is null on the last one.
+    """
+    if not require_role(request, 'ADMIN'):
+        return json_response({'detail': 'Forbidden'}, status=403)
+    if request.method != 'GET':
+        return json_response({'detail': 'Method not allowed'}, status=405)
+
+    params = request.GET
+    entity = params.get('entity') or None
+    if entity is not None and entity not in audit.ENTITIES:
+        return json_response({'detail': f"entity must be one of {', '.join(audit.ENTITIES)}"}, status=400)
+    try:
+        request_id = int(params['request_id']) if params.get('request_id') else None
+        actor_id = int(params['actor_id']) if params.get('actor_id') else None
+        limit = int(params.get('limit') or AUDIT_PAGE_SIZE)
+    except ValueError:
+        return json_response({'detail': 'request_id, actor_id and limit must be integers'}, status=400)
+    if not 1 <= limit <= AUDIT_MAX_PAGE_SIZE:
+        return json_response({'detail': f'limit must be between 1 and {AUDIT_MAX_PAGE_SIZE}'}, status=400)
+    try:
+        since = _parse_time(params['from']) if params.get('from') else None
+        until = _parse_time(params['to']) if params.get('to') else None
+    except ValueError:
+        return json_response({'detail': 'from and to must be dates or ISO datetimes'}, status=400)
+    try:
+        before = audit.parse_cursor(params['cursor']) if params.get('cursor') else None
+    except ValueError:
+        return json_response({'detail': 'Invalid cursor'}, status=400)
+
+    with read_connection(request).cursor() as cur:
+        entries = audit.history(cur, entity, params.get('entity_id') or None, request_id, actor_id,
+                                since, until, before, limit)
+
+    cursor = audit.encode_cursor(entries[-1]) if len(entries) == limit else None
+    return json_response({'entries': entries, 'cursor': cursor})
@@ -1,12 +1,15 @@
 from django.shortcuts import render, redirect
 from django.db import connection
 from django.contrib import messages
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from django.contrib.auth.hashers import make_password, check_password
 from django.db import transaction
 
+from .. import idempotency, provisioning, queries
+from ..replicas import read_connection
+from ..responses import fetch_dict, fetch_dicts, json_response
+
 # ---------- Helpers ----------
 
 def get_current_user(request):
@@ -134,76 +137,8 @@ def admin_dashboard(request):
     
     user_id, role, city_id = get_current_user(request)
     
-    stats = {}
-    pending_requests = []
-    recent_activity = []
-    monthly_report = []
-    
-    with connection.cursor() as cur:
-        # Get statistics
-        cur.execute("""
-            SELECT 
-                COUNT(*) FILTER (WHERE status = 'PENDING') as pending_count,
-                COUNT(*) FILTER (WHERE status = 'APPROVED') as approved_count,
-                COUNT(*) FILTER (WHERE status = 'REJECTED') as rejected_count,
-                COUNT(*) as total_count
-            FROM budget_request;
-        """)
-        row = cur.fetchone()
-        stats = {
-            'pending': row[0] or 0,
-            'approved': row[1] or 0,
-            'rejected': row[2] or 0,
-            'total': row[3] or 0,
-        }
-        
-        # Get pending requests
-        cur.execute("""
-            SELECT br.request_id,
-                   c.name AS city_name,
-                   br.month,
-                   br.description,
-                   br.status,
-                   u.name AS requester_name,
-                   br.created_at
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN users u ON u.user_id = br.requester_id
-            WHERE br.status = 'PENDING'
-            ORDER BY br.created_at DESC
-            LIMIT 10;
-        """)
-        pending_requests = cur.fetchall()
-        
-        # Get recent activity (all statuses)
-        cur.execute("""
-            SELECT br.request_id,
-                   c.name AS city_name,
-                   br.month,
-                   br.status,
-                   u.name AS requester_name,
-                   br.created_at
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN users u ON u.user_id = br.requester_id
-            ORDER BY br.created_at DESC
-            LIMIT 10;
-        """)
-        recent_activity = cur.fetchall()
-        
-        # Get monthly report - combining ALL APPROVED requests per city/month
-        cur.execute("""
-            SELECT c.name AS city,
-                   TO_CHAR(br.month, 'YYYY-MM') AS month,
-                   COALESCE(SUM(re.total_amount), 0) AS total_amount
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN requested_event re ON re.request_id = br.request_id
-            WHERE br.status = 'APPROVED'
-            GROUP BY c.name, TO_CHAR(br.month, 'YYYY-MM')
-            ORDER BY TO_CHAR(br.month, 'YYYY-MM') DESC, c.name;
-        """)
-        monthly_report = cur.fetchall()
+    with read_connection(request).cursor() as cur:
+        stats, pending_requests, recent_activity, monthly_report = queries.admin_overview(cur)
     
     return render(request, 'admin/admin_dashboard.html', {
         'role': role,
@@ -220,43 +155,7 @@ def treasurer_dashboard(request):
         return redirect('login')
     
     user_id, role, city_id = get_current_user(request)
-    
-    stats = {}
-    my_requests = []
-    
-    with connection.cursor() as cur:
-        # Get statistics for this treasurer's city
-        cur.execute("""
-            SELECT 
-                COUNT(*) FILTER (WHERE status = 'PENDING') as pending_count,
-                COUNT(*) FILTER (WHERE status = 'APPROVED') as approved_count,
-                COUNT(*) FILTER (WHERE status = 'REJECTED') as rejected_count,
-                COUNT(*) as total_count
-            FROM budget_request
-            WHERE city_id = %s AND requester_id = %s;
-        """, [city_id, user_id])
-        row = cur.fetchone()
-        stats = {
-            'pending': row[0] or 0,
-            'approved': row[1] or 0,
-            'rejected': row[2] or 0,
-            'total': row[3] or 0,
-        }
-        
-        # Get this treasurer's requests
-        cur.execute("""
-            SELECT br.request_id,
-                   c.name AS city_name,
-                   br.month,
-                   br.description,
-                   br.status,
-                   br.created_at
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            WHERE br.requester_id = %s
-            ORDER BY br.created_at DESC;
-        """, [user_id])
-        my_requests = cur.fetchall()
+    stats, my_requests = queries.treasurer_dashboard(city_id, user_id)
     
     return render(request, 'treasurer/treasurer_dashboard.html', {
         'role': role,
@@ -271,17 +170,17 @@ def treasurer_dashboard(request):
 def api_login(request):
     """JSON API endpoint for login from React"""
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return json_response({'error': 'Method not allowed'}, status=405)
     
     try:
         data = json.loads(request.body)
         email = data.get('email', '').strip()
         password = data.get('password', '').strip()
     except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        return json_response({'error': 'Invalid JSON'}, status=400)
     
     if not email or not password:
-        return JsonResponse({'error': 'Email and password are required'}, status=400)
+        return json_response({'error': 'Email and password are required'}, status=400)
     
     with connection.cursor() as cur:
         cur.execute("""
@@ -294,19 +193,19 @@ def api_login(request):
         row = cur.fetchone()
 
     if not row:
-        return JsonResponse({'error': 'Invalid email or password'}, status=401)
+        return json_response({'error': 'Invalid email or password'}, status=401)
 
     user_id, name, email, role, city_id, city_name, stored_hash = row
 
     if not check_password(password, stored_hash):  # <<< PBKDF2 verification
-        return JsonResponse({'error': 'Invalid email or password'}, status=401)
+        return json_response({'error': 'Invalid email or password'}, status=401)
 
     # Set session
     request.session['user_id'] = user_id
     request.session['role'] = role
     request.session['city_id'] = city_id
 
-    return JsonResponse({
+    return json_response({
         'user': {
             'user_id': user_id,
             'name': name,
@@ -323,7 +222,7 @@ def api_current_user(request):
     user_id, role, city_id = get_current_user(request)
     
     if not user_id:
-        return JsonResponse({'error': 'Not authenticated'}, status=401)
+        return json_response({'error': 'Not authenticated'}, status=401)
     
     with connection.cursor() as cur:
         cur.execute("""
@@ -332,51 +231,35 @@ def api_current_user(request):
             LEFT JOIN city c ON c.city_id = u.city_id
             WHERE u.user_id = %s AND u.is_active = TRUE
         """, [user_id])
-        row = cur.fetchone()
+        user = fetch_dict(cur)
     
-    if not row:
-        return JsonResponse({'error': 'User not found'}, status=404)
+    if not user:
+        return json_response({'error': 'User not found'}, status=404)
     
-    return JsonResponse({
-        'user': {
-            'user_id': row[0],
-            'name': row[1],
-            'email': row[2],
-            'role': row[3],
-            'city_id': row[4],
-            'city_name': row[5],
-        }
-    })
+    return json_response({'user': user})
 
 
 @csrf_exempt
 def api_cities(request):
     """JSON API endpoint to get list of cities"""
     if not require_login(request):
-        return JsonResponse({'detail': 'Unauthorized'}, status=401)
+        return json_response({'detail': 'Unauthorized'}, status=401)
     
     with connection.cursor() as cur:
         cur.execute("SELECT city_id, name, province FROM city ORDER BY name;")
-        cities = [
-            {
-                'city_id': r[0],
-                'name': r[1],
-                'province': r[2],
-            }
-            for r in cur.fetchall()
-        ]
+        cities = fetch_dicts(cur)
     
-    return JsonResponse({'cities': cities}, safe=False)
+    return json_response({'cities': cities})
 
 
 @csrf_exempt
 def api_create_user(request):
     """JSON API endpoint for creating user accounts (Admin only)"""
     if not require_role(request, 'ADMIN'):
-        return JsonResponse({'detail': 'Forbidden'}, status=403)
+        return json_response({'detail': 'Forbidden'}, status=403)
     
     if request.method != 'POST':
-        return JsonResponse({'detail': 'Method not allowed'}, status=405)
+        return json_response({'detail': 'Method not allowed'}, status=405)
     
     try:
         data = json.loads(request.body)
@@ -387,19 +270,19 @@ def api_create_user(request):
         city_id = data.get('city_id')
         password = data.get('password', '').strip()
     except json.JSONDecodeError:
-        return JsonResponse({'detail': 'Invalid JSON'}, status=400)
+        return json_response({'detail': 'Invalid JSON'}, status=400)
     
     # Validation
     if role not in ('ADMIN', 'TREASURER'):
-        return JsonResponse({'detail': 'Role must be ADMIN or TREASURER'}, status=400)
+        return json_response({'detail': 'Role must be ADMIN or TREASURER'}, status=400)
     
     if not (name and email and password and city_id):
-        return JsonResponse({'detail': 'Name, email, password, and city are required'}, status=400)
+        return json_response({'detail': 'Name, email, password, and city are required'}, status=400)
     
     try:
         city_id_int = int(city_id)
     except (ValueError, TypeError):
-        return JsonResponse({'detail': 'Invalid city_id'}, status=400)
+        return json_response({'detail': 'Invalid city_id'}, status=400)
     
     with connection.cursor() as cur:
         try:
@@ -409,21 +292,65 @@ def api_create_user(request):
                 VALUES (%s, %s, %s, %s, %s, %s, NOW(), TRUE)
                 RETURNING user_id, name, email, role, city_id
             """, [name, email, whatsapp, role, pw_hash, city_id_int])
-            row = cur.fetchone()
-            
-            return JsonResponse({
-                'user': {
-                    'user_id': row[0],
-                    'name': row[1],
-                    'email': row[2],
-                    'role': row[3],
-                    'city_id': row[4],
-                },
+            return json_response({
+                'user': fetch_dict(cur),
                 'message': 'User account created successfully'
             }, status=201)
         except Exception as e:
             # Check if it's a unique constraint violation
             error_msg = str(e)
             if 'unique' in error_msg.lower() or 'duplicate' in error_msg.lower():
-                return JsonResponse({'detail': 'Email already exists'}, status=400)
-            return JsonResponse({'detail': f'Error creating user: {error_msg}'}, status=500)
\ No newline at end of file
+                return json_response({'detail': 'Email already exists'}, status=400)
+            return json_response({'detail': f'Error creating user: {error_msg}'}, status=500)
+
+
+@csrf_exempt
+def api_import_users(request):
+    """
+    JSON API endpoint for creating many user accounts at once (Admin only).
+    Takes CSV (text/csv, or a multipart upload named "file") with a header
+    row of the api_create_user fields, or JSON (a list of users or
+    {"users": [...]}); ?dry_run=1 only validates. Returns the users created
+    and, per rejected row, its row number and why (e.g. duplicate email).
+    Honours Idempotency-Key without holding a transaction open while the
+    passwords are hashed (idempotency.claim_key). See api/provisioning.py.
+    """
+    if not require_role(request, 'ADMIN'):
+        return json_response({'detail': 'Forbidden'}, status=403)
+
+    if request.method != 'POST':
+        return json_response({'detail': 'Method not allowed'}, status=405)
+
+    dry_run = request.GET.get('dry_run') == '1'
+    try:
+        upload = request.FILES.get('file')
+        if upload is not None:
+            text = upload.read().decode('utf-8-sig')
+            is_csv = not upload.name.lower().endswith('.json')
+        else:
+            text = request.body.decode('utf-8-sig')
+            is_csv = request.content_type in ('text/csv', 'text/plain')
+        rows = provisioning.parse_csv(text) if is_csv else provisioning.parse_json(text)
+    except UnicodeDecodeError:
+        return json_response({'detail': 'Upload must be UTF-8'}, status=400)
+    except provisioning.ImportRejected as exc:
+        return json_response({'detail': str(exc)}, status=400)
+
+    claim, response = idempotency.claim_key(request, rows)
+    if response is not None:
+        return response
+    try:
+        result = provisioning.import_users(rows, dry_run=dry_run)
+    except provisioning.ImportRejected as exc:
+        response = json_response({'detail': str(exc)}, status=400)
+    except Exception:
+        idempotency.release_key(claim)
+        raise
+    else:
+        if not result['created']:
+            status = 400 if result['errors'] else 200
+        else:
+            status = 200 if dry_run else 201
+        response = json_response(result, status=status)
+    idempotency.release_key(claim, response)
+    return response
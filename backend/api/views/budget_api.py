@@ -1,65 +1,22 @@
 import json
 
-from django.db import connection
-from django.http import JsonResponse
+from django.db import connection, transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from .. import approvals, partitions, queries, states
+from ..archive import archived_month
+from ..cache import invalidate_city, treasurer_cache
+from ..conditional import conditional, request_state, requester_state, review_queue_state
+from ..idempotency import idempotent
+from ..money import MoneyError, parse_json_lines
+from ..replicas import read_connection
+from ..responses import fetch_dict, fetch_dicts, json_response
 from .auth_views import get_current_user, require_login, require_role
 
 
-def _list_requests_for_api(user_id, role, city_id):
-    """
-    Returns list of budget requests as dicts.
-    - ADMIN: sees all requests from all cities
-    - TREASURER: sees only their own requests
-    """
-    base_sql = """
-        SELECT br.request_id,
-               br.month,
-               br.description,
-               br.status,
-               br.created_at,
-               u.name AS requester_name,
-               br.requester_id,
-               COALESCE(re.total_amount, 0) AS total_amount
-        FROM budget_request br
-        LEFT JOIN users u ON u.user_id = br.requester_id
-        LEFT JOIN requested_event re ON re.request_id = br.request_id
-    """
-    params = []
-    if role == 'ADMIN':
-        # Admin sees all requests (no filtering)
-        sql = base_sql + " ORDER BY br.created_at DESC"
-        params = []
-    else:
-        # Treasurer sees only their own requests
-        sql = (
-            base_sql
-            + " WHERE br.requester_id = %s ORDER BY br.created_at DESC"
-        )
-        params = [user_id]
-
-    with connection.cursor() as cur:
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-
-    return [
-        {
-            "request_id": r[0],
-            "month": r[1].isoformat() if r[1] else None,
-            "description": r[2],
-            "status": r[3],
-            "created_at": r[4].isoformat() if r[4] else None,
-            "requester": r[5],
-            "requester_id": r[6],
-            "total_amount": float(r[7]) if r[7] else 0,
-        }
-        for r in rows
-    ]
-
-
 @csrf_exempt
+@idempotent
 def api_budget_requests(request):
     """
     JSON API endpoint for budget requests.
@@ -71,21 +28,24 @@ def api_budget_requests(request):
     POST: Creates new budget request with event and breakdown lines
           Required fields: month, event.name, event.event_date
           Returns: { request_id, req_event_id, status: "PENDING" }
+          A retry with the same Idempotency-Key header gets the first
+          response back instead of creating a second request.
     """
     if not require_login(request):
-        return JsonResponse({'detail': 'Unauthorized'}, status=401)
+        return json_response({'detail': 'Unauthorized'}, status=401)
 
     user_id, role, city_id = get_current_user(request)
 
     if request.method == 'GET':
-        data = _list_requests_for_api(user_id, role, city_id)
-        return JsonResponse(data, safe=False)
+        with read_connection(request).cursor() as cur:
+            rows = queries.request_list(cur, user_id, role)
+        return json_response([row.as_api() for row in rows], safe=False)
 
     if request.method == 'POST':
         try:
             payload = json.loads(request.body.decode('utf-8'))
         except (json.JSONDecodeError, UnicodeDecodeError):
-            return JsonResponse({'detail': 'Invalid JSON'}, status=400)
+            return json_response({'detail': 'Invalid JSON'}, status=400)
 
         month = payload.get('month')
         description = (payload.get('description') or '').strip()
@@ -94,88 +54,22 @@ def api_budget_requests(request):
 
         required_fields = [month, event.get('name'), event.get('event_date')]
         if not all(required_fields):
-            return JsonResponse({'detail': 'month, event.name, and event.event_date are required'}, status=400)
+            return json_response({'detail': 'month, event.name, and event.event_date are required'}, status=400)
 
         try:
-            with connection.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO budget_request
-                        (city_id, requester_id, recipient_id, month, description, status, created_at)
-                    VALUES
-                        (%s, %s, NULL, %s, %s, 'PENDING', NOW())
-                    RETURNING request_id
-                """,
-                    [city_id, user_id, month, description],
-                )
-                row = cur.fetchone()
-                if not row:
-                    raise Exception("Failed to retrieve request_id after INSERT")
-                request_id = row[0]
+            lines, _ = parse_json_lines(breakdown)
+        except MoneyError as exc:
+            return json_response({'detail': str(exc)}, status=400)
 
-                cur.execute(
-                    """
-                    INSERT INTO requested_event
-                        (request_id, name, event_date, total_amount, notes)
-                    VALUES
-                        (%s, %s, %s, %s, %s)
-                    RETURNING req_event_id
-                """,
-                    [
-                        request_id,
-                        event['name'],
-                        event['event_date'],
-                        None,
-                        event.get('notes') or description,
-                    ],
+        try:
+            with transaction.atomic(), connection.cursor() as cur:
+                request_id, req_event_id = queries.create_request(
+                    cur, city_id, user_id, month, description,
+                    event['name'], event['event_date'], event.get('notes') or description, lines,
                 )
-                row = cur.fetchone()
-                if not row:
-                    raise Exception("Failed to retrieve req_event_id after INSERT")
-                req_event_id = row[0]
-
-                total_amount = 0
-                for line in breakdown:
-                    desc = (line.get('description') or '').strip()
-                    amount = line.get('amount')
-                    if desc == '' and not amount:
-                        continue
-                    category_id = line.get('category_id')
-                    if category_id in ('', None):
-                        category_id = None
-                    else:
-                        try:
-                            category_id = int(category_id)
-                        except (TypeError, ValueError):
-                            category_id = None
-                    try:
-                        amount_value = float(amount)
-                    except (TypeError, ValueError):
-                        amount_value = 0
-                    total_amount += amount_value
-
-                    cur.execute(
-                        """
-                        INSERT INTO requested_break_down_line
-                            (req_event_id, category_id, description, amount)
-                        VALUES
-                            (%s, %s, %s, %s)
-                    """,
-                        [
-                            req_event_id,
-                            category_id,
-                            desc,
-                            amount_value,
-                        ],
-                    )
-
-                if total_amount:
-                    cur.execute(
-                        "UPDATE requested_event SET total_amount = %s WHERE req_event_id = %s",
-                        [total_amount, req_event_id],
-                    )
-
-            return JsonResponse(
+
+            invalidate_city(city_id)
+            return json_response(
                 {
                     'request_id': request_id,
                     'req_event_id': req_event_id,
@@ -183,10 +77,183 @@ def api_budget_requests(request):
                 },
                 status=201,
             )
+        except partitions.MonthOutOfRange as exc:
+            return json_response({'detail': str(exc)}, status=400)
         except Exception as exc:
-            return JsonResponse({'detail': str(exc)}, status=500)
+            return json_response({'detail': str(exc)}, status=500)
+
+    return json_response({'detail': 'Method not allowed'}, status=405)
+
+
+CHANGES_PAGE_SIZE = 500
+
 
-    return JsonResponse({'detail': 'Method not allowed'}, status=405)
+def _parse_cursor(value):
+    """Change feed cursor '<txid>.<seq>' -> (txid, seq); raises ValueError"""
+    txid, seq = value.split('.')
+    txid, seq = int(txid), int(seq)
+    if txid < 0 or seq < 0:
+        raise ValueError(value)
+    return txid, seq
+
+
+def api_budget_request_changes(request):
+    """
+    GET ?since=<cursor>: budget requests created, updated or deleted since the
+    cursor, scoped like the request list (admins see all, treasurers their
+    own). Returns {upserts: [list rows], deleted: [ids], cursor, has_more}.
+    Without `since` only the current cursor is returned, so a client loads
+    the full list once and then follows the feed.
+
+    Only changes from transactions older than every in-flight transaction
+    are served, so a change committed late can never land behind a cursor
+    the client already holds.
+    """
+    if not require_login(request):
+        return json_response({'detail': 'Unauthorized'}, status=401)
+    if request.method != 'GET':
+        return json_response({'detail': 'Method not allowed'}, status=405)
+
+    user_id, role, city_id = get_current_user(request)
+    scope_sql = "" if role == 'ADMIN' else " AND c.requester_id = %s"
+    scope_params = [] if role == 'ADMIN' else [user_id]
+
+    since = request.GET.get('since')
+    with connection.cursor() as cur:
+        if not since:
+            cur.execute(f"""
+                SELECT c.txid::text, c.seq
+                FROM budget_request_change c
+                WHERE c.txid < pg_snapshot_xmin(pg_current_snapshot()){scope_sql}
+                ORDER BY c.txid DESC, c.seq DESC
+                LIMIT 1
+            """, scope_params)
+            row = cur.fetchone()
+            cursor = f'{row[0]}.{row[1]}' if row else '0.0'
+            return json_response({'upserts': [], 'deleted': [], 'cursor': cursor, 'has_more': False})
+
+        try:
+            txid, seq = _parse_cursor(since)
+        except ValueError:
+            return json_response({'detail': 'Invalid cursor'}, status=400)
+
+        cur.execute(f"""
+            SELECT c.txid::text, c.seq, c.request_id
+            FROM budget_request_change c
+            WHERE (c.txid, c.seq) > (%s::text::xid8, %s)
+              AND c.txid < pg_snapshot_xmin(pg_current_snapshot()){scope_sql}
+            ORDER BY c.txid, c.seq
+            LIMIT %s
+        """, [txid, seq] + scope_params + [CHANGES_PAGE_SIZE + 1])
+        changes = cur.fetchall()
+
+    has_more = len(changes) > CHANGES_PAGE_SIZE
+    changes = changes[:CHANGES_PAGE_SIZE]
+    if not changes:
+        return json_response({'upserts': [], 'deleted': [], 'cursor': since, 'has_more': False})
+
+    # Several log rows for one request collapse into its current state
+    changed_ids = {c[2] for c in changes}
+    with connection.cursor() as cur:
+        rows = queries.request_list(cur, user_id, role, request_ids=changed_ids)
+    upserts = [row.as_api() for row in rows]
+    deleted = sorted(changed_ids - {r['request_id'] for r in upserts})
+
+    last = changes[-1]
+    return json_response({
+        'upserts': upserts,
+        'deleted': deleted,
+        'cursor': f'{last[0]}.{last[1]}',
+        'has_more': has_more,
+    })
+
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_QUERY_LENGTH = 200
+
+
+def api_budget_request_search(request):
+    """
+    GET ?q=<text>&page=<n>&page_size=<n>: budget requests matching q, best
+    match first, scoped like the request list. Matches come from the
+    search_document full-text column (descriptions, event names and notes,
+    breakdown lines, requester name) and from trigram similarity on
+    requester and event names, which tolerates typos and partial words.
+    Returns {results: [list rows + rank], page, page_size, has_more}.
+    """
+    if not require_login(request):
+        return json_response({'detail': 'Unauthorized'}, status=401)
+    if request.method != 'GET':
+        return json_response({'detail': 'Method not allowed'}, status=405)
+
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return json_response({'detail': 'q is required'}, status=400)
+    if len(q) > SEARCH_MAX_QUERY_LENGTH:
+        return json_response({'detail': 'q is too long'}, status=400)
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', SEARCH_PAGE_SIZE))
+    except ValueError:
+        return json_response({'detail': 'page and page_size must be integers'}, status=400)
+    if page < 1 or not 1 <= page_size <= SEARCH_MAX_PAGE_SIZE:
+        return json_response({'detail': f'page must be >= 1 and page_size 1-{SEARCH_MAX_PAGE_SIZE}'}, status=400)
+
+    user_id, role, city_id = get_current_user(request)
+    # Scope every branch, so a treasurer's search only ranks their own requests
+    scope_sql = "" if role == 'ADMIN' else " AND br.requester_id = %(user_id)s"
+
+    with read_connection(request).cursor() as cur:
+        cur.execute(f"""
+            WITH query AS (
+                SELECT websearch_to_tsquery('english', %(q)s) AS tsq
+            ),
+            hits AS (
+                SELECT br.request_id, ts_rank_cd(br.search_document, query.tsq, 32) AS rank
+                FROM budget_request br, query
+                WHERE br.search_document @@ query.tsq{scope_sql}
+                UNION ALL
+                SELECT br.request_id, similarity(u.name, %(q)s)
+                FROM users u
+                JOIN budget_request br ON br.requester_id = u.user_id
+                WHERE u.name %% %(q)s{scope_sql}
+                UNION ALL
+                SELECT re.request_id, word_similarity(%(q)s, re.name)
+                FROM requested_event re
+                JOIN budget_request br
+                  ON br.request_id = re.request_id AND br.month = re.request_month
+                WHERE %(q)s <%% re.name{scope_sql}
+            )
+            SELECT br.request_id,
+                   br.month,
+                   br.description,
+                   br.status,
+                   br.created_at,
+                   br.requester_name AS requester,
+                   br.requester_id,
+                   br.total_amount,
+                   MAX(h.rank) AS rank
+            FROM hits h
+            JOIN budget_request br ON br.request_id = h.request_id
+            WHERE br.deleted_at IS NULL
+            GROUP BY br.request_id, br.month
+            ORDER BY rank DESC, br.created_at DESC, br.request_id DESC
+            LIMIT %(limit)s OFFSET %(offset)s
+        """, {
+            'q': q,
+            'user_id': user_id,
+            'limit': page_size + 1,
+            'offset': (page - 1) * page_size,
+        })
+        results = fetch_dicts(cur)
+
+    return json_response({
+        'results': results[:page_size],
+        'page': page,
+        'page_size': page_size,
+        'has_more': len(results) > page_size,
+    })
 
 
 # Expose aliases so urls can give separate names for GET/POST
@@ -194,7 +261,79 @@ api_budget_list = api_budget_requests
 api_budget_create = api_budget_requests
 
 
+def _request_detail(cur, request_id, schema='public', month=None):
+    """
+    A request with its event, breakdown lines and latest decision, read from
+    the hot tables or (schema='archive') an archived fiscal year. Passing the
+    month prunes the request lookup to one partition.
+    """
+    month_filter = 'AND br.month = %s' if month else ''
+    cur.execute(f"""
+        SELECT 
+            br.request_id,
+            br.requester_id,
+            br.month,
+            br.description,
+            br.status,
+            br.created_at,
+            br.updated_at,
+            br.version,
+            re.name AS event_name,
+            re.event_date,
+            re.notes AS event_notes,
+            COALESCE(re.total_amount, 0) AS event_total_amount
+        FROM {schema}.budget_request br
+        LEFT JOIN {schema}.requested_event re
+          ON re.request_id = br.request_id AND re.request_month = br.month
+        WHERE br.request_id = %s AND br.deleted_at IS NULL {month_filter}
+    """, [request_id, month] if month else [request_id])
+    
+    request_data = fetch_dict(cur)
+    if not request_data:
+        return None
+    
+    request_data['event'] = {
+        'name': request_data.pop('event_name'),
+        'event_date': request_data.pop('event_date'),
+        'notes': request_data.pop('event_notes'),
+        'total_amount': request_data.pop('event_total_amount'),
+    }
+    
+    # Get breakdown lines (linked through event); the month keeps
+    # both lookups inside the request's fiscal-year partition
+    month = request_data['month']
+    cur.execute(f"""
+        SELECT rbl.line_id,
+               rbl.description,
+               COALESCE(rbl.amount, 0) AS amount,
+               rbl.category_id
+        FROM {schema}.requested_break_down_line rbl
+        JOIN {schema}.requested_event re
+          ON rbl.req_event_id = re.req_event_id AND rbl.request_month = re.request_month
+        WHERE re.request_id = %s AND re.request_month = %s
+        ORDER BY rbl.line_id
+    """, [request_id, month])
+    request_data['breakdown_lines'] = fetch_dicts(cur)
+    
+    # Get approval/rejection comment if exists
+    cur.execute(f"""
+        SELECT note AS admin_comment, decided_at, decision
+        FROM {schema}.approval
+        WHERE request_id = %s AND request_month = %s
+        ORDER BY decided_at DESC
+        LIMIT 1
+    """, [request_id, month])
+    
+    approval = fetch_dict(cur)
+    if approval:
+        request_data.update(approval)
+    if schema == 'public':
+        request_data['stage'] = approvals.request_stage(cur, request_id)
+    return request_data
+
+
 @csrf_exempt
+@conditional(request_state)
 def api_budget_request_detail(request, request_id):
     """
     GET: Return detailed information about a specific budget request
@@ -204,117 +343,53 @@ def api_budget_request_detail(request, request_id):
     
     # Check if user is logged in
     if not user_id:
-        return JsonResponse({'detail': 'Authentication required'}, status=401)
+        return json_response({'detail': 'Authentication required'}, status=401)
     
     if request.method == 'GET':
-        # Fetch request details with event and breakdown lines
+        # Fetch request details with event and breakdown lines; requests of
+        # archived fiscal years are read from the archive schema
         try:
             with connection.cursor() as cur:
-                # Get request and event details
-                cur.execute("""
-                    SELECT 
-                        br.request_id,
-                        br.requester_id,
-                        br.month,
-                        br.description,
-                        br.status,
-                        br.created_at,
-                        re.name,
-                        re.event_date,
-                        re.notes,
-                        re.total_amount
-                    FROM budget_request br
-                    LEFT JOIN requested_event re ON br.request_id = re.request_id
-                    WHERE br.request_id = %s
-                """, [request_id])
-                
-                row = cur.fetchone()
-                if not row:
-                    return JsonResponse({'detail': 'Request not found'}, status=404)
-                
-                # Build request object
-                request_data = {
-                    'request_id': row[0],
-                    'requester_id': row[1],
-                    'month': row[2].isoformat() if row[2] else None,
-                    'description': row[3],
-                    'status': row[4],
-                    'created_at': row[5].isoformat() if row[5] else None,
-                    'event': {
-                        'name': row[6],
-                        'event_date': row[7].isoformat() if row[7] else None,
-                        'notes': row[8],
-                        'total_amount': float(row[9]) if row[9] else 0,
-                    }
-                }
-                
-                # Get breakdown lines (linked through event)
-                cur.execute("""
-                    SELECT rbl.line_id, rbl.description, rbl.amount, rbl.category_id
-                    FROM requested_break_down_line rbl
-                    JOIN requested_event re ON rbl.req_event_id = re.req_event_id
-                    WHERE re.request_id = %s
-                    ORDER BY rbl.line_id
-                """, [request_id])
-                
-                breakdown_lines = []
-                for line_row in cur.fetchall():
-                    breakdown_lines.append({
-                        'line_id': line_row[0],
-                        'description': line_row[1],
-                        'amount': float(line_row[2]) if line_row[2] else 0,
-                        'category_id': line_row[3],
-                    })
-                
-                request_data['breakdown_lines'] = breakdown_lines
-                
-                # Get approval/rejection comment if exists
-                cur.execute("""
-                    SELECT note, decided_at, decision
-                    FROM approval
-                    WHERE request_id = %s
-                    ORDER BY decided_at DESC
-                    LIMIT 1
-                """, [request_id])
-                
-                approval_row = cur.fetchone()
-                if approval_row:
-                    request_data['admin_comment'] = approval_row[0]
-                    request_data['decided_at'] = approval_row[1].isoformat() if approval_row[1] else None
-                    request_data['decision'] = approval_row[2]
-                
-                return JsonResponse(request_data, status=200)
+                request_data = _request_detail(cur, request_id)
+                if not request_data:
+                    month = archived_month(cur, request_id)
+                    if month:
+                        request_data = _request_detail(cur, request_id, 'archive', month)
+                        request_data['archived'] = True
+                if not request_data:
+                    return json_response({'detail': 'Request not found'}, status=404)
+                return json_response(request_data, status=200)
                 
         except Exception as e:
-            return JsonResponse({'detail': str(e)}, status=500)
+            return json_response({'detail': str(e)}, status=500)
     
     elif request.method == 'PUT':
         # Update budget request and reset to PENDING
         
         # Only treasurers can update their own requests
         if role != 'TREASURER':
-            return JsonResponse({'detail': 'Only treasurers can update requests'}, status=403)
+            return json_response({'detail': 'Only treasurers can update requests'}, status=403)
         
         try:
             data = json.loads(request.body)
         except json.JSONDecodeError:
-            return JsonResponse({'detail': 'Invalid JSON'}, status=400)
+            return json_response({'detail': 'Invalid JSON'}, status=400)
         
         # Validate ownership
         try:
             with connection.cursor() as cur:
                 cur.execute(
-                    "SELECT requester_id FROM budget_request WHERE request_id = %s",
+                    "SELECT requester_id FROM budget_request WHERE request_id = %s AND deleted_at IS NULL",
                     [request_id]
                 )
                 row = cur.fetchone()
                 if not row:
-                    return JsonResponse({'detail': 'Request not found'}, status=404)
+                    return json_response({'detail': 'Request not found'}, status=404)
                 
                 if row[0] != user_id:
-                    return JsonResponse({'detail': 'You can only edit your own requests'}, status=403)
+                    return json_response({'detail': 'You can only edit your own requests'}, status=403)
         except Exception as e:
-            return JsonResponse({'detail': str(e)}, status=500)
+            return json_response({'detail': str(e)}, status=500)
         
         # Extract fields
         month = data.get('month')
@@ -330,167 +405,124 @@ def api_budget_request_detail(request, request_id):
         breakdown_lines = data.get('breakdown', [])
         
         if not month:
-            return JsonResponse({'detail': 'Month is required'}, status=400)
+            return json_response({'detail': 'Month is required'}, status=400)
         if not event_name:
-            return JsonResponse({'detail': 'Event name is required'}, status=400)
+            return json_response({'detail': 'Event name is required'}, status=400)
         if not breakdown_lines:
-            return JsonResponse({'detail': 'At least one breakdown line is required'}, status=400)
+            return json_response({'detail': 'At least one breakdown line is required'}, status=400)
+        
+        try:
+            lines, _ = parse_json_lines(breakdown_lines)
+        except MoneyError as exc:
+            return json_response({'detail': str(exc)}, status=400)
         
-        # Calculate total
         try:
-            amount_requested = sum(float(line.get('amount', 0)) for line in breakdown_lines)
-        except (ValueError, TypeError):
-            return JsonResponse({'detail': 'Invalid breakdown amounts'}, status=400)
+            version = states.parse_version(data.get('version'))
+        except (TypeError, ValueError):
+            return json_response({'detail': 'version must be a positive integer'}, status=400)
         
         # Update database
         try:
-            with connection.cursor() as cur:
-                # Update budget_request (reset status to PENDING)
-                cur.execute("""
-                    UPDATE budget_request 
-                    SET month = %s, description = %s, status = 'PENDING'
-                    WHERE request_id = %s
-                """, [month, description, request_id])
-                
-                # Delete old breakdown lines first (before deleting event due to foreign key)
-                cur.execute("""
-                    DELETE FROM requested_break_down_line 
-                    WHERE req_event_id IN (
-                        SELECT req_event_id FROM requested_event WHERE request_id = %s
-                    )
-                """, [request_id])
-                
-                # Delete old event
-                cur.execute(
-                    "DELETE FROM requested_event WHERE request_id = %s",
-                    [request_id]
+            with transaction.atomic(), connection.cursor() as cur:
+                # Replace the event and lines and reset the status to PENDING,
+                # unless it was decided or edited since the client loaded it
+                city_id = queries.resubmit_request(
+                    cur, request_id, month, description,
+                    event_name, event_date, event_notes, lines, version,
                 )
-                
-                # Insert new event and get its ID
-                req_event_id = None
-                if event_name:
-                    # Calculate total amount
-                    total_amount = sum(float(line.get('amount', 0)) for line in breakdown_lines)
-                    
-                    cur.execute("""
-                        INSERT INTO requested_event (request_id, name, event_date, notes, total_amount)
-                        VALUES (%s, %s, %s, %s, %s)
-                        RETURNING req_event_id
-                    """, [request_id, event_name, event_date, event_notes, total_amount])
-                    req_event_id = cur.fetchone()[0]
-                
-                    # Insert new breakdown lines linked to the event
-                    for line in breakdown_lines:
-                        line_desc = line.get('description', '')
-                        line_amt = float(line.get('amount', 0))
-                        category_id = line.get('category_id')
-                        cur.execute("""
-                            INSERT INTO requested_break_down_line (req_event_id, description, amount, category_id)
-                            VALUES (%s, %s, %s, %s)
-                        """, [req_event_id, line_desc, line_amt, category_id])
+                invalidate_city(city_id)
             
-            return JsonResponse({
+            return json_response({
                 'request_id': request_id,
                 'status': 'PENDING',
                 'message': 'Budget request updated successfully'
             }, status=200)
             
+        except partitions.MonthOutOfRange as exc:
+            return json_response({'detail': str(exc)}, status=400)
+        except states.RequestNotFound:
+            return json_response({'detail': 'Request not found'}, status=404)
+        except states.TransitionConflict as exc:
+            return json_response(exc.as_json(), status=409)
         except Exception as e:
-            return JsonResponse({'detail': str(e)}, status=500)
+            return json_response({'detail': str(e)}, status=500)
     
-    return JsonResponse({'detail': 'Method not allowed'}, status=405)
+    return json_response({'detail': 'Method not allowed'}, status=405)
 
 
-def _update_request_status(request_id, new_status, decision, approver_id, comment=None):
+def _update_request_status(request, request_id, action):
     """
-    Updates budget_request status and inserts approval record.
-    Returns JsonResponse with request_id and new status.
+    Applies a decision ('approve' or 'reject') to a PENDING budget_request
+    at its current approval stage and inserts the approval record, in one
+    transaction. The body may carry an optional comment and the version the
+    admin saw. Returns a JSON response with request_id, new status and, if
+    it is still PENDING, the stage it moved on to; 403 when the admin
+    doesn't approve that stage, 409 when the request was decided or changed
+    concurrently or another admin has claimed it.
     """
+    user_id, _, _ = get_current_user(request)
+
+    # Optional comment and version from the request body
+    comment = None
+    version = None
     try:
-        with connection.cursor() as cur:
-            # Check if request exists
-            cur.execute(
-                "SELECT request_id FROM budget_request WHERE request_id = %s",
-                [request_id],
-            )
-            row = cur.fetchone()
-            if not row:
-                return JsonResponse({'detail': 'Request not found'}, status=404)
+        data = json.loads(request.body)
+        comment = (data.get('comment') or '').strip() or None
+        version = data.get('version')
+    except (json.JSONDecodeError, AttributeError):
+        pass
+    try:
+        version = states.parse_version(version)
+    except (TypeError, ValueError):
+        return json_response({'detail': 'version must be a positive integer'}, status=400)
 
-            # Update status
-            cur.execute(
-                "UPDATE budget_request SET status = %s WHERE request_id = %s",
-                [new_status, request_id],
-            )
-            
-            # Insert approval record with optional comment
-            cur.execute(
-                """
-                INSERT INTO approval (request_id, approver_id, decision, note, decided_at)
-                VALUES (%s, %s, %s, %s, NOW())
-            """,
-                [request_id, approver_id, decision, comment],
-            )
-        return JsonResponse({'request_id': request_id, 'status': new_status})
+    try:
+        with transaction.atomic(), connection.cursor() as cur:
+            city_id, new_status = approvals.decide(cur, request_id, action, user_id, comment, version)
+            stage = approvals.request_stage(cur, request_id) if new_status == states.PENDING else None
+            invalidate_city(city_id)
+        return json_response({'request_id': request_id, 'status': new_status, 'stage': stage})
+    except approvals.WrongStage as exc:
+        return json_response({'detail': str(exc)}, status=403)
+    except approvals.ClaimedByOther as exc:
+        return json_response({'detail': str(exc)}, status=409)
+    except states.RequestNotFound:
+        return json_response({'detail': 'Request not found'}, status=404)
+    except states.TransitionConflict as exc:
+        return json_response(exc.as_json(), status=409)
     except Exception as exc:
         # Log full traceback to the server console for debugging
         import traceback
         traceback.print_exc()
-        return JsonResponse({'detail': f'Internal error: {str(exc)}'}, status=500)
+        return json_response({'detail': f'Internal error: {str(exc)}'}, status=500)
 
 
 @csrf_exempt
 @require_POST
+@idempotent
 def api_budget_approve(request, request_id):
     """
     ADMIN-only: Approve a budget request via API.
-    Accepts optional comment in request body.
+    Accepts optional comment (and version) in request body.
     Returns JSON { request_id, status: "APPROVED" }
     """
     if not require_role(request, 'ADMIN'):
-        return JsonResponse({'detail': 'Forbidden'}, status=403)
-
-    user_id, _, _ = get_current_user(request)
-    
-    # Get optional comment from request body
-    comment = None
-    try:
-        data = json.loads(request.body)
-        comment = data.get('comment', '').strip() or None
-    except (json.JSONDecodeError, AttributeError):
-        pass
-    
-    response = _update_request_status(
-        request_id, 'APPROVED', 'YES', user_id, comment
-    )
-    return response
+        return json_response({'detail': 'Forbidden'}, status=403)
+    return _update_request_status(request, request_id, 'approve')
 
 
 @csrf_exempt
 @require_POST
+@idempotent
 def api_budget_reject(request, request_id):
     """
     ADMIN-only: Reject a budget request via API.
-    Accepts optional comment in request body.
+    Accepts optional comment (and version) in request body.
     Returns JSON { request_id, status: "REJECTED" }
     """
     if not require_role(request, 'ADMIN'):
-        return JsonResponse({'detail': 'Forbidden'}, status=403)
-
-    user_id, _, _ = get_current_user(request)
-    
-    # Get optional comment from request body
-    comment = None
-    try:
-        data = json.loads(request.body)
-        comment = data.get('comment', '').strip() or None
-    except (json.JSONDecodeError, AttributeError):
-        pass
-    
-    response = _update_request_status(
-        request_id, 'REJECTED', 'NO-PLEASE RESEND', user_id, comment
-    )
-    return response
+        return json_response({'detail': 'Forbidden'}, status=403)
+    return _update_request_status(request, request_id, 'reject')
 
 
 # ---------- Dashboard API Endpoints ----------
@@ -499,264 +531,131 @@ def api_budget_reject(request, request_id):
 def api_admin_dashboard(request):
     """JSON API endpoint for admin dashboard data"""
     if not require_role(request, 'ADMIN'):
-        return JsonResponse({'detail': 'Forbidden'}, status=403)
+        return json_response({'detail': 'Forbidden'}, status=403)
     
     user_id, role, city_id = get_current_user(request)
     
-    stats = {}
-    pending_requests = []
-    recent_activity = []
-    monthly_report = []
+    with read_connection(request).cursor() as cur:
+        counts, pending_requests, recent_activity, monthly_report = queries.admin_overview(cur)
+        stats = counts._asdict()
+        (stats['total_users'],) = queries.USER_COUNT.one(cur)
+        (stats['approved_amount'],) = queries.APPROVED_AMOUNT.one(cur)
     
-    with connection.cursor() as cur:
-        # Get statistics
-        cur.execute("""
-            SELECT 
-                COUNT(*) FILTER (WHERE status = 'PENDING') as pending_count,
-                COUNT(*) FILTER (WHERE status = 'APPROVED') as approved_count,
-                COUNT(*) FILTER (WHERE status = 'REJECTED') as rejected_count,
-                COUNT(*) as total_count
-            FROM budget_request;
-        """)
-        row = cur.fetchone()
-        if not row:
-            row = (0, 0, 0, 0)
-        stats = {
-            'pending': row[0] or 0,
-            'approved': row[1] or 0,
-            'rejected': row[2] or 0,
-            'total': row[3] or 0,
-        }
-        
-        # Get total users count
-        cur.execute("SELECT COUNT(*) FROM users;")
-        total_users = cur.fetchone()[0] or 0
-        stats['total_users'] = total_users
-        
-        # Get total approved amount
-        cur.execute("""
-            SELECT COALESCE(SUM(re.total_amount), 0)
-            FROM budget_request br
-            LEFT JOIN requested_event re ON re.request_id = br.request_id
-            WHERE br.status = 'APPROVED';
-        """)
-        approved_amount = cur.fetchone()[0] or 0
-        stats['approved_amount'] = float(approved_amount)
-        
-        # Get pending requests
-        cur.execute("""
-            SELECT br.request_id,
-                   c.name AS city_name,
-                   br.month,
-                   br.description,
-                   br.status,
-                   u.name AS requester_name,
-                   br.created_at
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN users u ON u.user_id = br.requester_id
-            WHERE br.status = 'PENDING'
-            ORDER BY br.created_at DESC
-            LIMIT 10;
-        """)
-        pending_requests = [
-            {
-                'request_id': r[0],
-                'city_name': r[1],
-                'month': r[2].isoformat() if r[2] else None,
-                'description': r[3],
-                'status': r[4],
-                'requester_name': r[5],
-                'created_at': r[6].isoformat() if r[6] else None,
-            }
-            for r in cur.fetchall()
-        ]
-        
-        # Get recent activity (all statuses)
-        cur.execute("""
-            SELECT br.request_id,
-                   c.name AS city_name,
-                   br.month,
-                   br.status,
-                   u.name AS requester_name,
-                   br.created_at
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN users u ON u.user_id = br.requester_id
-            ORDER BY br.created_at DESC
-            LIMIT 10;
-        """)
-        recent_activity = [
-            {
-                'request_id': r[0],
-                'city_name': r[1],
-                'month': r[2].isoformat() if r[2] else None,
-                'status': r[3],
-                'requester_name': r[4],
-                'created_at': r[5].isoformat() if r[5] else None,
-            }
-            for r in cur.fetchall()
-        ]
-        
-        # Get monthly report - combining ALL APPROVED requests per city/month
-        cur.execute("""
-            SELECT c.name AS city,
-                   TO_CHAR(br.month, 'YYYY-MM') AS month,
-                   COALESCE(SUM(re.total_amount), 0) AS total_amount
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN requested_event re ON re.request_id = br.request_id
-            WHERE br.status = 'APPROVED'
-            GROUP BY c.name, TO_CHAR(br.month, 'YYYY-MM')
-            ORDER BY TO_CHAR(br.month, 'YYYY-MM') DESC, c.name;
-        """)
-        monthly_report = [
-            {
-                'city': r[0],
-                'month': r[1],
-                'total_amount': float(r[2]) if r[2] else 0,
-            }
-            for r in cur.fetchall()
-        ]
-    
-    return JsonResponse({
+    return json_response({
         'stats': stats,
-        'pending_requests': pending_requests,
-        'recent_activity': recent_activity,
-        'monthly_report': monthly_report,
+        'pending_requests': queries.as_dicts(pending_requests),
+        'recent_activity': queries.as_dicts(recent_activity),
+        'monthly_report': queries.as_dicts(monthly_report),
     })
 
 
+def api_cache_stats(request):
+    """JSON API endpoint: hit/miss counters of this process's treasurer cache"""
+    if not require_role(request, 'ADMIN'):
+        return json_response({'detail': 'Forbidden'}, status=403)
+    return json_response(treasurer_cache.stats())
+
+
 @csrf_exempt
+@conditional(review_queue_state)
 def api_pending_requests(request):
     """JSON API endpoint for pending/rejected requests (Admin only)"""
     if not require_role(request, 'ADMIN'):
-        return JsonResponse({'detail': 'Forbidden'}, status=403)
+        return json_response({'detail': 'Forbidden'}, status=403)
 
     try:
         user_id, role, city_id = get_current_user(request)
 
-        with connection.cursor() as cur:
-            # Get all PENDING and REJECTED requests from all cities
-            cur.execute("""
-                     SELECT br.request_id,
-                         c.name AS city_name,
-                         br.month,
-                         br.description,
-                         br.status,
-                         u.name AS requester_name,
-                         u.email AS requester_email,
-                         br.created_at,
-                         re.total_amount
-                FROM budget_request br
-                JOIN city c ON c.city_id = br.city_id
-                LEFT JOIN users u ON u.user_id = br.requester_id
-                LEFT JOIN requested_event re ON br.request_id = re.request_id
-                WHERE br.status IN ('PENDING', 'REJECTED')
-                ORDER BY 
-                    CASE WHEN br.status = 'PENDING' THEN 0 ELSE 1 END,
-                    br.created_at DESC;
-            """)
-            rows = cur.fetchall()
-
-        requests = []
-        for r in rows:
-            # defensive handling in case any column is None or unexpected
-            try:
-                month_val = r[2].isoformat() if r[2] is not None else None
-            except Exception:
-                month_val = str(r[2]) if r[2] is not None else None
-
-            try:
-                created_at = r[7].isoformat() if r[7] is not None else None
-            except Exception:
-                created_at = str(r[7]) if r[7] is not None else None
-
-            # Database does not have an explicit updated_at column; use created_at as fallback
-            updated_at = created_at
-
-            requests.append({
-                'request_id': r[0],
-                'city_name': r[1],
-                'month': month_val,
-                'description': r[3],
-                'status': r[4],
-                'requester_name': r[5],
-                'requester_email': r[6],
-                'created_at': created_at,
-                'updated_at': updated_at,
-                'amount': float(r[8]) if r[8] is not None else 0,
-            })
-
-        return JsonResponse({'requests': requests})
+        with read_connection(request).cursor() as cur:
+            # PENDING first, then REJECTED, newest first within each. Two
+            # queries, each read in order from its partial index, instead of
+            # sorting both together on a CASE expression.
+            requests = []
+            for status in ('PENDING', 'REJECTED'):
+                cur.execute("""
+                    SELECT br.request_id,
+                           br.city_name,
+                           br.month,
+                           br.description,
+                           br.status,
+                           br.requester_name,
+                           u.email AS requester_email,
+                           br.created_at,
+                           br.updated_at,
+                           br.total_amount AS amount,
+                           q.stage_no,
+                           s.name AS stage_name,
+                           q.approver_role
+                    FROM budget_request br
+                    LEFT JOIN users u ON u.user_id = br.requester_id
+                    LEFT JOIN approval_queue q
+                      ON q.request_id = br.request_id AND q.request_month = br.month
+                    LEFT JOIN approval_stage s ON s.stage_no = q.stage_no
+                    WHERE br.status = %s AND br.deleted_at IS NULL
+                    ORDER BY br.created_at DESC;
+                """, [status])
+                requests.extend(fetch_dicts(cur))
+
+        return json_response({'requests': requests})
     except Exception as exc:
         # Log traceback to console for debugging and return error message
         import traceback
         traceback.print_exc()
-        return JsonResponse({'detail': str(exc)}, status=500)
+        return json_response({'detail': str(exc)}, status=500)
+
+
+@csrf_exempt
+@require_POST
+def api_approval_queue_claim(request):
+    """
+    ADMIN-only: claim the oldest request waiting at a stage this admin
+    approves, so other admins working the queue skip it. Returns
+    { request: {request_id, request_month, stage_no, stage_name} }, or
+    { request: null } when nothing is waiting.
+    """
+    if not require_role(request, 'ADMIN'):
+        return json_response({'detail': 'Forbidden'}, status=403)
+    user_id, _, _ = get_current_user(request)
+    with transaction.atomic(), connection.cursor() as cur:
+        claimed = approvals.claim_next(cur, user_id)
+    return json_response({'request': claimed})
+
+
+@csrf_exempt
+@require_POST
+def api_approval_queue_release(request, request_id):
+    """ADMIN-only: hand a claimed request back to the queue"""
+    if not require_role(request, 'ADMIN'):
+        return json_response({'detail': 'Forbidden'}, status=403)
+    user_id, _, _ = get_current_user(request)
+    with transaction.atomic(), connection.cursor() as cur:
+        released = approvals.release(cur, request_id, user_id)
+    if not released:
+        return json_response({'detail': 'You have not claimed this request'}, status=409)
+    return json_response({'request_id': request_id, 'released': True})
+
+
+def api_approval_queue_stats(request):
+    """ADMIN-only: per approval stage, requests waiting, claimed and the oldest wait"""
+    if not require_role(request, 'ADMIN'):
+        return json_response({'detail': 'Forbidden'}, status=403)
+    with read_connection(request).cursor() as cur:
+        stages = approvals.queue_depth(cur)
+    return json_response({'stages': stages})
 
 
 @csrf_exempt
+@conditional(requester_state)
 def api_treasurer_dashboard(request):
     """JSON API endpoint for treasurer dashboard data"""
     if not require_login(request):
-        return JsonResponse({'detail': 'Unauthorized'}, status=401)
+        return json_response({'detail': 'Unauthorized'}, status=401)
     
     user_id, role, city_id = get_current_user(request)
     
     if role != 'TREASURER':
-        return JsonResponse({'detail': 'Forbidden'}, status=403)
+        return json_response({'detail': 'Forbidden'}, status=403)
     
-    stats = {}
-    my_requests = []
-    
-    with connection.cursor() as cur:
-        # Get statistics for this treasurer's requests
-        cur.execute("""
-            SELECT 
-                COUNT(*) FILTER (WHERE status = 'PENDING') as pending_count,
-                COUNT(*) FILTER (WHERE status = 'APPROVED') as approved_count,
-                COUNT(*) FILTER (WHERE status = 'REJECTED') as rejected_count,
-                COUNT(*) as total_count
-            FROM budget_request
-            WHERE requester_id = %s;
-        """, [user_id])
-        row = cur.fetchone()
-        if not row:
-            row = (0, 0, 0, 0)
-        stats = {
-            'pending': row[0] or 0,
-            'approved': row[1] or 0,
-            'rejected': row[2] or 0,
-            'total': row[3] or 0,
-        }
-        
-        # Get this treasurer's requests
-        cur.execute("""
-            SELECT br.request_id,
-                   c.name AS city_name,
-                   br.month,
-                   br.description,
-                   br.status,
-                   br.created_at
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            WHERE br.requester_id = %s
-            ORDER BY br.created_at DESC;
-        """, [user_id])
-        my_requests = [
-            {
-                'request_id': r[0],
-                'city_name': r[1],
-                'month': r[2].isoformat() if r[2] else None,
-                'description': r[3],
-                'status': r[4],
-                'created_at': r[5].isoformat() if r[5] else None,
-            }
-            for r in cur.fetchall()
-        ]
-    
-    return JsonResponse({
-        'stats': stats,
-        'my_requests': my_requests,
-    })
+    # Served from the per-city cache until a write touches this city
+    stats, my_requests = queries.treasurer_dashboard(city_id, user_id)
+    return json_response({'stats': stats._asdict(), 'my_requests': queries.as_dicts(my_requests)})
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.shortcuts import redirect
 from django.db import connection, transaction
 from django.contrib import messages
-from django.http import JsonResponse
+from .. import queries, states
+from ..cache import invalidate_city
+from ..responses import json_response
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_http_methods
 from .auth_views import get_current_user, require_role, require_login
@@ -49,7 +52,8 @@ def delete_budget_request(request, request_id):
     with connection.cursor() as cur:
         # Check if request exists and belongs to user
         cur.execute("""
-            SELECT status, requester_id FROM budget_request WHERE request_id = %s;
+            SELECT status, requester_id, city_id, month FROM budget_request
+            WHERE request_id = %s AND deleted_at IS NULL;
         """, [request_id])
         result = cur.fetchone()
         
@@ -57,7 +61,7 @@ def delete_budget_request(request, request_id):
             messages.error(request, "Budget request not found.")
             return redirect('budget_request_list')
         
-        status, requester_id = result
+        status, requester_id, request_city_id, request_month = result
         
         # Check ownership
         if requester_id != user_id:
@@ -65,14 +69,21 @@ def delete_budget_request(request, request_id):
             return redirect('budget_request_list')
         
         # Only allow deletion of PENDING or REJECTED requests
-        if status not in ('PENDING', 'REJECTED'):
+        if status not in states.DELETABLE:
             messages.error(request, "Only PENDING or REJECTED requests can be deleted.")
             return redirect('budget_request_list')
         
         try:
-            # Delete will CASCADE to requested_event and breakdown lines
-            cur.execute("DELETE FROM budget_request WHERE request_id = %s;", [request_id])
-            messages.success(request, "Budget request deleted successfully.")
+            # Soft delete; the purge job removes it and its events, lines
+            # and approvals after the grace period
+            with transaction.atomic():
+                deleted = queries.delete_request(cur, request_id, request_month, user_id)
+            if deleted is None:
+                messages.error(request, "Only PENDING or REJECTED requests can be deleted.")
+            else:
+                invalidate_city(request_city_id)
+                messages.success(request, "Budget request deleted. It can be restored for "
+                                          f"{settings.SOFT_DELETE_GRACE_DAYS} days.")
         except Exception as e:
             messages.error(request, f"Error deleting request: {e}")
     
@@ -86,12 +97,12 @@ def delete_budget_request(request, request_id):
 def api_delete_user(request, user_id):
     """DELETE: Deactivate user via API (ADMIN only)"""
     if not require_role(request, 'ADMIN'):
-        return JsonResponse({'detail': 'Forbidden'}, status=403)
+        return json_response({'detail': 'Forbidden'}, status=403)
     
     current_user_id, _, _ = get_current_user(request)
     
     if current_user_id == user_id:
-        return JsonResponse({'detail': 'Cannot deactivate your own account'}, status=400)
+        return json_response({'detail': 'Cannot deactivate your own account'}, status=400)
     
     with connection.cursor() as cur:
         cur.execute("""
@@ -103,9 +114,9 @@ def api_delete_user(request, user_id):
         row = cur.fetchone()
         
         if not row:
-            return JsonResponse({'detail': 'User not found'}, status=404)
+            return json_response({'detail': 'User not found'}, status=404)
     
-    return JsonResponse({'user_id': user_id, 'is_active': False})
+    return json_response({'user_id': user_id, 'is_active': False})
 
 
 @csrf_exempt
@@ -116,21 +127,21 @@ def api_delete_budget_request(request, request_id):
     user_id, role, _ = get_current_user(request)
     
     if not user_id:
-        return JsonResponse({'detail': 'Unauthorized'}, status=401)
+        return json_response({'detail': 'Unauthorized'}, status=401)
     
     with connection.cursor() as cur:
         # Check ownership and status
         cur.execute("""
-            SELECT requester_id, status 
-            FROM budget_request 
-            WHERE request_id = %s
+            SELECT requester_id, status, city_id, month
+            FROM budget_request
+            WHERE request_id = %s AND deleted_at IS NULL
         """, [request_id])
         row = cur.fetchone()
         
         if not row:
-            return JsonResponse({'detail': 'Request not found'}, status=404)
+            return json_response({'detail': 'Request not found'}, status=404)
         
-        requester_id, status = row
+        requester_id, status, request_city_id, request_month = row
         
         # Check authorization: Admin can delete any request, Treasurer can only delete their own
         if role == 'ADMIN':
@@ -139,30 +150,50 @@ def api_delete_budget_request(request, request_id):
         elif role == 'TREASURER':
             # Treasurer can only delete their own requests
             if requester_id != user_id:
-                return JsonResponse({'detail': 'You can only delete your own budget requests'}, status=403)
+                return json_response({'detail': 'You can only delete your own budget requests'}, status=403)
         else:
-            return JsonResponse({'detail': 'Unauthorized'}, status=403)
+            return json_response({'detail': 'Unauthorized'}, status=403)
         
         # Check status - only PENDING or REJECTED can be deleted
-        if status not in ('PENDING', 'REJECTED'):
-            return JsonResponse({'detail': 'Only PENDING or REJECTED requests can be deleted'}, status=400)
+        if status not in states.DELETABLE:
+            return json_response({'detail': 'Only PENDING or REJECTED requests can be deleted'}, status=400)
         
-        # Manually delete in correct order due to foreign key constraints
-        # First, delete breakdown lines
-        cur.execute("""
-            DELETE FROM requested_break_down_line 
-            WHERE req_event_id IN (
-                SELECT req_event_id FROM requested_event WHERE request_id = %s
-            )
-        """, [request_id])
-        
-        # Then delete the event
-        cur.execute("DELETE FROM requested_event WHERE request_id = %s", [request_id])
+        # Only marks the request deleted; the status is re-checked by the
+        # UPDATE itself in case it was approved meanwhile
+        if queries.delete_request(cur, request_id, request_month, user_id) is None:
+            return json_response({'detail': 'Only PENDING or REJECTED requests can be deleted'}, status=409)
+        invalidate_city(request_city_id)
+    
+    return json_response({
+        'request_id': request_id,
+        'deleted': True,
+        'restorable_days': settings.SOFT_DELETE_GRACE_DAYS,
+    })
+
+
+@csrf_exempt
+@require_POST
+@transaction.atomic
+def api_restore_budget_request(request, request_id):
+    """POST: Undo a delete within SOFT_DELETE_GRACE_DAYS (owner or admin)"""
+    user_id, role, _ = get_current_user(request)
+    
+    if not user_id:
+        return json_response({'detail': 'Unauthorized'}, status=401)
+    
+    with connection.cursor() as cur:
+        row = queries.deleted_request(cur, request_id)
+        if not row:
+            return json_response({'detail': 'Deleted request not found'}, status=404)
         
-        # Delete any approval records (for REJECTED requests)
-        cur.execute("DELETE FROM approval WHERE request_id = %s", [request_id])
+        requester_id, request_month, restorable = row
+        if role != 'ADMIN' and requester_id != user_id:
+            return json_response({'detail': 'You can only restore your own budget requests'}, status=403)
         
-        # Finally delete the budget request
-        cur.execute("DELETE FROM budget_request WHERE request_id = %s", [request_id])
+        # Re-checked by the UPDATE, in case the purge got there first
+        request_city_id = queries.restore_request(cur, request_id, request_month) if restorable else None
+        if request_city_id is None:
+            return json_response({'detail': 'Request can no longer be restored'}, status=410)
+        invalidate_city(request_city_id)
     
-    return JsonResponse({'request_id': request_id, 'deleted': True})
+    return json_response({'request_id': request_id, 'deleted': False})
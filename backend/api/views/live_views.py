@@ -0,0 +1,31 @@
+from django.http import StreamingHttpResponse
+
+from ..live import event_stream
+from ..responses import json_response
+
+
+async def api_live_events(request):
+    """
+    Server-sent events for dashboards (see api/live.py).
+    - ADMIN: every request and approval event
+    - TREASURER: events for their own requests
+    A 'resync' event means some events were missed; refetch the dashboard.
+    """
+    user_id = await request.session.aget('user_id')
+    role = await request.session.aget('role')
+    if not user_id:
+        return json_response({'detail': 'Unauthorized'}, status=401)
+    if request.method != 'GET':
+        return json_response({'detail': 'Method not allowed'}, status=405)
+
+    if role == 'ADMIN':
+        accepts = None
+    else:
+        def accepts(event):
+            return event.get('requester_id') == user_id
+
+    response = StreamingHttpResponse(event_stream(accepts), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,14 +1,17 @@
+from datetime import date
+
 from django.shortcuts import render, redirect
-from django.db import connection
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from .. import queries
+from ..replicas import read_connection
+from ..responses import json_response
 from .auth_views import require_role, get_current_user, require_login
 
 def monthly_report(request):
     """
     ADMIN-only: Monthly report showing aggregated budget data.
     
-    Queries the vw_total_requested_per_city_month view to display:
+    Reads the precomputed approved totals (see queries.report_monthly_totals) to display:
     - City name
     - Month
     - Total amount requested
@@ -20,72 +23,59 @@ def monthly_report(request):
 
     user_id, role, _ = get_current_user(request)
 
-    rows = []
-    with connection.cursor() as cur:
-        cur.execute("""
-            SELECT c.name AS city,
-                   TO_CHAR(br.month, 'YYYY-MM') AS month,
-                   COALESCE(SUM(re.total_amount), 0) AS total_requested
-            FROM budget_request br
-            JOIN city c ON c.city_id = br.city_id
-            LEFT JOIN requested_event re ON re.request_id = br.request_id
-            WHERE br.status = 'APPROVED'
-            GROUP BY c.name, TO_CHAR(br.month, 'YYYY-MM')
-            ORDER BY TO_CHAR(br.month, 'YYYY-MM') DESC, c.name;
-        """)
-        rows = cur.fetchall()
+    with read_connection(request).cursor() as cur:
+        rows, refreshed_at = queries.report_monthly_totals(cur)
 
     return render(request, 'admin/reports_monthly.html', {
         'rows': rows,
+        'refreshed_at': refreshed_at,
         'role': role,
     })
 
 
+def _parse_month(value):
+    """'YYYY-MM' -> first day of that month; None when not given"""
+    if not value:
+        return None
+    return date.fromisoformat(value + '-01')
+
+
 @csrf_exempt
 def api_monthly_report(request):
     """
     JSON API endpoint for monthly report data.
-    Returns aggregated budget data by city and month.
+    Returns aggregated budget data by city and month. Optional ?from=YYYY-MM
+    and ?to=YYYY-MM bound the months (inclusive), so only the fiscal-year
+    partitions in range are read. Totals are precomputed by a background
+    job; refreshed_at says as of when (null while computed live).
     """
     user_id, role, city_id = get_current_user(request)
     
     # Check if user is logged in
     if not user_id:
-        return JsonResponse({'detail': 'Authentication required'}, status=401)
+        return json_response({'detail': 'Authentication required'}, status=401)
     
     # Only admins can access reports
     if role != 'ADMIN':
-        return JsonResponse({'detail': 'Admin access required'}, status=403)
+        return json_response({'detail': 'Admin access required'}, status=403)
     
     if request.method == 'GET':
         try:
-            with connection.cursor() as cur:
-                cur.execute("""
-                    SELECT c.name AS city,
-                           TO_CHAR(br.month, 'YYYY-MM') AS month,
-                           COALESCE(SUM(re.total_amount), 0) AS total_requested
-                    FROM budget_request br
-                    JOIN city c ON c.city_id = br.city_id
-                    LEFT JOIN requested_event re ON re.request_id = br.request_id
-                    WHERE br.status = 'APPROVED'
-                    GROUP BY c.name, TO_CHAR(br.month, 'YYYY-MM')
-                    ORDER BY TO_CHAR(br.month, 'YYYY-MM') DESC, c.name;
-                """)
-                rows = cur.fetchall()
-                
-                # Format data for JSON response
-                data = [
-                    {
-                        'city': row[0],
-                        'month': row[1],
-                        'total_requested': float(row[2]) if row[2] else 0
-                    }
-                    for row in rows
-                ]
-                
-                return JsonResponse({'data': data}, status=200)
+            first = _parse_month(request.GET.get('from'))
+            last = _parse_month(request.GET.get('to'))
+        except ValueError:
+            return json_response({'detail': 'from and to must look like YYYY-MM'}, status=400)
+
+        try:
+            with read_connection(request).cursor() as cur:
+                rows, refreshed_at = queries.report_monthly_totals(cur, first, last)
+            data = [
+                {'city': r.city, 'month': r.month, 'total_requested': r.total_amount}
+                for r in rows
+            ]
+            return json_response({'data': data, 'refreshed_at': refreshed_at}, status=200)
                 
         except Exception as e:
-            return JsonResponse({'detail': str(e)}, status=500)
+            return json_response({'detail': str(e)}, status=500)
     
-    return JsonResponse({'detail': 'Method not allowed'}, status=405)
+    return json_response({'detail': 'Method not allowed'}, status=405)
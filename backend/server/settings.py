@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -62,6 +63,9 @@ CORS_ALLOW_ALL_ORIGINS = os.getenv('CODESPACES', 'false').lower() == 'true'
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Let the React client send Idempotency-Key on retried writes (api/idempotency.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -70,6 +74,8 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'api.replicas.read_your_writes_middleware',
+    'api.audit.audit_actor_middleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -117,6 +123,13 @@ WSGI_APPLICATION = 'server.wsgi.application'
 #         'PORT': os.getenv('PG_PORT', '5432'),
 #     }
 # }
+# Under ASGI (server/asgi.py, uvicorn) Django runs each request's sync code
+# in a thread of its own, so a connection kept open after a request is
+# rarely reused and idle ones pile up: connections are closed after each
+# request there unless PG_CONN_MAX_AGE says otherwise. Keeping them (and the
+# statements prepared on them, see api/queries.py) only pays off under WSGI.
+SERVED_BY_ASGI = os.getenv('DJANGO_SERVER_INTERFACE') == 'asgi'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -125,9 +138,34 @@ DATABASES = {
         'PASSWORD': os.getenv('PG_PASSWORD', 'strong_password'),
         'HOST': os.getenv('PG_HOST', 'localhost'),
         'PORT': os.getenv('PG_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('PG_CONN_MAX_AGE', '0' if SERVED_BY_ASGI else '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Run api/queries.py statements as server-side prepared statements. Turn off
+# behind a connection pooler in transaction mode.
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'True') == 'True'
+
+# Optional streaming replica for heavy reads (see api/replicas.py). Same
+# database and credentials as the primary; sessions on it are read-only.
+if os.getenv('PG_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('PG_REPLICA_HOST'),
+        'PORT': os.getenv('PG_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': {'options': '-c default_transaction_read_only=on'},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# Reads fall back to the primary while the replica is further behind than
+# this, and for a while after a session writes, so users see their changes.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_CHECK_SECONDS = float(os.getenv('REPLICA_CHECK_SECONDS', '2'))
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -177,6 +215,82 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = '/dashboard/'
 
+# JSON encoder for API responses (see api/responses.py): 'auto' uses orjson
+# when it is installed, 'orjson' or 'stdlib' force one, or give a dotted path.
+API_JSON_BACKEND = os.getenv('API_JSON_BACKEND', 'auto')
+
+# Per-process cache of treasurer dashboards (see api/cache.py). Entries are
+# invalidated per city on writes; the TTL only bounds staleness if a
+# notification is missed.
+API_CACHE_MAX_ENTRIES = int(os.getenv('API_CACHE_MAX_ENTRIES', '2048'))
+API_CACHE_TTL_SECONDS = int(os.getenv('API_CACHE_TTL_SECONDS', '60'))
+
+# First month of the fiscal year; budget requests are partitioned by fiscal
+# year (see api/partitions.py). Must match the partitions already created by
+# database/schema.sql, which assumes April.
+FISCAL_YEAR_START_MONTH = int(os.getenv('FISCAL_YEAR_START_MONTH', '4'))
+
+# How long a stored Idempotency-Key response is replayed (see
+# api/idempotency.py); `manage.py expire_idempotency_keys` deletes older ones.
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# How long an admin's claim on a request in the approval queue lasts before
+# others may pick it up (see api/approvals.py).
+APPROVAL_CLAIM_MINUTES = int(os.getenv('APPROVAL_CLAIM_MINUTES', '15'))
+
+# Deleted budget requests can be restored for this many days; then the
+# purge_deleted_requests job removes them, PURGE_BATCH_SIZE per transaction.
+SOFT_DELETE_GRACE_DAYS = int(os.getenv('SOFT_DELETE_GRACE_DAYS', '7'))
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '500'))
+
+# Bulk user import (api/provisioning.py): processes hashing passwords, and
+# the most rows one upload may carry
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+USER_IMPORT_MAX_ROWS = int(os.getenv('USER_IMPORT_MAX_ROWS', '500'))
+
+# Background job runner (`manage.py run_jobs`, see api/jobs.py and api/tasks.py)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '5'))
+JOB_HISTORY_DAYS = int(os.getenv('JOB_HISTORY_DAYS', '30'))
+# Set to archive closed fiscal years older than this automatically each month
+JOB_ARCHIVE_KEEP_YEARS = int(os.environ['JOB_ARCHIVE_KEEP_YEARS']) if os.getenv('JOB_ARCHIVE_KEEP_YEARS') else None
+
+# Notifications (see api/notifications.py): a backend per channel; set a
+# channel's backend to '' to stop queueing messages for it. The file backend
+# (and Django's file email backend) write under NOTIFICATION_FILE_DIR for
+# local development.
+NOTIFICATION_FILE_DIR = os.getenv('NOTIFICATION_FILE_DIR', str(BASE_DIR / 'notifications'))
+NOTIFICATION_BACKENDS = {
+    channel: backend for channel, backend in {
+        'EMAIL': os.getenv('NOTIFY_EMAIL_BACKEND', 'api.notifications.EmailBackend'),
+        'WHATSAPP': os.getenv('NOTIFY_WHATSAPP_BACKEND', 'api.notifications.FileBackend'),
+    }.items() if backend
+}
+NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '50'))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '5'))
+# How long a dispatcher may take to send a batch before its rows are requeued;
+# must outlast a full batch of slow sends (WhatsApp waits up to 10 s each)
+NOTIFY_LEASE_SECONDS = int(os.getenv('NOTIFY_LEASE_SECONDS', '900'))
+# Messages per channel per minute, across all dispatchers
+NOTIFY_RATE_PER_MINUTE = {
+    'EMAIL': int(os.getenv('NOTIFY_EMAIL_PER_MINUTE', '60')),
+    'WHATSAPP': int(os.getenv('NOTIFY_WHATSAPP_PER_MINUTE', '20')),
+}
+
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH = os.path.join(NOTIFICATION_FILE_DIR, 'email')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'YM Finance <noreply@localhost>')
+
+# For NOTIFY_WHATSAPP_BACKEND=api.notifications.WhatsAppBackend
+WHATSAPP_API_VERSION = os.getenv('WHATSAPP_API_VERSION', 'v19.0')
+WHATSAPP_PHONE_NUMBER_ID = os.getenv('WHATSAPP_PHONE_NUMBER_ID', '')
+WHATSAPP_TOKEN = os.getenv('WHATSAPP_TOKEN', '')
+
 # Cookie/session behaviour. Chrome rejects SameSite=None unless the cookie is Secure,
 # so fall back to Lax for local HTTP development.
 SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False') == 'True'
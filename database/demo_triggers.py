@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import sys
 import os
-sys.path.insert(0, '/workspaces/Non-Profit-Database-Management/backend')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 import django
@@ -1,12 +1,23 @@
+-- Approves a PENDING request and records the decision. The conditional
+-- UPDATE is the compare-and-set of the request state machine (see
+-- backend/api/states.py): it returns FALSE when the request isn't PENDING
+-- (any more), and lets real errors propagate instead of hiding them.
+-- It approves in one step, whatever approval stage the request is at (the
+-- demo scripts use it); the application goes through backend/api/approvals.py.
 CREATE OR REPLACE FUNCTION approve_request(temp_request_id INT, temp_approver_id INT, temp_note TEXT)
 RETURNS BOOLEAN LANGUAGE plpgsql AS $$
+DECLARE
+  temp_month DATE;
 BEGIN
-  INSERT INTO approval (request_id, approver_id, decision, note, decided_at) VALUES 
-  (temp_request_id, temp_approver_id, 'YES', temp_note, now());
-  UPDATE budget_request SET status = 'APPROVED' WHERE request_id = temp_request_id;
+  UPDATE budget_request SET status = 'APPROVED'
+  WHERE request_id = temp_request_id AND status = 'PENDING' AND deleted_at IS NULL
+  RETURNING month INTO temp_month;
+  IF NOT FOUND THEN
+    RETURN FALSE;
+  END IF;
+  INSERT INTO approval (request_id, request_month, approver_id, decision, note, decided_at)
+  VALUES (temp_request_id, temp_month, temp_approver_id, 'YES', temp_note, now());
   RETURN TRUE;
-EXCEPTION WHEN OTHERS THEN
-  RETURN FALSE;
 END;
 $$;
 
@@ -21,3 +32,86 @@ BEGIN
   RETURN opening - spent;
 END;
 $$;
+
+-- Full-text document for one budget_request: event names weigh most, then
+-- the request description and requester name, then event notes and
+-- breakdown line descriptions.
+CREATE OR REPLACE FUNCTION request_search_document(temp_request_id INT, temp_month DATE, temp_description TEXT, temp_requester_name TEXT)
+RETURNS TSVECTOR LANGUAGE sql STABLE AS $$
+  SELECT setweight(to_tsvector('english', COALESCE(ev.names, '')), 'A')
+      || setweight(to_tsvector('english', COALESCE(temp_description, '') || ' ' || COALESCE(temp_requester_name, '')), 'B')
+      || setweight(to_tsvector('english', COALESCE(ev.notes, '') || ' ' || COALESCE(ln.descriptions, '')), 'C')
+  FROM (
+    SELECT string_agg(name, ' ') AS names, string_agg(notes, ' ') AS notes
+    FROM requested_event
+    WHERE request_id = temp_request_id AND request_month = temp_month
+  ) ev,
+  (
+    SELECT string_agg(rbl.description, ' ') AS descriptions
+    FROM requested_break_down_line rbl
+    JOIN requested_event re
+      ON re.req_event_id = rbl.req_event_id AND re.request_month = rbl.request_month
+    WHERE re.request_id = temp_request_id AND re.request_month = temp_month
+  ) ln;
+$$;
+
+-- Recomputes the denormalized summary columns of one budget_request from its
+-- events, breakdown lines and approvals. Only writes when something changed,
+-- or once per transaction (updated_at < now()) so that any change to a child
+-- row bumps the request's version even when the summary stays the same.
+-- Pass the request's month when it is known so every lookup stays in one
+-- fiscal-year partition.
+CREATE OR REPLACE FUNCTION refresh_request_summary(temp_request_id INT, temp_month DATE DEFAULT NULL)
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+  IF temp_request_id IS NULL THEN
+    RETURN;
+  END IF;
+  IF temp_month IS NULL THEN
+    SELECT month INTO temp_month FROM budget_request WHERE request_id = temp_request_id;
+  END IF;
+
+  UPDATE budget_request br
+  SET
+    total_amount = s.total_amount,
+    event_count = s.event_count,
+    line_count = s.line_count,
+    last_decision = s.last_decision,
+    last_decided_at = s.last_decided_at,
+    search_document = s.search_document
+  FROM (
+    SELECT
+      ev.total_amount,
+      ev.event_count,
+      (SELECT COUNT(*)
+         FROM requested_break_down_line rbl
+         JOIN requested_event re
+           ON re.req_event_id = rbl.req_event_id AND re.request_month = rbl.request_month
+        WHERE re.request_id = temp_request_id AND re.request_month = temp_month) AS line_count,
+      a.decision AS last_decision,
+      a.decided_at AS last_decided_at,
+      (SELECT request_search_document(temp_request_id, temp_month, b.description, b.requester_name)
+         FROM budget_request b
+        WHERE b.request_id = temp_request_id AND b.month = temp_month) AS search_document
+    FROM (
+      SELECT COALESCE(SUM(total_amount), 0) AS total_amount, COUNT(*) AS event_count
+      FROM requested_event
+      WHERE request_id = temp_request_id AND request_month = temp_month
+    ) ev
+    LEFT JOIN LATERAL (
+      SELECT decision, decided_at
+      FROM approval
+      WHERE request_id = temp_request_id AND request_month = temp_month
+      ORDER BY decided_at DESC
+      LIMIT 1
+    ) a ON TRUE
+  ) s
+  WHERE br.request_id = temp_request_id
+    AND br.month = temp_month
+    AND (br.updated_at < now()
+         OR (br.total_amount, br.event_count, br.line_count, br.last_decision, br.last_decided_at)
+            IS DISTINCT FROM
+            (s.total_amount, s.event_count, s.line_count, s.last_decision, s.last_decided_at)
+         OR br.search_document IS DISTINCT FROM s.search_document);
+END;
+$$;
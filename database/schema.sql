@@ -2,6 +2,9 @@
 CREATE SCHEMA IF NOT EXISTS public;
 SET search_path = public;
 
+-- Trigram indexes for fuzzy name search (see /api/budget-requests/search/)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 CREATE TABLE city (
     city_id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
@@ -21,6 +24,9 @@ CREATE TABLE users (
     email VARCHAR(100) UNIQUE NOT NULL,
     whatsapp VARCHAR(50),
     role VARCHAR(50) CHECK (role IN ('ADMIN', 'TREASURER')),
+    -- Approval stages (approval_stage.approver_role) this admin works besides
+    -- the ones open to every ADMIN, e.g. 'FINANCE'
+    approver_role VARCHAR(50),
     password_hash TEXT NOT NULL,
     city_id INT REFERENCES city(city_id) ON DELETE SET NULL,
     is_active BOOLEAN DEFAULT TRUE,
@@ -28,42 +34,107 @@ CREATE TABLE users (
     last_login TIMESTAMP
 );
 
+-- budget_request, requested_event, requested_break_down_line and approval
+-- are range-partitioned by fiscal year on the request's month (children carry
+-- it as request_month), so queries that filter on month only touch the years
+-- they need and old years can be detached as a unit. Partitions are named
+-- <table>_p<YYYY>_<MM> after their first month; the block after the tables
+-- creates them and `manage.py manage_partitions` keeps them ahead of time.
+-- Primary and foreign keys include the partition key, as Postgres requires;
+-- moving a request to another fiscal year (editing its month) cascades to its
+-- children. Needs PostgreSQL 15 or later.
+
 CREATE TABLE budget_request (
-    request_id SERIAL PRIMARY KEY,
+    request_id SERIAL,
     city_id INT REFERENCES city(city_id) ON DELETE RESTRICT,
     requester_id INT REFERENCES users(user_id) ON DELETE SET NULL,
     recipient_id INT REFERENCES users(user_id) ON DELETE SET NULL,
     month DATE NOT NULL, --we can store the first day of each month
     description TEXT,
     status VARCHAR(10) CHECK (status IN ('PENDING', 'APPROVED', 'REJECTED')),
-    created_at TIMESTAMP DEFAULT now()
-);
+    created_at TIMESTAMP DEFAULT now(),
+    -- denormalized summary, kept in sync by triggers (see triggers.sql)
+    -- so list pages can read a request without joining users/city/events
+    requester_name VARCHAR(50),
+    city_name VARCHAR(100),
+    total_amount NUMERIC(10, 2) NOT NULL DEFAULT 0,
+    event_count INT NOT NULL DEFAULT 0,
+    line_count INT NOT NULL DEFAULT 0,
+    last_decision VARCHAR(20),
+    last_decided_at TIMESTAMP,
+    -- bumped by triggers whenever the request, its events, lines or
+    -- approvals change; the API uses them for ETag/Last-Modified
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    version INT NOT NULL DEFAULT 1,
+    -- weighted text of the request, its events and breakdown lines, kept
+    -- current by triggers (see request_search_document in functions.sql)
+    search_document TSVECTOR,
+    -- Soft delete: deleted requests keep their rows, hidden from every list,
+    -- report and lookup, and can be restored for SOFT_DELETE_GRACE_DAYS;
+    -- the purge_deleted_requests job then deletes them for good
+    deleted_at TIMESTAMP,
+    deleted_by INT REFERENCES users(user_id) ON DELETE SET NULL,
+    PRIMARY KEY (request_id, month)
+) PARTITION BY RANGE (month);
 
 CREATE TABLE requested_event (
-    req_event_id SERIAL PRIMARY KEY,
-    request_id INT REFERENCES budget_request(request_id),
+    req_event_id SERIAL,
+    request_id INT,
+    request_month DATE NOT NULL,
     name VARCHAR(100),
     event_date DATE,
     total_amount NUMERIC(10, 2),
-    notes TEXT
-);
+    notes TEXT,
+    PRIMARY KEY (req_event_id, request_month),
+    FOREIGN KEY (request_id, request_month)
+        REFERENCES budget_request(request_id, month) ON UPDATE CASCADE ON DELETE CASCADE
+) PARTITION BY RANGE (request_month);
 
 CREATE TABLE requested_break_down_line (
-    line_id SERIAL PRIMARY KEY,
-    req_event_id INT REFERENCES requested_event(req_event_id),
+    line_id SERIAL,
+    req_event_id INT,
+    request_month DATE NOT NULL,
     category_id INT REFERENCES category(category_id),
     description TEXT,
-    amount NUMERIC(10, 2)
-);
+    amount NUMERIC(10, 2),
+    PRIMARY KEY (line_id, request_month),
+    FOREIGN KEY (req_event_id, request_month)
+        REFERENCES requested_event(req_event_id, request_month) ON UPDATE CASCADE ON DELETE CASCADE
+) PARTITION BY RANGE (request_month);
 
 CREATE TABLE approval (
-    approval_id SERIAL PRIMARY KEY,
-    request_id INT REFERENCES budget_request(request_id),
+    approval_id SERIAL,
+    request_id INT,
+    request_month DATE NOT NULL,
     approver_id INT REFERENCES users(user_id),
     decision VARCHAR(20) CHECK (decision IN ('YES', 'NO-PLEASE RESEND')),
     note TEXT,
-    decided_at TIMESTAMP
-);
+    decided_at TIMESTAMP,
+    stage_no SMALLINT, -- approval_stage decided; NULL before stages existed
+    PRIMARY KEY (approval_id, request_month),
+    FOREIGN KEY (request_id, request_month)
+        REFERENCES budget_request(request_id, month) ON UPDATE CASCADE ON DELETE CASCADE
+) PARTITION BY RANGE (request_month);
+
+-- Fiscal years from April 2020 through the one after the current year.
+-- Keep the April start in step with FISCAL_YEAR_START_MONTH in settings.py.
+DO $$
+DECLARE
+  fy_start DATE := DATE '2020-04-01';
+  parent TEXT;
+BEGIN
+  WHILE fy_start <= (now() + INTERVAL '1 year')::date LOOP
+    FOREACH parent IN ARRAY ARRAY['budget_request', 'requested_event', 'requested_break_down_line', 'approval'] LOOP
+      EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        parent || to_char(fy_start, '"_p"YYYY"_"MM'), parent,
+        fy_start, (fy_start + INTERVAL '1 year')::date
+      );
+    END LOOP;
+    fy_start := (fy_start + INTERVAL '1 year')::date;
+  END LOOP;
+END;
+$$;
 
 CREATE TABLE event (
     event_id SERIAL PRIMARY KEY,
@@ -106,7 +177,8 @@ CREATE TABLE petty_cash_statement(
     cash_in_hand NUMERIC(10, 2) NOT NULL,
     city_id INT NOT NULL  REFERENCES city (city_id),
     prepared_by INT NOT NULL REFERENCES users(user_id),
-    approved_by INT NOT NULL REFERENCES users(user_id)
+    approved_by INT NOT NULL REFERENCES users(user_id),
+    closed_at TIMESTAMP -- set by the month-close job; the month is final after that
 );
 
 CREATE TABLE petty_cash_expense(
@@ -150,7 +222,173 @@ CREATE TABLE disbursement(
     ref_no INTEGER,
     reason VARCHAR(100),
     city_id INT NOT NULL REFERENCES city(city_id),
-    request_id INT NOT NULL REFERENCES budget_request(request_id)
+    -- No foreign key: budget_request's old fiscal years get detached, and a
+    -- key here would pin them (it would also need the request's month).
+    request_id INT NOT NULL
+);
+
+-- Append-only change feed for the React client's delta sync (see
+-- triggers.sql). No foreign key: rows for deleted requests are tombstones.
+-- txid orders the feed by commit visibility; seq orders within a transaction.
+CREATE TABLE budget_request_change(
+    seq BIGSERIAL PRIMARY KEY,
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    request_id INT NOT NULL,
+    requester_id INT,
+    city_id INT,
+    op CHAR(1) NOT NULL CHECK (op IN ('I', 'U', 'D')),
+    changed_at TIMESTAMP DEFAULT now() NOT NULL
+);
+
+-- Stored responses for API writes sent with an Idempotency-Key header (see
+-- backend/api/idempotency.py). A retry with the same key is answered from
+-- here instead of running the write again. Rows older than
+-- IDEMPOTENCY_KEY_TTL_HOURS are ignored and removed by
+-- `manage.py expire_idempotency_keys`.
+CREATE TABLE idempotency_key(
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    idem_key VARCHAR(255) NOT NULL,
+    fingerprint BYTEA NOT NULL,     -- sha256 of method, path and body
+    status_code SMALLINT,           -- NULL only while the first request runs
+    body BYTEA,
+    created_at TIMESTAMP DEFAULT now() NOT NULL,
+    PRIMARY KEY (user_id, idem_key)
+);
+
+-- Multi-level approval (see backend/api/approvals.py). A PENDING request
+-- waits in approval_queue at one stage at a time; approving it moves it to
+-- the next stage whose min_amount its total reaches, or approves it when
+-- none is left. Rejecting at any stage rejects it. approver_role 'ADMIN'
+-- opens a stage to every admin, any other value to the admins whose
+-- users.approver_role matches. The first stage applies to every request
+-- whatever its min_amount (totals are only known once lines are added).
+CREATE TABLE approval_stage(
+    stage_no SMALLINT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    approver_role VARCHAR(50) NOT NULL DEFAULT 'ADMIN',
+    min_amount NUMERIC(10, 2) NOT NULL DEFAULT 0
+);
+
+INSERT INTO approval_stage (stage_no, name, approver_role, min_amount) VALUES
+    (1, 'Review', 'ADMIN', 0);
+-- e.g. a second sign-off by national finance above $1,000:
+-- INSERT INTO approval_stage VALUES (2, 'National finance', 'FINANCE', 1000);
+
+-- The work queue: one row per PENDING request, kept by triggers.sql (added
+-- when a request becomes PENDING, removed when it stops being PENDING).
+-- Admins claim rows with FOR UPDATE SKIP LOCKED; a claim is a lease that
+-- lapses after APPROVAL_CLAIM_MINUTES.
+CREATE TABLE approval_queue(
+    request_id INT NOT NULL,
+    request_month DATE NOT NULL,
+    stage_no SMALLINT NOT NULL REFERENCES approval_stage(stage_no),
+    approver_role VARCHAR(50) NOT NULL, -- copied from the stage for the queue index
+    enqueued_at TIMESTAMP NOT NULL DEFAULT now(),
+    claimed_by INT REFERENCES users(user_id) ON DELETE SET NULL,
+    claimed_at TIMESTAMP,
+    PRIMARY KEY (request_id, request_month),
+    FOREIGN KEY (request_id, request_month)
+        REFERENCES budget_request(request_id, month) ON UPDATE CASCADE ON DELETE CASCADE
+);
+
+-- Audit trail (see triggers.sql and backend/api/audit.py): before/after
+-- images of every insert, update and delete of budget_request,
+-- requested_event, requested_break_down_line, approval and users. Rows are
+-- appended by statement-level triggers, one INSERT per statement however
+-- many rows it touched, and never updated. actor_id is the signed-in user
+-- the API set in app.user_id (NULL for commands and plain SQL). request_id
+-- ties event, line and approval rows to their request. Partitioned by month
+-- of changed_at; `manage.py manage_partitions` creates months ahead and can
+-- drop old ones. audit_log_default catches rows if it ever falls behind.
+CREATE TABLE audit_log(
+    audit_id BIGSERIAL,
+    changed_at TIMESTAMP NOT NULL DEFAULT now(),
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    actor_id INT,
+    entity VARCHAR(40) NOT NULL,        -- table name
+    entity_id TEXT NOT NULL,            -- its key, e.g. the request_id
+    request_id INT,
+    op CHAR(1) NOT NULL CHECK (op IN ('I', 'U', 'D')),
+    before JSONB,                       -- NULL for inserts
+    after JSONB,                        -- NULL for deletes
+    PRIMARY KEY (changed_at, audit_id)
+) PARTITION BY RANGE (changed_at);
+
+CREATE TABLE IF NOT EXISTS audit_log_default PARTITION OF audit_log DEFAULT;
+
+-- This month and the next three
+DO $$
+DECLARE
+  first_day DATE := date_trunc('month', now())::date;
+BEGIN
+  FOR i IN 0..3 LOOP
+    EXECUTE format(
+      'CREATE TABLE IF NOT EXISTS %I PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+      'audit_log' || to_char(first_day, '"_p"YYYY"_"MM'),
+      first_day, (first_day + INTERVAL '1 month')::date
+    );
+    first_day := (first_day + INTERVAL '1 month')::date;
+  END LOOP;
+END;
+$$;
+
+-- Notification outbox (see backend/api/notifications.py). Rows are written
+-- in the transaction that decides a request and sent later, in batches, by
+-- the dispatch_notifications job. request_id is informational only (no
+-- foreign key, so archiving a fiscal year leaves the history alone). A
+-- dispatcher leases the rows it sends (SENDING) rather than keeping them
+-- locked, so no transaction stays open while it talks to SMTP or WhatsApp.
+CREATE TABLE notification(
+    notification_id BIGSERIAL PRIMARY KEY,
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    channel VARCHAR(10) NOT NULL CHECK (channel IN ('EMAIL', 'WHATSAPP')),
+    recipient VARCHAR(100) NOT NULL,    -- email address or WhatsApp number when queued
+    subject VARCHAR(200) NOT NULL,
+    body TEXT NOT NULL,
+    request_id INT,
+    status VARCHAR(10) NOT NULL DEFAULT 'QUEUED'
+        CHECK (status IN ('QUEUED', 'SENDING', 'SENT', 'FAILED')),
+    attempts INT NOT NULL DEFAULT 0,
+    send_after TIMESTAMP NOT NULL DEFAULT now(),   -- pushed back after a failed attempt
+    locked_by VARCHAR(100),             -- dispatcher sending it (status SENDING)
+    locked_until TIMESTAMP,             -- its lease; requeued once this passes
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    sent_at TIMESTAMP,
+    last_error TEXT
+);
+
+-- Background jobs run by `manage.py run_jobs` (see backend/api/jobs.py).
+-- Workers claim due QUEUED rows with FOR UPDATE SKIP LOCKED. Periodic tasks
+-- get one row per scheduled slot; dedupe_key (task@slot) makes sure each slot
+-- is queued once however many runners are up. job_run keeps one row per
+-- attempt.
+CREATE TABLE job(
+    job_id BIGSERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    args JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(10) NOT NULL DEFAULT 'QUEUED'
+        CHECK (status IN ('QUEUED', 'RUNNING', 'DONE', 'FAILED')),
+    run_at TIMESTAMP NOT NULL DEFAULT now(),
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 3,
+    timeout_seconds INT NOT NULL DEFAULT 3600,
+    dedupe_key VARCHAR(200) UNIQUE,
+    locked_by VARCHAR(100),
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE job_run(
+    run_id BIGSERIAL PRIMARY KEY,
+    job_id BIGINT NOT NULL REFERENCES job(job_id) ON DELETE CASCADE,
+    attempt INT NOT NULL,
+    worker VARCHAR(100),
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL DEFAULT now(),
+    succeeded BOOLEAN NOT NULL,
+    output TEXT,
+    error TEXT
 );
 
 
@@ -160,7 +398,6 @@ CREATE TABLE disbursement(
 -- =========================================
 
 CREATE INDEX idx_budget_request_city_id ON budget_request(city_id);
-CREATE INDEX idx_budget_request_requester_id ON budget_request(requester_id);
 CREATE INDEX idx_budget_request_recipient_id ON budget_request(recipient_id);
 CREATE INDEX idx_requested_event_request_id ON requested_event(request_id);
 CREATE INDEX idx_requested_line_req_event_id ON requested_break_down_line(req_event_id);
@@ -170,6 +407,139 @@ CREATE INDEX idx_petty_cash_expense_pcs_id ON petty_cash_expense(pcs_id);
 CREATE INDEX idx_cash_collection_city_id ON cash_collection(city_id);
 CREATE INDEX idx_deposit_collection_id ON deposit(collection_id);
 CREATE INDEX idx_disbursement_request_id ON disbursement(request_id);
-CREATE INDEX IF NOT EXISTS idx_budget_request_status ON budget_request(status);
 CREATE INDEX IF NOT EXISTS idx_budget_request_month ON budget_request(month);
-CREATE INDEX IF NOT EXISTS idx_budget_request_city ON budget_request(city_id);
+
+-- Indexes shaped after the list/dashboard queries. The INCLUDE columns let the
+-- planner answer the narrow list columns (and the updated_at/version
+-- fingerprints behind conditional GETs) from the index alone.
+
+-- Every list and report reads live requests only (deleted_at IS NULL), so
+-- these are partial on it and soft-deleted rows cost them nothing.
+
+-- Admin queues: WHERE status = 'PENDING' / 'REJECTED' ORDER BY created_at
+CREATE INDEX IF NOT EXISTS idx_budget_request_pending_created
+    ON budget_request(created_at DESC)
+    INCLUDE (requester_id, city_id, month, total_amount, updated_at, version)
+    WHERE status = 'PENDING' AND deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_budget_request_rejected_created
+    ON budget_request(created_at DESC)
+    INCLUDE (requester_id, city_id, month, total_amount, updated_at, version)
+    WHERE status = 'REJECTED' AND deleted_at IS NULL;
+
+-- Approved totals: WHERE status = 'APPROVED' GROUP BY city/month
+CREATE INDEX IF NOT EXISTS idx_budget_request_approved_month
+    ON budget_request(month, city_name)
+    INCLUDE (total_amount)
+    WHERE status = 'APPROVED' AND deleted_at IS NULL;
+
+-- Recent activity: ORDER BY created_at DESC LIMIT n
+CREATE INDEX IF NOT EXISTS idx_budget_request_created
+    ON budget_request(created_at DESC)
+    WHERE deleted_at IS NULL;
+
+-- Treasurer lists and stats: WHERE requester_id = ? ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_budget_request_requester_created
+    ON budget_request(requester_id, created_at DESC)
+    INCLUDE (status, month, total_amount, updated_at, version)
+    WHERE deleted_at IS NULL;
+
+-- Purge: WHERE deleted_at < now() - grace ORDER BY deleted_at
+CREATE INDEX IF NOT EXISTS idx_budget_request_deleted
+    ON budget_request(deleted_at)
+    WHERE deleted_at IS NOT NULL;
+
+-- Change feed: WHERE (txid, seq) > cursor [AND requester_id = ?] ORDER BY txid, seq
+CREATE INDEX IF NOT EXISTS idx_budget_request_change_cursor
+    ON budget_request_change(txid, seq);
+CREATE INDEX IF NOT EXISTS idx_budget_request_change_requester_cursor
+    ON budget_request_change(requester_id, txid, seq);
+
+-- Expiry: DELETE ... WHERE created_at < now() - ttl
+CREATE INDEX IF NOT EXISTS idx_idempotency_key_created ON idempotency_key(created_at);
+
+-- Work queue: WHERE approver_role = ANY(?) ORDER BY enqueued_at ... SKIP LOCKED
+CREATE INDEX IF NOT EXISTS idx_approval_queue_role_enqueued
+    ON approval_queue(approver_role, enqueued_at);
+
+-- Audit queries: one entity's history, a request's history (with its
+-- events, lines and approvals), one user's actions; newest first
+CREATE INDEX IF NOT EXISTS idx_audit_log_entity
+    ON audit_log(entity, entity_id, changed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_request
+    ON audit_log(request_id, changed_at DESC) WHERE request_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_audit_log_actor
+    ON audit_log(actor_id, changed_at DESC) WHERE actor_id IS NOT NULL;
+
+-- Notification dispatch: due rows per channel, and rows sent in the last
+-- minute (rate limits)
+CREATE INDEX IF NOT EXISTS idx_notification_due
+    ON notification(channel, send_after) WHERE status = 'QUEUED';
+CREATE INDEX IF NOT EXISTS idx_notification_sent
+    ON notification(channel, sent_at) WHERE status = 'SENT';
+CREATE INDEX IF NOT EXISTS idx_notification_sending
+    ON notification(channel, locked_until) WHERE status = 'SENDING';
+CREATE INDEX IF NOT EXISTS idx_notification_user ON notification(user_id);
+
+-- Job runner: due jobs in run_at order, running jobs per task (concurrency
+-- limits), a job's attempts
+CREATE INDEX IF NOT EXISTS idx_job_due ON job(run_at) WHERE status = 'QUEUED';
+CREATE INDEX IF NOT EXISTS idx_job_running ON job(name) WHERE status = 'RUNNING';
+-- A task's latest success (jobs.last_success, read by every monthly report)
+CREATE INDEX IF NOT EXISTS idx_job_done ON job(name, finished_at DESC) WHERE status = 'DONE';
+CREATE INDEX IF NOT EXISTS idx_job_run_job ON job_run(job_id);
+
+-- One petty cash statement per city and month (the month-close job opens
+-- the next one)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_petty_cash_statement_city_month
+    ON petty_cash_statement(city_id, month);
+
+-- Search: search_document @@ query, plus fuzzy matches on requester and
+-- event names (name % ? / ? <% name)
+CREATE INDEX IF NOT EXISTS idx_budget_request_search
+    ON budget_request USING GIN (search_document);
+CREATE INDEX IF NOT EXISTS idx_users_name_trgm
+    ON users USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_requested_event_name_trgm
+    ON requested_event USING GIN (name gin_trgm_ops);
+
+-- Latest decision: WHERE request_id = ? ORDER BY decided_at DESC LIMIT 1
+CREATE INDEX IF NOT EXISTS idx_approval_request_decided
+    ON approval(request_id, decided_at DESC);
+
+-- Upgrading an existing database: the indexes below are superseded by the
+-- ones above (idx_budget_request_city duplicated idx_budget_request_city_id).
+DROP INDEX IF EXISTS idx_budget_request_city;
+DROP INDEX IF EXISTS idx_budget_request_status;
+DROP INDEX IF EXISTS idx_budget_request_requester_id;
+
+-- =========================================
+-- ARCHIVE (cold tier for closed fiscal years)
+-- =========================================
+-- `manage.py archive_fiscal_years` moves a closed fiscal year's partitions of
+-- the four partitioned tables here (detach, SET SCHEMA, attach: no rows are
+-- copied) and moves that year's disbursements, expenses and receipts into the
+-- plain tables below. archived_request is the lookup index detail pages use
+-- once a request has left the hot tables. Keep these tables' columns in step
+-- with their public counterparts.
+
+CREATE SCHEMA IF NOT EXISTS archive;
+
+CREATE TABLE archive.budget_request (LIKE budget_request) PARTITION BY RANGE (month);
+CREATE TABLE archive.requested_event (LIKE requested_event) PARTITION BY RANGE (request_month);
+CREATE TABLE archive.requested_break_down_line (LIKE requested_break_down_line) PARTITION BY RANGE (request_month);
+CREATE TABLE archive.approval (LIKE approval) PARTITION BY RANGE (request_month);
+CREATE TABLE archive.disbursement (LIKE disbursement);
+CREATE TABLE archive.expense (LIKE expense);
+CREATE TABLE archive.receipt (LIKE receipt);
+
+CREATE TABLE archive.archived_request (
+    request_id INT PRIMARY KEY,
+    month DATE NOT NULL,
+    requester_id INT,
+    city_id INT,
+    archived_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_archive_disbursement_request_id ON archive.disbursement(request_id);
+CREATE INDEX IF NOT EXISTS idx_archive_expense_event_id ON archive.expense(event_id);
+CREATE INDEX IF NOT EXISTS idx_archive_receipt_expense_id ON archive.receipt(expense_id);
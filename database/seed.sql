@@ -9,12 +9,25 @@ TRUNCATE TABLE
     expense,
     event,
     approval,
+    approval_queue,
+    budget_request_change,
+    audit_log,
+    idempotency_key,
+    notification,
     requested_break_down_line,
     requested_event,
     budget_request,
     users,
     category,
-    city
+    city,
+    archive.archived_request,
+    archive.receipt,
+    archive.expense,
+    archive.disbursement,
+    archive.approval,
+    archive.requested_break_down_line,
+    archive.requested_event,
+    archive.budget_request
 RESTART IDENTITY CASCADE;
 -- this is so serial uses a sequence of numbers, and it doesnt reset when we delete data
 
@@ -33,16 +46,16 @@ INSERT INTO users (name, email, whatsapp, role, password_hash, city_id) VALUES
 INSERT INTO budget_request (city_id, requester_id, recipient_id, month, description, status) VALUES
 (1, 1, 2,'2025-11-01','Paint Night','PENDING');
 
-INSERT INTO requested_event (request_id, name, event_date, total_amount) VALUES
-(1, 'Paint Night', '2025-11-08', 226.00);
+INSERT INTO requested_event (request_id, request_month, name, event_date, total_amount) VALUES
+(1, '2025-11-01', 'Paint Night', '2025-11-08', 226.00);
 
-INSERT INTO requested_break_down_line (req_event_id, category_id, description, amount) VALUES
-(1, 1, 'Paint and Canvases', 113.00),
-(1, 3, 'Food Vendor', 113.00);
+INSERT INTO requested_break_down_line (req_event_id, request_month, category_id, description, amount) VALUES
+(1, '2025-11-01', 1, 'Paint and Canvases', 113.00),
+(1, '2025-11-01', 3, 'Food Vendor', 113.00);
 
 -- Approval by Zainab (user_id = 2)
-INSERT INTO approval (request_id, approver_id, decision, note, decided_at) VALUES
-(1, 2, 'YES', 'All good', now());
+INSERT INTO approval (request_id, request_month, approver_id, decision, note, decided_at) VALUES
+(1, '2025-11-01', 2, 'YES', 'All good', now());
 
 INSERT INTO event (city_id, name, event_date, attendees_count, prepared_by) VALUES
 (1, 'Paint Night', '2025-11-08', 20, 1);
@@ -71,4 +84,7 @@ INSERT INTO deposit (collection_id, bank_ref, deposited_at, slip_path) VALUES
 INSERT INTO disbursement (city_id, amount, method, sent_at, ref_no, reason, request_id) VALUES
 (1, 226.00, 'E-Transfer', now(), '1234', 'Disbursement for Paint Night expenses', 1);
 
+-- Precomputed report totals (see views.sql)
+REFRESH MATERIALIZED VIEW mv_monthly_totals;
+
 COMMIT;
@@ -29,3 +29,400 @@ $$;
 CREATE TRIGGER trg_expense_after_insert
 AFTER INSERT ON expense
 FOR EACH ROW EXECUTE FUNCTION create_receipt_after_expense();
+
+-- =========================================
+-- budget_request summary columns
+-- =========================================
+-- List pages read requester_name, city_name, total_amount, event_count,
+-- line_count and last_decision straight off budget_request. These triggers
+-- keep them in sync with users, city, requested_event,
+-- requested_break_down_line and approval, keep updated_at/version current
+-- for conditional GETs, and keep search_document current for search.
+--
+-- To backfill an existing database after adding the columns:
+--   UPDATE budget_request SET requester_id = requester_id;
+--   SELECT refresh_request_summary(request_id, month) FROM budget_request;
+
+CREATE OR REPLACE FUNCTION fill_request_names_before_write()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  new.requester_name := (SELECT name FROM users WHERE user_id = new.requester_id);
+  new.city_name := (SELECT name FROM city WHERE city_id = new.city_id);
+  RETURN new;
+END;
+$$;
+
+CREATE TRIGGER trg_budget_request_before_write
+BEFORE INSERT OR UPDATE OF requester_id, city_id ON budget_request
+FOR EACH ROW EXECUTE FUNCTION fill_request_names_before_write();
+
+-- Runs after the trigger above (triggers fire in name order), so it sees the
+-- filled-in requester_name. Event and line text reaches the document through
+-- refresh_request_summary.
+CREATE OR REPLACE FUNCTION set_search_document_before_write()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  IF tg_op = 'INSERT'
+     OR old.description IS DISTINCT FROM new.description
+     OR old.requester_name IS DISTINCT FROM new.requester_name THEN
+    new.search_document := request_search_document(new.request_id, new.month, new.description, new.requester_name);
+  END IF;
+  RETURN new;
+END;
+$$;
+
+CREATE TRIGGER trg_budget_request_search_before_write
+BEFORE INSERT OR UPDATE ON budget_request
+FOR EACH ROW EXECUTE FUNCTION set_search_document_before_write();
+
+-- Every update of a request (including the summary refreshes below, which
+-- fire for any change to its events, lines or approvals) bumps its version.
+CREATE OR REPLACE FUNCTION bump_request_version_before_update()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  new.version := old.version + 1;
+  new.updated_at := now();
+  RETURN new;
+END;
+$$;
+
+CREATE TRIGGER trg_budget_request_before_update
+BEFORE UPDATE ON budget_request
+FOR EACH ROW EXECUTE FUNCTION bump_request_version_before_update();
+
+CREATE OR REPLACE FUNCTION refresh_summary_after_event_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  IF tg_op = 'DELETE' THEN
+    PERFORM refresh_request_summary(old.request_id, old.request_month);
+    RETURN old;
+  END IF;
+
+  PERFORM refresh_request_summary(new.request_id, new.request_month);
+  IF tg_op = 'UPDATE' AND (old.request_id, old.request_month) IS DISTINCT FROM (new.request_id, new.request_month) THEN
+    PERFORM refresh_request_summary(old.request_id, old.request_month);
+  END IF;
+  RETURN new;
+END;
+$$;
+
+CREATE TRIGGER trg_requested_event_after_change
+AFTER INSERT OR DELETE OR UPDATE ON requested_event
+FOR EACH ROW EXECUTE FUNCTION refresh_summary_after_event_change();
+
+CREATE OR REPLACE FUNCTION refresh_summary_after_line_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  IF tg_op IN ('UPDATE', 'DELETE') THEN
+    PERFORM refresh_request_summary(re.request_id, re.request_month)
+    FROM requested_event re
+    WHERE re.req_event_id = old.req_event_id AND re.request_month = old.request_month;
+  END IF;
+  IF tg_op IN ('INSERT', 'UPDATE') THEN
+    PERFORM refresh_request_summary(re.request_id, re.request_month)
+    FROM requested_event re
+    WHERE re.req_event_id = new.req_event_id AND re.request_month = new.request_month;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_requested_line_after_change
+AFTER INSERT OR DELETE OR UPDATE ON requested_break_down_line
+FOR EACH ROW EXECUTE FUNCTION refresh_summary_after_line_change();
+
+CREATE OR REPLACE FUNCTION refresh_summary_after_approval_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  IF tg_op IN ('UPDATE', 'DELETE') THEN
+    PERFORM refresh_request_summary(old.request_id, old.request_month);
+  END IF;
+  IF tg_op = 'INSERT'
+     OR (new.request_id, new.request_month) IS DISTINCT FROM (old.request_id, old.request_month) THEN
+    PERFORM refresh_request_summary(new.request_id, new.request_month);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_approval_after_change
+AFTER INSERT OR DELETE OR UPDATE ON approval
+FOR EACH ROW EXECUTE FUNCTION refresh_summary_after_approval_change();
+
+CREATE OR REPLACE FUNCTION sync_requester_name_after_update()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE budget_request SET requester_name = new.name WHERE requester_id = new.user_id;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_users_after_rename
+AFTER UPDATE OF name ON users
+FOR EACH ROW WHEN (old.name IS DISTINCT FROM new.name)
+EXECUTE FUNCTION sync_requester_name_after_update();
+
+CREATE OR REPLACE FUNCTION sync_city_name_after_update()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE budget_request SET city_name = new.name WHERE city_id = new.city_id;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_city_after_rename
+AFTER UPDATE OF name ON city
+FOR EACH ROW WHEN (old.name IS DISTINCT FROM new.name)
+EXECUTE FUNCTION sync_city_name_after_update();
+
+-- =========================================
+-- budget_request change feed
+-- =========================================
+-- One row per insert, update or delete of a budget_request. Changes to
+-- events, lines and approvals reach it through the summary refresh above,
+-- which updates the parent request. Read by /api/budget-requests/changes/.
+
+CREATE OR REPLACE FUNCTION log_request_change_after_write()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  IF tg_op = 'DELETE' THEN
+    INSERT INTO budget_request_change (request_id, requester_id, city_id, op)
+    VALUES (old.request_id, old.requester_id, old.city_id, 'D');
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO budget_request_change (request_id, requester_id, city_id, op)
+  VALUES (new.request_id, new.requester_id, new.city_id, left(tg_op, 1));
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_budget_request_after_write
+AFTER INSERT OR UPDATE OR DELETE ON budget_request
+FOR EACH ROW EXECUTE FUNCTION log_request_change_after_write();
+
+-- =========================================
+-- live dashboard notifications
+-- =========================================
+-- NOTIFY budget_events with a small JSON payload whenever a request is
+-- created, deleted, changes status, total, month or description, or gets a
+-- decision. Soft deletes and restores are reported as DELETE and INSERT;
+-- writes to soft-deleted rows (and their purge) aren't reported. Delivered
+-- on commit; the API fans them out to dashboards over server-sent events
+-- (see backend/api/live.py).
+
+CREATE OR REPLACE FUNCTION notify_request_event_after_write()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+  op TEXT := tg_op;
+BEGIN
+  IF tg_op IN ('UPDATE', 'DELETE') AND old.deleted_at IS NOT NULL THEN
+    IF tg_op = 'DELETE' OR new.deleted_at IS NOT NULL THEN
+      RETURN NULL;
+    END IF;
+    op := 'INSERT';   -- restored
+  ELSIF tg_op = 'UPDATE' AND new.deleted_at IS NOT NULL THEN
+    op := 'DELETE';   -- soft-deleted
+  ELSIF tg_op = 'UPDATE'
+     AND (old.status, old.total_amount, old.month, old.description)
+         IS NOT DISTINCT FROM
+         (new.status, new.total_amount, new.month, new.description) THEN
+    RETURN NULL;
+  END IF;
+
+  PERFORM pg_notify('budget_events', json_build_object(
+    'table', 'budget_request',
+    'op', op,
+    'request_id', COALESCE(new.request_id, old.request_id),
+    'requester_id', COALESCE(new.requester_id, old.requester_id),
+    'city_id', COALESCE(new.city_id, old.city_id),
+    'status', CASE WHEN op = 'DELETE' THEN NULL ELSE new.status END,
+    'old_status', CASE WHEN op = 'INSERT' THEN NULL ELSE old.status END,
+    'total_amount', CASE WHEN op = 'DELETE' THEN NULL ELSE new.total_amount END,
+    'old_total_amount', CASE WHEN op = 'INSERT' THEN NULL ELSE old.total_amount END
+  )::text);
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_budget_request_notify
+AFTER INSERT OR UPDATE OR DELETE ON budget_request
+FOR EACH ROW EXECUTE FUNCTION notify_request_event_after_write();
+
+CREATE OR REPLACE FUNCTION notify_approval_event_after_insert()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM pg_notify('budget_events', json_build_object(
+    'table', 'approval',
+    'op', tg_op,
+    'request_id', new.request_id,
+    'requester_id', br.requester_id,
+    'city_id', br.city_id,
+    'decision', new.decision,
+    'decided_at', new.decided_at
+  )::text)
+  FROM budget_request br
+  WHERE br.request_id = new.request_id AND br.month = new.request_month;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_approval_notify
+AFTER INSERT ON approval
+FOR EACH ROW EXECUTE FUNCTION notify_approval_event_after_insert();
+
+-- =========================================
+-- approval work queue
+-- =========================================
+-- Queue a request at the first approval stage when it becomes PENDING (or a
+-- PENDING request is restored) and take it off the queue when it stops
+-- being PENDING (approved, rejected) or is soft-deleted.
+-- Moving between stages and restarting an edited request at the first
+-- stage are done by backend/api/approvals.py.
+
+CREATE OR REPLACE FUNCTION sync_approval_queue_after_write()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+  was_waiting BOOLEAN := tg_op = 'UPDATE' AND old.status = 'PENDING' AND old.deleted_at IS NULL;
+  is_waiting BOOLEAN := new.status = 'PENDING' AND new.deleted_at IS NULL;
+BEGIN
+  IF is_waiting AND NOT was_waiting THEN
+    INSERT INTO approval_queue (request_id, request_month, stage_no, approver_role)
+    SELECT new.request_id, new.month, s.stage_no, s.approver_role
+    FROM approval_stage s
+    ORDER BY s.stage_no
+    LIMIT 1
+    ON CONFLICT (request_id, request_month) DO NOTHING;
+  ELSIF was_waiting AND NOT is_waiting THEN
+    DELETE FROM approval_queue
+    WHERE request_id = new.request_id AND request_month = new.month;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_budget_request_queue
+AFTER INSERT OR UPDATE OF status, deleted_at ON budget_request
+FOR EACH ROW EXECUTE FUNCTION sync_approval_queue_after_write();
+
+-- =========================================
+-- audit trail
+-- =========================================
+-- Statement-level triggers append the before/after images of every audited
+-- row to audit_log with one INSERT ... SELECT over the statement's
+-- transition tables, so a statement touching many rows costs one insert,
+-- not one per row. Trigger arguments: the table's key column, then columns
+-- left out of the images (secrets, and the derived summary columns whose
+-- changes are audited on the child rows that caused them). An update that
+-- only changed left-out columns is not logged.
+
+CREATE OR REPLACE FUNCTION audit_actor()
+RETURNS INT LANGUAGE sql STABLE AS $$
+  SELECT NULLIF(current_setting('app.user_id', true), '')::int
+$$;
+
+-- request_id of an audited row's image; lines reach it through their event
+CREATE OR REPLACE FUNCTION audit_request_id(entity TEXT, image JSONB)
+RETURNS INT LANGUAGE sql STABLE AS $$
+  SELECT CASE entity
+    WHEN 'users' THEN NULL
+    WHEN 'requested_break_down_line' THEN (
+      SELECT re.request_id FROM requested_event re
+      WHERE re.req_event_id = (image ->> 'req_event_id')::int
+        AND re.request_month = (image ->> 'request_month')::date)
+    ELSE (image ->> 'request_id')::int
+  END
+$$;
+
+CREATE OR REPLACE FUNCTION audit_after_insert()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO audit_log (actor_id, entity, entity_id, request_id, op, after)
+  SELECT audit_actor(), tg_table_name, n.image ->> tg_argv[0],
+         audit_request_id(tg_table_name, n.image), 'I', n.image
+  FROM (SELECT to_jsonb(r) - tg_argv[1:] AS image FROM new_rows r) n;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION audit_after_update()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO audit_log (actor_id, entity, entity_id, request_id, op, before, after)
+  SELECT audit_actor(), tg_table_name, n.image ->> tg_argv[0],
+         audit_request_id(tg_table_name, n.image), 'U', o.image, n.image
+  FROM (SELECT to_jsonb(r) - tg_argv[1:] AS image FROM new_rows r) n
+  JOIN (SELECT to_jsonb(r) - tg_argv[1:] AS image FROM old_rows r) o
+    ON o.image -> tg_argv[0] = n.image -> tg_argv[0]
+  WHERE o.image IS DISTINCT FROM n.image;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION audit_after_delete()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO audit_log (actor_id, entity, entity_id, request_id, op, before)
+  SELECT audit_actor(), tg_table_name, o.image ->> tg_argv[0],
+         audit_request_id(tg_table_name, o.image), 'D', o.image
+  FROM (SELECT to_jsonb(r) - tg_argv[1:] AS image FROM old_rows r) o;
+  RETURN NULL;
+END;
+$$;
+
+-- Transition tables allow one event per trigger, hence three per table
+CREATE TRIGGER trg_budget_request_audit_insert
+AFTER INSERT ON budget_request REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_insert(
+  'request_id', 'requester_name', 'city_name', 'total_amount', 'event_count', 'line_count',
+  'last_decision', 'last_decided_at', 'updated_at', 'version', 'search_document');
+CREATE TRIGGER trg_budget_request_audit_update
+AFTER UPDATE ON budget_request REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_update(
+  'request_id', 'requester_name', 'city_name', 'total_amount', 'event_count', 'line_count',
+  'last_decision', 'last_decided_at', 'updated_at', 'version', 'search_document');
+CREATE TRIGGER trg_budget_request_audit_delete
+AFTER DELETE ON budget_request REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_delete(
+  'request_id', 'requester_name', 'city_name', 'total_amount', 'event_count', 'line_count',
+  'last_decision', 'last_decided_at', 'updated_at', 'version', 'search_document');
+
+CREATE TRIGGER trg_requested_event_audit_insert
+AFTER INSERT ON requested_event REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_insert('req_event_id');
+CREATE TRIGGER trg_requested_event_audit_update
+AFTER UPDATE ON requested_event REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_update('req_event_id');
+CREATE TRIGGER trg_requested_event_audit_delete
+AFTER DELETE ON requested_event REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_delete('req_event_id');
+
+CREATE TRIGGER trg_requested_line_audit_insert
+AFTER INSERT ON requested_break_down_line REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_insert('line_id');
+CREATE TRIGGER trg_requested_line_audit_update
+AFTER UPDATE ON requested_break_down_line REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_update('line_id');
+CREATE TRIGGER trg_requested_line_audit_delete
+AFTER DELETE ON requested_break_down_line REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_delete('line_id');
+
+CREATE TRIGGER trg_approval_audit_insert
+AFTER INSERT ON approval REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_insert('approval_id');
+CREATE TRIGGER trg_approval_audit_update
+AFTER UPDATE ON approval REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_update('approval_id');
+CREATE TRIGGER trg_approval_audit_delete
+AFTER DELETE ON approval REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_delete('approval_id');
+
+CREATE TRIGGER trg_users_audit_insert
+AFTER INSERT ON users REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_insert('user_id', 'password_hash');
+CREATE TRIGGER trg_users_audit_update
+AFTER UPDATE ON users REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_update('user_id', 'password_hash', 'last_login');
+CREATE TRIGGER trg_users_audit_delete
+AFTER DELETE ON users REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_after_delete('user_id', 'password_hash');
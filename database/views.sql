@@ -5,8 +5,9 @@ SELECT
   TO_CHAR(br.month, 'YYYY-MM') AS month,
   COALESCE(SUM(re.total_amount),0) AS total_requested
 FROM budget_request br
-JOIN requested_event re ON re.request_id = br.request_id
+JOIN requested_event re ON re.request_id = br.request_id AND re.request_month = br.month
 JOIN city c ON c.city_id = br.city_id
+WHERE br.deleted_at IS NULL
 GROUP BY c.city_id, c.name, TO_CHAR(br.month, 'YYYY-MM');
 
 CREATE OR REPLACE VIEW vw_event_expenses AS
@@ -18,3 +19,16 @@ SELECT
 FROM expense e
 JOIN event ev ON ev.event_id = e.event_id
 GROUP BY ev.event_id, ev.name, e.vendor;
+
+-- Approved totals per city and month, precomputed for the monthly report.
+-- Refreshed (CONCURRENTLY, so reports keep reading meanwhile) by the
+-- refresh_monthly_totals job; see backend/api/tasks.py.
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_monthly_totals AS
+SELECT city_name,
+       month,
+       COALESCE(SUM(total_amount), 0) AS total_amount
+FROM budget_request
+WHERE status = 'APPROVED' AND deleted_at IS NULL
+GROUP BY month, city_name;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_monthly_totals ON mv_monthly_totals(month, city_name);
@@ -53,6 +53,27 @@ async function handleResponse(res) {
   throw err;
 }
 
+// Writes that are safe to retry: the same Idempotency-Key is sent on every
+// attempt, so if a response was lost the server answers a retry with the
+// stored result instead of creating or deciding the request twice.
+function newIdempotencyKey() {
+  if (typeof crypto !== 'undefined' && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function fetchIdempotent(url, options, retries = 2) {
+  const headers = { ...options.headers, 'Idempotency-Key': newIdempotencyKey() };
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await fetch(url, { ...options, headers });
+    } catch (err) {
+      // fetch only rejects on network errors; anything else is a real response
+      if (attempt >= retries) throw err;
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+  }
+}
+
 // ---------- Auth API ----------
 
 export async function login(email, password) {
@@ -135,8 +156,38 @@ export async function getBudgetRequests() {
   return handleResponse(res);
 }
 
+// Change feed: requests created/updated/deleted since `cursor`.
+// Call without a cursor to get the current one before loading the full list.
+export async function getBudgetRequestChanges(cursor) {
+  const query = cursor ? `?since=${encodeURIComponent(cursor)}` : '';
+  const res = await fetch(`${API_BASE}/api/budget-requests/changes/${query}`, {
+    method: 'GET',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+  });
+  return handleResponse(res);
+}
+
+// Merge a change feed page into a list of request rows (newest first)
+export function applyBudgetRequestChanges(rows, changes) {
+  const gone = new Set([...changes.deleted, ...changes.upserts.map((r) => r.request_id)]);
+  return [...changes.upserts, ...rows.filter((r) => !gone.has(r.request_id))]
+    .sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+}
+
+// Ranked search over request, event and breakdown line text and requester names
+export async function searchBudgetRequests(q, page = 1) {
+  const query = `?q=${encodeURIComponent(q)}&page=${encodeURIComponent(page)}`;
+  const res = await fetch(`${API_BASE}/api/budget-requests/search/${query}`, {
+    method: 'GET',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+  });
+  return handleResponse(res);
+}
+
 export async function createBudgetRequest(data) {
-  const res = await fetch(`${API_BASE}/api/budget-requests/`, {
+  const res = await fetchIdempotent(`${API_BASE}/api/budget-requests/`, {
     method: 'POST',
     credentials: 'include',
     headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
@@ -145,30 +196,32 @@ export async function createBudgetRequest(data) {
   return handleResponse(res);
 }
 
-export async function approveBudgetRequest(id, comment = '') {
+// Pass the version the request was loaded at to get a 409 instead of
+// deciding a request someone else changed meanwhile
+export async function approveBudgetRequest(id, comment = '', version = undefined) {
   if (id === undefined || id === null) throw new Error('id is required');
-  const res = await fetch(`${API_BASE}/api/budget-requests/${encodeURIComponent(id)}/approve/`, {
+  const res = await fetchIdempotent(`${API_BASE}/api/budget-requests/${encodeURIComponent(id)}/approve/`, {
     method: 'POST',
     credentials: 'include',
     headers: { 
       'Content-Type': 'application/json',
       'Accept': 'application/json' 
     },
-    body: JSON.stringify({ comment }),
+    body: JSON.stringify({ comment, version }),
   });
   return handleResponse(res);
 }
 
-export async function rejectBudgetRequest(id, comment = '') {
+export async function rejectBudgetRequest(id, comment = '', version = undefined) {
   if (id === undefined || id === null) throw new Error('id is required');
-  const res = await fetch(`${API_BASE}/api/budget-requests/${encodeURIComponent(id)}/reject/`, {
+  const res = await fetchIdempotent(`${API_BASE}/api/budget-requests/${encodeURIComponent(id)}/reject/`, {
     method: 'POST',
     credentials: 'include',
     headers: { 
       'Content-Type': 'application/json',
       'Accept': 'application/json' 
     },
-    body: JSON.stringify({ comment }),
+    body: JSON.stringify({ comment, version }),
   });
   return handleResponse(res);
 }
@@ -183,6 +236,17 @@ export async function deleteBudgetRequest(id) {
   return handleResponse(res);
 }
 
+// Undo a delete; the server keeps deleted requests for a few days
+export async function restoreBudgetRequest(id) {
+  if (id === undefined || id === null) throw new Error('id is required');
+  const res = await fetch(`${API_BASE}/api/budget-requests/${encodeURIComponent(id)}/restore/`, {
+    method: 'POST',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+  });
+  return handleResponse(res);
+}
+
 export async function getBudgetRequestDetail(id) {
   if (id === undefined || id === null) throw new Error('id is required');
   const res = await fetch(`${API_BASE}/api/budget-requests/${encodeURIComponent(id)}/`, {
@@ -215,6 +279,23 @@ export async function getAdminDashboard() {
   return handleResponse(res);
 }
 
+// Server-sent events for live dashboards. `handlers` maps event names
+// ('budget_request', 'approval', 'resync') to callbacks taking the parsed
+// payload. Returns a function that closes the stream.
+export function subscribeLiveEvents(handlers) {
+  const source = new EventSource(`${API_BASE}/api/live/`, { withCredentials: true });
+  Object.entries(handlers).forEach(([name, handler]) => {
+    source.addEventListener(name, (e) => handler(JSON.parse(e.data)));
+  });
+  // EventSource reconnects by itself; anything sent meanwhile was missed
+  let opened = false;
+  source.addEventListener('open', () => {
+    if (opened && handlers.resync) handlers.resync({ type: 'resync' });
+    opened = true;
+  });
+  return () => source.close();
+}
+
 export async function getTreasurerDashboard() {
   const res = await fetch(`${API_BASE}/api/treasurer/dashboard/`, {
     method: 'GET',
@@ -233,6 +314,51 @@ export async function getPendingRequests() {
   return handleResponse(res);
 }
 
+// Approval work queue: claim the oldest request waiting at a stage you
+// approve ({ request: null } when nothing is waiting), hand it back, and
+// per-stage queue depth
+export async function claimNextRequest() {
+  const res = await fetch(`${API_BASE}/api/admin/queue/claim/`, {
+    method: 'POST',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+  });
+  return handleResponse(res);
+}
+
+export async function releaseRequest(id) {
+  if (id === undefined || id === null) throw new Error('id is required');
+  const res = await fetch(`${API_BASE}/api/admin/queue/${encodeURIComponent(id)}/release/`, {
+    method: 'POST',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+  });
+  return handleResponse(res);
+}
+
+// Audit trail, newest first. params: entity, entity_id, request_id,
+// actor_id, from, to, limit, cursor (from the previous page).
+export async function getAuditLog(params = {}) {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, v]) => v !== undefined && v !== null && v !== '')
+  ).toString();
+  const res = await fetch(`${API_BASE}/api/admin/audit/${query ? `?${query}` : ''}`, {
+    method: 'GET',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+  });
+  return handleResponse(res);
+}
+
+export async function getApprovalQueueStats() {
+  const res = await fetch(`${API_BASE}/api/admin/queue/stats/`, {
+    method: 'GET',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+  });
+  return handleResponse(res);
+}
+
 export async function getMonthlyReport() {
   const res = await fetch(`${API_BASE}/api/admin/reports/monthly/`, {
     method: 'GET',
@@ -262,3 +388,26 @@ export async function createUser(userData) {
   });
   return handleResponse(res);
 }
+
+// Create many users from a CSV (or .json) file. Resolves to
+// { created: [...], errors: [{ row, email, detail }] } even when every row
+// was rejected; dryRun only validates.
+export async function importUsers(file, dryRun = false) {
+  const form = new FormData();
+  form.append('file', file);
+  // Safe to retry: the server replays the first import's response for the key
+  const res = await fetchIdempotent(`${API_BASE}/api/admin/users/import/${dryRun ? '?dry_run=1' : ''}`, {
+    method: 'POST',
+    credentials: 'include',
+    headers: { 'Accept': 'application/json' },
+    body: form,
+  });
+  if (res.status === 400) {
+    const data = await res.json().catch(() => null);
+    if (data && Array.isArray(data.errors)) return data;
+    const err = new Error((data && data.detail) || 'Import failed');
+    err.status = res.status;
+    throw err;
+  }
+  return handleResponse(res);
+}
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getCurrentUser, getAdminDashboard } from '../lib/api';
+import { getCurrentUser, getAdminDashboard, subscribeLiveEvents } from '../lib/api';
 import './Dashboard.css';
 
 function AdminDashboard() {
@@ -14,6 +14,34 @@ function AdminDashboard() {
   const navigate = useNavigate();
 
   useEffect(() => {
+    let unsubscribe = null;
+
+    const loadStats = async () => {
+      const dashboardData = await getAdminDashboard();
+      if (dashboardData.stats) {
+        setStats({
+          totalUsers: dashboardData.stats.total_users || 0,
+          totalRequests: dashboardData.stats.total || 0,
+          pendingRequests: dashboardData.stats.pending || 0,
+          approvedAmount: Number(dashboardData.stats.approved_amount || 0)
+        });
+      }
+    };
+
+    // Apply one budget_request event to the counters instead of refetching
+    const applyEvent = (event) => {
+      const wasPending = event.old_status === 'PENDING' ? 1 : 0;
+      const isPending = event.status === 'PENDING' ? 1 : 0;
+      const oldApproved = event.old_status === 'APPROVED' ? Number(event.old_total_amount || 0) : 0;
+      const newApproved = event.status === 'APPROVED' ? Number(event.total_amount || 0) : 0;
+      setStats((s) => ({
+        ...s,
+        totalRequests: s.totalRequests + (event.op === 'INSERT' ? 1 : event.op === 'DELETE' ? -1 : 0),
+        pendingRequests: s.pendingRequests + isPending - wasPending,
+        approvedAmount: Math.round((s.approvedAmount + newApproved - oldApproved) * 100) / 100
+      }));
+    };
+
     const checkAuth = async () => {
       try {
         const currentUser = await getCurrentUser();
@@ -23,16 +51,12 @@ function AdminDashboard() {
         }
         setUser(currentUser);
         
-        // Fetch admin dashboard stats
-        const dashboardData = await getAdminDashboard();
-        if (dashboardData.stats) {
-          setStats({
-            totalUsers: dashboardData.stats.total_users || 0,
-            totalRequests: dashboardData.stats.total || 0,
-            pendingRequests: dashboardData.stats.pending || 0,
-            approvedAmount: dashboardData.stats.approved_amount || 0
-          });
-        }
+        // Subscribe before loading so no change falls between the two
+        unsubscribe = subscribeLiveEvents({
+          budget_request: applyEvent,
+          resync: () => loadStats().catch((err) => console.error('Dashboard error:', err))
+        });
+        await loadStats();
       } catch (err) {
         console.error('Dashboard error:', err);
         navigate('/login');
@@ -40,6 +64,9 @@ function AdminDashboard() {
     };
     
     checkAuth();
+    return () => {
+      if (unsubscribe) unsubscribe();
+    };
   }, [navigate]);
 
   if (!user) {
@@ -198,7 +198,7 @@ function AdminPanel() {
                   <tr key={idx}>
                     <td className="px-4 py-2 text-sm">{report.city}</td>
                     <td className="px-4 py-2 text-sm">{report.month}</td>
-                    <td className="px-4 py-2 text-sm font-medium">${report.total_amount.toFixed(2)}</td>
+                    <td className="px-4 py-2 text-sm font-medium">${Number(report.total_amount).toFixed(2)}</td>
                   </tr>
                 ))
               )}
@@ -23,6 +23,8 @@ export default function BudgetEditPage() {
   const [eventDate, setEventDate] = useState('');
   const [eventNotes, setEventNotes] = useState('');
   const [adminComment, setAdminComment] = useState('');
+  // Version the form was loaded at; the server answers 409 if it changed since
+  const [version, setVersion] = useState(null);
   const [breakdownLines, setBreakdownLines] = useState([
     { category_id: '', description: '', amount: '' }
   ]);
@@ -50,6 +52,7 @@ export default function BudgetEditPage() {
         setEventDate(detail.event?.event_date || '');
         setEventNotes(detail.event?.notes || '');
         setAdminComment(detail.admin_comment || '');
+        setVersion(detail.version ?? null);
         
         if (detail.breakdown_lines && detail.breakdown_lines.length > 0) {
           const populated = detail.breakdown_lines.map(line => {
@@ -107,7 +110,7 @@ export default function BudgetEditPage() {
         .map(line => ({
           category_id: line.category_id || null,
           description: line.description || '',
-          amount: parseFloat(line.amount) || 0
+          amount: String(line.amount).trim() || '0'
         }));
 
       if (validBreakdown.length === 0) {
@@ -135,7 +138,8 @@ export default function BudgetEditPage() {
           event_date: eventDate,
           notes: eventNotes
         },
-        breakdown: validBreakdown
+        breakdown: validBreakdown,
+        version
       });
       
       console.log('Update response:', response);
@@ -144,7 +148,9 @@ export default function BudgetEditPage() {
       setShowSuccessModal(true);
     } catch (err) {
       console.error('Update error:', err);
-      setError(err.message || String(err));
+      setError(err.status === 409
+        ? 'This request was changed by someone else since you opened it. Reload the page and try again.'
+        : (err.message || String(err)));
       setSubmitting(false);
     }
   }
@@ -1,12 +1,13 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { Link, useNavigate } from "react-router-dom";
-import { getBudgetRequests, approveBudgetRequest, rejectBudgetRequest, deleteBudgetRequest, getCurrentUser } from "../lib/api";
+import { getBudgetRequests, getBudgetRequestChanges, applyBudgetRequestChanges, searchBudgetRequests, approveBudgetRequest, rejectBudgetRequest, deleteBudgetRequest, restoreBudgetRequest, getCurrentUser } from "../lib/api";
 import './BudgetListPage.css';
 
 // BudgetListPage: loads budget requests and shows approve/reject for admins, edit/delete for treasurers
 
 export default function BudgetListPage() {
   const [rows, setRows] = useState([]);
+  const cursorRef = useRef(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [processingId, setProcessingId] = useState(null);
@@ -14,6 +15,9 @@ export default function BudgetListPage() {
   const [showCommentModal, setShowCommentModal] = useState(false);
   const [commentAction, setCommentAction] = useState(null); // { type: 'approve'|'reject', requestId: number }
   const [comment, setComment] = useState('');
+  const [query, setQuery] = useState('');
+  const [search, setSearch] = useState(null); // { q, results, page, has_more } while searching
+  const [deleted, setDeleted] = useState(null); // { id, days } of the last delete, for Undo
   const navigate = useNavigate();
 
   async function loadData() {
@@ -23,7 +27,10 @@ export default function BudgetListPage() {
       const currentUser = await getCurrentUser();
       setUser(currentUser);
       
+      // Take the cursor first: changes racing the full load are replayed by syncChanges
+      const { cursor } = await getBudgetRequestChanges();
       const data = await getBudgetRequests();
+      cursorRef.current = cursor;
       setRows(Array.isArray(data) ? data : []);
     } catch (err) {
       setError(err.message || String(err));
@@ -32,6 +39,34 @@ export default function BudgetListPage() {
     }
   }
 
+  // Fetch only what changed since the last load/sync
+  async function syncChanges() {
+    if (!cursorRef.current) return loadData();
+    let changes;
+    do {
+      changes = await getBudgetRequestChanges(cursorRef.current);
+      cursorRef.current = changes.cursor;
+      const page = changes;
+      setRows((current) => applyBudgetRequestChanges(current, page));
+    } while (changes.has_more);
+    if (search) await runSearch(search.q, search.page);
+  }
+
+  async function runSearch(q, page = 1) {
+    if (!q.trim()) return clearSearch();
+    try {
+      const data = await searchBudgetRequests(q.trim(), page);
+      setSearch({ q, results: data.results, page: data.page, has_more: data.has_more });
+    } catch (err) {
+      setError(err.message || String(err));
+    }
+  }
+
+  function clearSearch() {
+    setQuery('');
+    setSearch(null);
+  }
+
   useEffect(() => {
     loadData();
     // eslint-disable-next-line react-hooks/exhaustive-deps
@@ -55,7 +90,7 @@ export default function BudgetListPage() {
     try {
       await approveBudgetRequest(commentAction.requestId, comment);
       closeCommentModal();
-      await loadData();
+      await syncChanges();
     } catch (err) {
       setError(err.message || String(err));
     } finally {
@@ -76,7 +111,7 @@ export default function BudgetListPage() {
     try {
       await rejectBudgetRequest(commentAction.requestId, comment);
       closeCommentModal();
-      await loadData();
+      await syncChanges();
     } catch (err) {
       setError(err.message || String(err));
     } finally {
@@ -89,8 +124,23 @@ export default function BudgetListPage() {
     
     setProcessingId(id);
     try {
-      await deleteBudgetRequest(id);
-      await loadData();
+      const res = await deleteBudgetRequest(id);
+      setDeleted({ id, days: res.restorable_days });
+      await syncChanges();
+    } catch (err) {
+      setError(err.message || String(err));
+    } finally {
+      setProcessingId(null);
+    }
+  }
+
+  async function handleUndoDelete() {
+    if (!deleted) return;
+    setProcessingId(deleted.id);
+    try {
+      await restoreBudgetRequest(deleted.id);
+      setDeleted(null);
+      await syncChanges();
     } catch (err) {
       setError(err.message || String(err));
     } finally {
@@ -103,6 +153,7 @@ export default function BudgetListPage() {
 
   const role = user?.role;
   const userId = user?.user_id;
+  const shown = search ? search.results : rows;
 
   return (
     <div className="bl-page">
@@ -120,11 +171,30 @@ export default function BudgetListPage() {
         </div>
       </div>
 
-      {rows.length === 0 ? (
-        <div className="empty">No budget requests yet.</div>
+      <form className="bl-search" onSubmit={(e) => { e.preventDefault(); runSearch(query); }}>
+        <input
+          type="search"
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+          placeholder="Search requests, events, line items or requesters…"
+        />
+        <button type="submit" className="btn">Search</button>
+        {search && <button type="button" className="btn ghost" onClick={clearSearch}>Clear</button>}
+      </form>
+
+      {deleted && (
+        <div className="bl-undo">
+          <span className="muted">Request #{deleted.id} deleted. It can be restored for {deleted.days} days.</span>
+          <button className="btn" onClick={handleUndoDelete} disabled={processingId === deleted.id}>Undo</button>
+          <button className="btn ghost" onClick={() => setDeleted(null)}>Dismiss</button>
+        </div>
+      )}
+
+      {shown.length === 0 ? (
+        <div className="empty">{search ? `No requests match "${search.q}".` : 'No budget requests yet.'}</div>
       ) : (
         <div className="bl-grid">
-          {rows.map((r) => (
+          {shown.map((r) => (
             <article key={r.request_id} className="bl-card">
               <header className="bl-card-header">
                 <div className="bl-month">{r.month || '—'}</div>
@@ -164,6 +234,14 @@ export default function BudgetListPage() {
         </div>
       )}
 
+      {search && (search.page > 1 || search.has_more) && (
+        <div className="bl-pager">
+          <button className="btn" onClick={() => runSearch(search.q, search.page - 1)} disabled={search.page <= 1}>← Previous</button>
+          <span className="muted">Page {search.page}</span>
+          <button className="btn" onClick={() => runSearch(search.q, search.page + 1)} disabled={!search.has_more}>Next →</button>
+        </div>
+      )}
+
       {/* Comment Modal */}
       {showCommentModal && (
         <div className="modal-overlay" onClick={closeCommentModal}>
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getCities, createUser } from '../lib/api';
+import { getCities, createUser, importUsers } from '../lib/api';
 import './CreateUserPage.css';
 
 export default function CreateUserPage() {
@@ -20,6 +20,10 @@ export default function CreateUserPage() {
     city_id: '',
     password: '',
   });
+  const [importFile, setImportFile] = useState(null);
+  const [importing, setImporting] = useState(false);
+  const [importResult, setImportResult] = useState(null);
+  const [importError, setImportError] = useState(null);
 
   useEffect(() => {
     async function loadCities() {
@@ -101,6 +105,25 @@ export default function CreateUserPage() {
     }
   }
 
+  async function handleImport(e, dryRun) {
+    e.preventDefault();
+    if (!importFile) {
+      setImportError('Choose a CSV file first');
+      return;
+    }
+    setImporting(true);
+    setImportError(null);
+    setImportResult(null);
+    try {
+      const result = await importUsers(importFile, dryRun);
+      setImportResult({ ...result, dryRun });
+    } catch (err) {
+      setImportError(err.message || 'Import failed');
+    } finally {
+      setImporting(false);
+    }
+  }
+
   return (
     <div className="create-user-container">
       <div className="page-header">
@@ -187,6 +210,44 @@ export default function CreateUserPage() {
         </div>
       </form>
 
+      <form onSubmit={(e) => handleImport(e, false)} className="form-card">
+        <h2>Import Users</h2>
+        <p className="muted">
+          CSV with a header row: name, email, whatsapp, role, city_id, password.
+          Rows with problems are listed and skipped.
+        </p>
+
+        {importError && <div className="notice error">{importError}</div>}
+
+        <div className="form-row">
+          <input
+            type="file"
+            accept=".csv,.json,text/csv,application/json"
+            onChange={(e) => { setImportFile(e.target.files[0] || null); setImportResult(null); setImportError(null); }}
+            className="form-input"
+          />
+        </div>
+
+        {importResult && (
+          <div className={`notice ${importResult.errors.length ? 'warning' : 'success'}`}>
+            {importResult.dryRun ? 'Would create' : 'Created'} {importResult.created.length} user(s)
+            {importResult.errors.length > 0 && `, skipped ${importResult.errors.length} row(s):`}
+            {importResult.errors.length > 0 && (
+              <ul>
+                {importResult.errors.map((err) => (
+                  <li key={err.row}>Row {err.row}{err.email ? ` (${err.email})` : ''}: {err.detail}</li>
+                ))}
+              </ul>
+            )}
+          </div>
+        )}
+
+        <div className="form-actions">
+          <button type="submit" disabled={importing} className="btn primary">{importing ? 'Importing...' : 'Import'}</button>
+          <button type="button" disabled={importing} onClick={(e) => handleImport(e, true)} className="btn secondary">Check only</button>
+        </div>
+      </form>
+
       <div className="back-link">
         <button onClick={() => navigate('/admin-dashboard')} className="link">← Back to Admin Dashboard</button>
       </div>
@@ -66,7 +66,8 @@ export default function MonthlyReportsPage() {
         <>
           {sortedMonths.map((month) => {
             const monthData = dataByMonth[month];
-            const monthTotal = monthData.reduce((sum, item) => sum + item.total_requested, 0);
+            // amounts arrive as decimal strings; add them up in cents
+            const monthTotal = monthData.reduce((sum, item) => sum + Math.round(Number(item.total_requested) * 100), 0) / 100;
             
             return (
               <div key={month} className="mr-month-section">
@@ -83,7 +84,7 @@ export default function MonthlyReportsPage() {
                       {monthData.map((row, index) => (
                         <tr key={index}>
                           <td className="mr-city">{row.city}</td>
-                          <td className="mr-amount-col">${row.total_requested.toFixed(2)}</td>
+                          <td className="mr-amount-col">${Number(row.total_requested).toFixed(2)}</td>
                         </tr>
                       ))}
                     </tbody>
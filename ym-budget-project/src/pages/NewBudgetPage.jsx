@@ -45,7 +45,7 @@ export default function NewBudgetPage() {
       .map((line) => ({
         category_id: null,
         description: line.description.trim(),
-        amount: line.amount ? parseFloat(line.amount) : null,
+        amount: line.amount ? line.amount.trim() : null,
       }));
 
     const payload = {
@@ -1,19 +1,24 @@
 import React, { useEffect, useState } from 'react';
-import { Link } from 'react-router-dom';
-import { getPendingRequests } from '../lib/api';
+import { Link, useNavigate } from 'react-router-dom';
+import { getPendingRequests, getApprovalQueueStats, claimNextRequest } from '../lib/api';
 import './PendingRequestsPage.css';
 
 export default function PendingRequestsPage() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [requests, setRequests] = useState([]);
+  const [stages, setStages] = useState([]);
+  const [claiming, setClaiming] = useState(false);
+  const [notice, setNotice] = useState(null);
+  const navigate = useNavigate();
 
   async function loadData() {
     setLoading(true);
     setError(null);
     try {
-      const data = await getPendingRequests();
+      const [data, queue] = await Promise.all([getPendingRequests(), getApprovalQueueStats()]);
       setRequests(Array.isArray(data.requests) ? data.requests : []);
+      setStages(Array.isArray(queue.stages) ? queue.stages : []);
     } catch (err) {
       setError(err.message || String(err));
     } finally {
@@ -25,6 +30,25 @@ export default function PendingRequestsPage() {
     loadData();
   }, []);
 
+  // Claim the oldest request at a stage this admin approves, so admins
+  // working the queue together never review the same one
+  async function reviewNext() {
+    setClaiming(true);
+    setNotice(null);
+    try {
+      const { request } = await claimNextRequest();
+      if (request) {
+        navigate(`/admin/requests/${request.request_id}`, { state: { from: '/admin/pending-requests' } });
+      } else {
+        setNotice('Nothing is waiting for your review.');
+      }
+    } catch (err) {
+      setNotice(err.message || String(err));
+    } finally {
+      setClaiming(false);
+    }
+  }
+
   // Separate requests by status
   const pendingRequests = requests.filter(r => r.status === 'PENDING');
   const rejectedRequests = requests.filter(r => r.status === 'REJECTED');
@@ -42,10 +66,35 @@ export default function PendingRequestsPage() {
           <p className="muted">Review and approve or reject budget requests from cities.</p>
         </div>
         <div className="pr-actions">
+          <button onClick={reviewNext} disabled={claiming} className="btn view-link">
+            {claiming ? 'Claiming…' : 'Review next'}
+          </button>
           <Link to="/admin-dashboard" className="btn btn-back">← Dashboard</Link>
         </div>
       </div>
 
+      {notice && <div className="empty">{notice}</div>}
+
+      {stages.length > 1 && (
+        <section className="pr-section">
+          <h2>Approval Stages</h2>
+          <div className="card-grid">
+            {stages.map((s) => (
+              <article key={s.stage_no} className="req-card">
+                <div className="req-top">
+                  <div className="req-id">{s.stage_no}. {s.stage_name}</div>
+                  <span className="count">{s.waiting}</span>
+                </div>
+                <div className="req-meta">
+                  <div className="small muted">{s.claimed} in review</div>
+                  <div className="small muted">Oldest: {formatDate(s.oldest_enqueued_at)}</div>
+                </div>
+              </article>
+            ))}
+          </div>
+        </section>
+      )}
+
       <section className="pr-section">
         <h2>Pending Approval <span className="count">{pendingRequests.length}</span></h2>
         {pendingRequests.length === 0 ? (
@@ -60,7 +109,8 @@ export default function PendingRequestsPage() {
                 </div>
                 <div className="req-body">
                   <div className="req-item"><strong>Date:</strong> {req.month || '—'}</div>
-                  <div className="req-item"><strong>Amount:</strong> {req.amount ? `$${req.amount.toFixed(2)}` : '—'}</div>
+                  <div className="req-item"><strong>Amount:</strong> {Number(req.amount) ? `$${Number(req.amount).toFixed(2)}` : '—'}</div>
+                  {req.stage_name && <div className="req-item"><strong>Stage:</strong> {req.stage_name}</div>}
                   <div className="req-desc">{req.description || 'No description provided.'}</div>
                 </div>
                 <div className="req-meta">
@@ -91,7 +141,7 @@ export default function PendingRequestsPage() {
                 </div>
                 <div className="req-body">
                   <div className="req-item"><strong>Date:</strong> {req.month || '—'}</div>
-                  <div className="req-item"><strong>Amount:</strong> {req.amount ? `$${req.amount.toFixed(2)}` : '—'}</div>
+                  <div className="req-item"><strong>Amount:</strong> {Number(req.amount) ? `$${Number(req.amount).toFixed(2)}` : '—'}</div>
                   <div className="req-desc">{req.description || 'No description provided.'}</div>
                 </div>
                 <div className="req-meta">
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useParams, useNavigate, useLocation } from 'react-router-dom';
-import { getBudgetRequestDetail, approveBudgetRequest, rejectBudgetRequest, deleteBudgetRequest, getCurrentUser } from '../lib/api';
+import { getBudgetRequestDetail, approveBudgetRequest, rejectBudgetRequest, deleteBudgetRequest, getCurrentUser, getAuditLog } from '../lib/api';
 import './RequestDetailPage.css';
 
 export default function RequestDetailPage() {
@@ -17,6 +17,7 @@ export default function RequestDetailPage() {
   const [comment, setComment] = useState('');
   const [commentError, setCommentError] = useState('');
   const [user, setUser] = useState(null);
+  const [history, setHistory] = useState(null);
 
   useEffect(() => {
     let mounted = true;
@@ -40,6 +41,24 @@ export default function RequestDetailPage() {
     return () => { mounted = false; };
   }, [id]);
 
+  // Admins see who changed the request, its events, lines and approvals
+  async function loadHistory() {
+    try {
+      const data = await getAuditLog({ request_id: id, limit: 100 });
+      setHistory(Array.isArray(data.entries) ? data.entries : []);
+    } catch (err) {
+      setHistory([]);
+    }
+  }
+
+  const entityLabels = {
+    budget_request: 'Request',
+    requested_event: 'Event',
+    requested_break_down_line: 'Line',
+    approval: 'Decision',
+  };
+  const opLabels = { I: 'added', U: 'changed', D: 'deleted' };
+
   function openCommentModal(action) {
     setCommentAction(action);
     setComment('');
@@ -58,9 +77,9 @@ export default function RequestDetailPage() {
     setProcessing(true);
     try {
       if (commentAction === 'approve') {
-        await approveBudgetRequest(id, comment.trim() || undefined);
+        await approveBudgetRequest(id, comment.trim() || undefined, request.version);
       } else if (commentAction === 'reject') {
-        await rejectBudgetRequest(id, comment.trim() || undefined);
+        await rejectBudgetRequest(id, comment.trim() || undefined, request.version);
       }
       navigate(fromPage);
     } catch (err) {
@@ -88,6 +107,10 @@ export default function RequestDetailPage() {
   if (error) return <div className="rd-page rd-error">Error: {error}</div>;
   if (!request) return <div className="rd-page rd-empty">No request found</div>;
 
+  // Amounts arrive as decimal strings; sum lines in cents to avoid float drift
+  const requestTotal = Number(request.event?.total_amount)
+    || (request.breakdown_lines || []).reduce((sum, line) => sum + Math.round(Number(line.amount || 0) * 100), 0) / 100;
+
   return (
     <div className="rd-page">
       <div className="rd-card">
@@ -107,11 +130,18 @@ export default function RequestDetailPage() {
               <dt>Status</dt>
               <dd><span className={`rd-status rd-status-${request.status?.toLowerCase()}`}>{request.status || '—'}</span></dd>
 
+              {request.stage && (
+                <>
+                  <dt>Approval Stage</dt>
+                  <dd>{request.stage.stage_no}. {request.stage.stage_name}</dd>
+                </>
+              )}
+
               <dt>Date</dt>
               <dd>{request.month || '—'}</dd>
 
               <dt>Amount Requested</dt>
-              <dd className="rd-amount">${(request.event?.total_amount || request.breakdown_lines?.reduce((sum, line) => sum + (line.amount || 0), 0) || 0).toFixed(2)}</dd>
+              <dd className="rd-amount">${requestTotal.toFixed(2)}</dd>
 
               <dt>Created</dt>
               <dd>{request.created_at ? new Date(request.created_at).toLocaleDateString() : '—'}</dd>
@@ -164,20 +194,50 @@ export default function RequestDetailPage() {
                   <tr key={line.line_number}>
                     <td>{line.line_number}</td>
                     <td>{line.description}</td>
-                    <td className="rd-amount-col">${line.amount?.toFixed(2) || '0.00'}</td>
+                    <td className="rd-amount-col">${Number(line.amount || 0).toFixed(2)}</td>
                   </tr>
                 ))}
               </tbody>
               <tfoot>
                 <tr>
                   <td colSpan="2"><strong>Total</strong></td>
-                  <td className="rd-amount-col"><strong>${(request.event?.total_amount || request.breakdown_lines?.reduce((sum, line) => sum + (line.amount || 0), 0) || 0).toFixed(2)}</strong></td>
+                  <td className="rd-amount-col"><strong>${requestTotal.toFixed(2)}</strong></td>
                 </tr>
               </tfoot>
             </table>
           </section>
         )}
 
+        {user?.role === 'ADMIN' && (
+          <section className="rd-breakdown">
+            <h3>History</h3>
+            {history === null ? (
+              <button onClick={loadHistory} className="rd-btn">Show history</button>
+            ) : history.length === 0 ? (
+              <p>No recorded changes.</p>
+            ) : (
+              <table className="rd-table">
+                <thead>
+                  <tr>
+                    <th>When</th>
+                    <th>Who</th>
+                    <th>What</th>
+                  </tr>
+                </thead>
+                <tbody>
+                  {history.map((entry) => (
+                    <tr key={entry.audit_id}>
+                      <td>{new Date(entry.changed_at).toLocaleString()}</td>
+                      <td>{entry.actor_name || '—'}</td>
+                      <td>{entityLabels[entry.entity] || entry.entity} #{entry.entity_id} {opLabels[entry.op]}</td>
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            )}
+          </section>
+        )}
+
         {request.status === 'PENDING' && user?.role === 'ADMIN' && (
           <footer className="rd-actions">
             <div className="rd-action-left">